@@ -11,3 +11,15 @@ db.clients.create_index([("name", ASCENDING)])
 db.portfolios.create_index([("clientId", ASCENDING)])
 db.assets.create_index([("portfolioId", ASCENDING)])
 db.jobs.create_index([("createdAt", ASCENDING)])
+db.jobs.create_index([("id", ASCENDING)])
+db.jobs.create_index([("paramsHash", ASCENDING), ("status", ASCENDING)])
+db.jobs.create_index([("dedupedFrom", ASCENDING)])
+db.jobs.create_index([("batchId", ASCENDING), ("status", ASCENDING)])
+db.jobs.create_index([("ts.started", ASCENDING)])
+db.batches.create_index([("id", ASCENDING)])
+# At most one leading (Queued / Running, not deduplicated) job per params hash
+db.jobs.create_index(
+    [("inflightKey", ASCENDING)],
+    unique=True,
+    partialFilterExpression={"inflightKey": {"$type": "string"}},
+)
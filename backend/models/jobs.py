@@ -1,10 +1,35 @@
 # backend/models/jobs.py
+import hashlib, json, os, time
 from typing import Dict, Any, Optional, List
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from .db import db
-from utils.sanitize import clean_numbers
+from services.market_data import chain_key, spot_key
+from utils.finance_cache import fetched_at_many, soft_ttl
+from utils.sanitize import clean_numbers, normalize_ticker
 from utils.json_safe import json_sanitize
 
+TERMINAL = ("Succeeded", "Failed", "Cancelled")
+# Legal transitions: target status -> statuses it may be entered from. Running
+# is re-entrant so a retried task can report again; terminal states are final.
+_ENTER_FROM = {
+    "Running": ("Queued", "Running"),
+    "Succeeded": ("Running",),
+    "Failed": ("Queued", "Running"),
+    "Cancelled": ("Queued", "Running"),
+}
+# API views leave out the native BSON dates kept under "ts"
+PUBLIC = {"_id": 0, "ts": 0}
+# Identical submissions attach to an in-flight job or reuse a result this recent
+JOB_DEDUP = os.getenv("JOB_DEDUP", "1").lower() not in ("0", "false", "no", "off")
+JOB_DEDUP_FRESH_SEC = int(os.getenv("JOB_DEDUP_FRESH_SEC", os.getenv("YF_CACHE_TTL", "900")))
+# Submission fields that never change a result
+_UNHASHED = ("priority", "submitter", "dedupe", "type", "algo", "product")
+# Job types priced off live spots / chains; their hash includes a market snapshot
+_MARKET_TYPES = ("OptionPricing", "PortfolioRisk", "ScenarioGrid")
+_ACTIVE = ("Queued", "Running")
+
 
 def _utcnow() -> datetime:
     # Always timezone-aware UTC
@@ -18,61 +43,520 @@ def _to_iso(dt: datetime) -> str:
     return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def _parse_iso(s: str) -> datetime:
+def _name_or(id_value: str, collection, key: str = "name") -> Optional[str]:
+    if not id_value:
+        return None
+    doc = db[collection].find_one({"id": id_value}, {"_id": 0, key: 1})
+    return doc.get(key) if doc else None
+
+
+def _canonical(v):
+    """Form and JSON spellings of the same value agree ("100", 100, 100.0)."""
+    if isinstance(v, dict):
+        return {str(k): _canonical(x) for k, x in v.items() if x not in (None, "")}
+    if isinstance(v, (list, tuple)):
+        return [_canonical(x) for x in v]
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        v = v.strip()
+        try:
+            return float(v)
+        except ValueError:
+            return v
+    return v
+
+
+def _holdings(pid: Optional[str]) -> List[str]:
+    return sorted(
+        json.dumps(_canonical(a), sort_keys=True, default=str)
+        for a in db.assets.find({"portfolioId": pid}, {"_id": 0})
+    )
+
+
+def _portfolio_of(payload: Dict[str, Any]) -> Optional[str]:
+    params = payload.get("params") or {}
+    return payload.get("portfolioId") or params.get("portfolioId") or params.get("portfolio_id")
+
+
+def _market_keys(payload: Dict[str, Any], holdings: List[str]) -> List[str]:
+    """Cache keys of the spots and chains a job reads (services.market_data)."""
+    if payload.get("type") not in _MARKET_TYPES:
+        return []
+    params = payload.get("params") or {}
+    rows = [params, *(params.get("legs") or []), *(params.get("underlyings") or [])]
+    rows += [json.loads(h) for h in holdings]
+    keys = set()
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        tkr = normalize_ticker(str(row.get("ticker") or ""))
+        if not tkr:
+            continue
+        if row.get("S0") in (None, ""):
+            keys.add(spot_key(tkr))
+        if row.get("expiry") and row.get("sigma") in (None, ""):
+            keys.add(chain_key(tkr, str(row["expiry"])))
+    return sorted(keys)
+
+
+def _snapshot(keys) -> Dict[str, Any]:
     """
-    Parse ISO timestamps we wrote previously. Accepts:
-        - '...Z'  -> convert to '+00:00'
-        - naive   -> assume UTC
-        - offset-aware -> keep offset
-    Always returns timezone-aware UTC datetime.
+    fetched_at of each cached key; a key the job would have to fetch itself
+    stands for the current soft-TTL window, so the match expires with it.
     """
-    if not s:
-        return _utcnow()
+    keys = list(keys)
     try:
-        s2 = s.replace("Z", "+00:00")
-        dt = datetime.fromisoformat(s2)
+        seen = fetched_at_many(keys) if keys else {}
     except Exception:
-        # Fallback: treat as UTC naive
-        dt = datetime.strptime(s.split(".")[0], "%Y-%m-%dT%H:%M:%S")
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
+        seen = {}
+    now = time.time()
+    return {k: seen[k] if k in seen else f"~{int(now // max(1, soft_ttl(k)))}" for k in keys}
 
 
-def _name_or(id_value: str, collection, key: str = "name") -> Optional[str]:
-    if not id_value:
-        return None
-    doc = db[collection].find_one({"id": id_value}, {"_id": 0, key: 1})
-    return doc.get(key) if doc else None
+def params_hash(
+    payload: Dict[str, Any],
+    holdings: Optional[List[str]] = None,
+    snapshot: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Content address of a submission: type, product, algo and canonical params,
+    plus the portfolio's holdings when the job reads them and, for jobs priced
+    off live spots / chains, the market-data snapshot they would see (both
+    looked up unless given). History-based jobs rely on the freshness window.
+    """
+    params = payload.get("params") or {}
+    pid = _portfolio_of(payload)
+    if holdings is None:
+        holdings = _holdings(pid) if pid else []
+    if snapshot is None:
+        snapshot = _snapshot(_market_keys(payload, holdings))
+    body = {
+        "type": payload.get("type"),
+        "product": payload.get("product"),
+        "algo": payload.get("algo"),
+        "portfolioId": pid,
+        "params": _canonical({k: v for k, v in params.items() if k not in _UNHASHED}),
+        "holdings": holdings,
+        "market": snapshot,
+    }
+    raw = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
 
 
-def new_job(payload: Dict[str, Any]) -> Dict[str, Any]:
-    now = _utcnow()
+def _wants_dedupe(payload: Dict[str, Any]) -> bool:
+    flag = payload.get("dedupe", (payload.get("params") or {}).get("dedupe", True))
+    return JOB_DEDUP and str(flag).lower() not in ("0", "false", "no", "off")
+
+
+def _dedupe_sources(keys: List[str], now: datetime) -> Dict[str, Dict[str, Any]]:
+    """Newest in-flight job, or fresh success, for each params hash (one query)."""
+    if not keys:
+        return {}
+    cur = db.jobs.find(
+        {
+            "paramsHash": {"$in": keys},
+            "$or": [
+                {"status": {"$in": list(_ACTIVE)}},
+                {
+                    "status": "Succeeded",
+                    "ts.finished": {"$gte": now - timedelta(seconds=JOB_DEDUP_FRESH_SEC)},
+                },
+            ],
+        },
+        {"_id": 0, "id": 1, "status": 1, "dedupedFrom": 1, "result": 1, "paramsHash": 1},
+    ).sort("ts.updated", -1)
+    out: Dict[str, Dict[str, Any]] = {}
+    for src in cur:
+        out.setdefault(src["paramsHash"], src)
+    return out
+
+
+def _job_doc(payload, now, key, client_name, portfolio_name, batch_id=None) -> Dict[str, Any]:
     cid = payload.get("clientId")
     pid = payload.get("portfolioId")
-    doc = {
+    return {
         "id": payload.get("id") or __import__("uuid").uuid4().hex,
         "clientId": cid,
-        "clientName": _name_or(cid, "clients"),
+        "clientName": client_name,
         "portfolioId": pid,
-        "portfolioName": _name_or(pid, "portfolios"),
+        "portfolioName": portfolio_name,
         "type": payload["type"],
         "product": payload.get("product"),
         "algo": payload["algo"],
         "priority": payload.get("priority", "Normal"),
+        "queue": payload.get("queue"),
         "submitter": payload.get("submitter", "You"),
         "createdAt": _to_iso(now),
         "updatedAt": _to_iso(now),
+        # Native dates for server-side arithmetic / range queries
+        "ts": {"created": now, "updated": now},
         "status": "Queued",
         "startedAt": None,
         "finishedAt": None,
         "durationSec": None,
+        "progress": None,
         "params": payload.get("params", {}),
+        "paramsHash": key,
+        # Set while this job leads its hash; unique among set values (see models.db)
+        "inflightKey": None,
+        # Followers ever attached; set_job_status skips their update at zero
+        "followers": 0,
+        "dedupedFrom": None,
+        "batchId": batch_id,
         "result": None,
         "error": None,
     }
-    db.jobs.insert_one(doc)
-    return {k: v for k, v in doc.items() if k != "_id"}
+
+
+def _follow(doc: Dict[str, Any], src: Dict[str, Any], now: datetime) -> None:
+    doc["dedupedFrom"] = src.get("dedupedFrom") or src["id"]
+    doc["inflightKey"] = None
+    doc["status"] = src["status"]
+    if src["status"] != "Queued":
+        doc["startedAt"] = doc["createdAt"]
+        doc["ts"]["started"] = now
+    if src["status"] == "Succeeded":
+        doc.update(finishedAt=doc["createdAt"], durationSec=0, result=src.get("result"))
+        doc["ts"]["finished"] = now
+
+
+def _attach(docs: List[Dict[str, Any]]) -> None:
+    """Count inserted followers on their originals (one update per distinct count)."""
+    per: Dict[str, int] = {}
+    for d in docs:
+        if d["dedupedFrom"] and d["status"] != "Succeeded":
+            per[d["dedupedFrom"]] = per.get(d["dedupedFrom"], 0) + 1
+    by_n: Dict[int, List[str]] = {}
+    for jid, n in per.items():
+        by_n.setdefault(n, []).append(jid)
+    for n, ids in by_n.items():
+        db.jobs.update_many({"id": {"$in": ids}}, {"$inc": {"followers": n}})
+
+
+def _claim(leaders: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    """
+    Insert would-be leaders. The unique inflightKey index lets only one job
+    per hash be in flight, so a leader that lost a race to a concurrent
+    submission follows the winner instead. Returns the docs that now follow.
+    """
+    lost_all: Dict[str, Dict[str, Any]] = {}
+    pending = leaders
+    for _ in range(3):
+        if not pending:
+            break
+        for d in pending:
+            d.pop("_id", None)
+            d["inflightKey"] = d["paramsHash"]
+        try:
+            db.jobs.insert_many(pending, ordered=False)
+            pending = []
+            break
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(w.get("code") != 11000 for w in errors):
+                raise
+            lost = [pending[w["index"]] for w in errors]
+        sources = _dedupe_sources(sorted({d["paramsHash"] for d in lost}), now)
+        pending = []
+        for d in lost:
+            src = sources.get(d["paramsHash"])
+            if src:
+                _follow(d, src, now)
+                lost_all[d["id"]] = d
+            else:
+                pending.append(d)  # the winner finished meanwhile; lead again
+    if pending:
+        raise RuntimeError("could not claim in-flight jobs")
+    if lost_all:
+        db.jobs.insert_many([dict(d) for d in lost_all.values()], ordered=False)
+    return list(lost_all.values())
+
+
+def new_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Insert a job. With dedupe on (JOB_DEDUP, payload "dedupe"), a submission
+    whose params hash matches a Queued / Running job becomes a follower of it
+    (same status, finished by set_job_status together with the original), and
+    one matching a success newer than JOB_DEDUP_FRESH_SEC is created already
+    Succeeded with a copy of its result. Either way "dedupedFrom" names the
+    original and the caller must not enqueue work.
+    """
+    now = _utcnow()
+    key = params_hash(payload)
+    src = _dedupe_sources([key], now).get(key) if _wants_dedupe(payload) else None
+    doc = _job_doc(
+        payload,
+        now,
+        key,
+        _name_or(payload.get("clientId"), "clients"),
+        _name_or(payload.get("portfolioId"), "portfolios"),
+    )
+    if src:
+        _follow(doc, src, now)
+        db.jobs.insert_one(doc)
+    elif _wants_dedupe(payload):
+        _claim([doc], now)
+    else:
+        db.jobs.insert_one(doc)
+    if doc["dedupedFrom"] and doc["status"] != "Succeeded":
+        # Counted before the catch-up so an original finishing in between is seen there
+        _attach([doc])
+        _catch_up([doc])
+    return {k: v for k, v in doc.items() if k not in ("_id", "ts")}
+
+
+def new_jobs(payloads: List[Dict[str, Any]], batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    new_job for many payloads with a fixed number of queries: names, holdings,
+    market snapshots and dedupe sources are looked up once per distinct value
+    and the jobs go in with one insert_many (leaders first). Identical
+    payloads within the batch follow the first of them.
+    """
+    now = _utcnow()
+    names = {
+        coll: {
+            d["id"]: d.get("name")
+            for d in db[coll].find({"id": {"$in": list(ids)}}, {"_id": 0, "id": 1, "name": 1})
+        }
+        for coll, ids in (
+            ("clients", {p.get("clientId") for p in payloads if p.get("clientId")}),
+            ("portfolios", {p.get("portfolioId") for p in payloads if p.get("portfolioId")}),
+        )
+    }
+    held = {pid: _holdings(pid) for pid in {_portfolio_of(p) for p in payloads} if pid}
+    market = [_market_keys(p, held.get(_portfolio_of(p), [])) for p in payloads]
+    snap = _snapshot({k for ks in market for k in ks})
+    keys = [
+        params_hash(p, held.get(_portfolio_of(p), []), {k: snap[k] for k in ks})
+        for p, ks in zip(payloads, market)
+    ]
+    sources = _dedupe_sources(
+        sorted({k for k, p in zip(keys, payloads) if _wants_dedupe(p)}), now
+    )
+    docs, leaders, rest, followers = [], [], [], []
+    for p, key in zip(payloads, keys):
+        doc = _job_doc(
+            p,
+            now,
+            key,
+            names["clients"].get(p.get("clientId")),
+            names["portfolios"].get(p.get("portfolioId")),
+            batch_id,
+        )
+        src = sources.get(key) if _wants_dedupe(p) else None
+        if src:
+            _follow(doc, src, now)
+            if src["status"] != "Succeeded" and not src.get("local"):
+                followers.append(doc)
+            rest.append(doc)
+        elif _wants_dedupe(p):
+            sources[key] = {"id": doc["id"], "status": "Queued", "local": True}
+            leaders.append(doc)
+        else:
+            rest.append(doc)
+        docs.append(doc)
+    # In-batch followers of a leader that lost its claim follow the winner
+    moved = {d["id"]: d for d in _claim(leaders, now)}
+    for doc in rest:
+        lead = moved.get(doc["dedupedFrom"])
+        if lead:
+            _follow(doc, lead, now)
+            followers.append(doc)
+    followers += [d for d in moved.values() if d["status"] != "Succeeded"]
+    if rest:
+        db.jobs.insert_many(rest, ordered=False)
+    _attach(docs)
+    _catch_up(followers)
+    return [{k: v for k, v in d.items() if k not in ("_id", "ts")} for d in docs]
+
+
+def _catch_up(docs: List[Dict[str, Any]]) -> None:
+    """
+    A follower inserted just as its original finished would wait forever:
+    copy a success or failure, and detach it from a cancelled original
+    (dedupedFrom cleared, so the caller enqueues it as a job of its own).
+    """
+    if not docs:
+        return
+    done = {
+        o["id"]: o
+        for o in db.jobs.find(
+            {"id": {"$in": list({d["dedupedFrom"] for d in docs})}, "status": {"$in": list(TERMINAL)}},
+            {"_id": 0, "id": 1, "status": 1, "result": 1, "error": 1},
+        )
+    }
+    for doc in docs:
+        orig = done.get(doc["dedupedFrom"])
+        if not orig:
+            continue
+        if orig["status"] == "Cancelled":
+            _detach(doc["id"])
+        else:
+            if orig["status"] == "Succeeded":
+                set_job_status(doc["id"], "Running")
+            set_job_status(doc["id"], orig["status"], result=orig.get("result"), error=orig.get("error"))
+        doc.update(db.jobs.find_one({"id": doc["id"]}, PUBLIC))
+
+
+def _detach(jid: str) -> None:
+    """Turn an active follower back into a Queued job of its own."""
+    db.jobs.update_one(
+        {"id": jid, "status": {"$in": list(_ACTIVE)}},
+        {
+            "$set": {"dedupedFrom": None, "status": "Queued", "startedAt": None},
+            "$unset": {"ts.started": ""},
+        },
+    )
+
+
+def promote_followers(jid: str) -> Optional[Dict[str, Any]]:
+    """
+    After `jid` is cancelled its followers must not share its fate: the
+    oldest active one becomes a Queued job of its own (the heir, returned for
+    the caller to enqueue) and the others follow it. If another submission
+    took over the hash meanwhile they all follow that one and None is returned.
+    """
+    active = {"dedupedFrom": jid, "status": {"$in": list(_ACTIVE)}}
+    first = db.jobs.find_one(active, {"_id": 0, "id": 1, "paramsHash": 1}, sort=[("ts.created", ASCENDING)])
+    if not first:
+        return None
+    now = _utcnow()
+    reset = {"status": "Queued", "startedAt": None, "updatedAt": _to_iso(now), "ts.updated": now}
+    for _ in range(3):
+        try:
+            won = db.jobs.update_one(
+                {"id": first["id"], **active},
+                {
+                    "$set": {
+                        **reset,
+                        "dedupedFrom": None,
+                        "inflightKey": first["paramsHash"],
+                        "followers": 0,
+                    },
+                    "$unset": {"ts.started": ""},
+                },
+            ).modified_count
+        except DuplicateKeyError:
+            # A newer submission leads the hash now; everyone follows it
+            src = db.jobs.find_one({"inflightKey": first["paramsHash"]}, {"_id": 0, "id": 1})
+            if not src:
+                continue
+            ids = [d["id"] for d in db.jobs.find(active, {"_id": 0, "id": 1})]
+            moved = db.jobs.update_many(active, {"$set": {"dedupedFrom": src["id"]}}).modified_count
+            if moved:
+                db.jobs.update_one({"id": src["id"]}, {"$inc": {"followers": moved}})
+            _catch_up(list(db.jobs.find({"id": {"$in": ids}}, PUBLIC)))
+            return None
+        if not won:
+            return None
+        moved = db.jobs.update_many(
+            active, {"$set": {**reset, "dedupedFrom": first["id"]}, "$unset": {"ts.started": ""}}
+        ).modified_count
+        if moved:
+            # The heir is not enqueued until we return, so it cannot finish first
+            db.jobs.update_one({"id": first["id"]}, {"$inc": {"followers": moved}})
+        return get_job(first["id"])
+    return None
+
+
+def new_batch(total: int, submitter: str = "You") -> Dict[str, Any]:
+    now = _utcnow()
+    doc = {
+        "id": __import__("uuid").uuid4().hex,
+        "submitter": submitter,
+        "createdAt": _to_iso(now),
+        "updatedAt": _to_iso(now),
+        "ts": {"created": now, "updated": now},
+        "status": "Queued",
+        "total": total,
+        "counts": {"Queued": total},
+        "finishedAt": None,
+    }
+    db.batches.insert_one(doc)
+    return {k: v for k, v in doc.items() if k not in ("_id", "ts")}
+
+
+def batch_counts(batch_id: str) -> Dict[str, int]:
+    rows = db.jobs.aggregate(
+        [{"$match": {"batchId": batch_id}}, {"$group": {"_id": "$status", "n": {"$sum": 1}}}]
+    )
+    return {r["_id"]: r["n"] for r in rows}
+
+
+def _batch_status(counts: Dict[str, int]) -> str:
+    open_ = counts.get("Queued", 0) + counts.get("Running", 0)
+    if open_ == 0:
+        return "Succeeded" if counts.get("Succeeded", 0) == sum(counts.values()) else "Completed"
+    return "Queued" if open_ == counts.get("Queued", 0) == sum(counts.values()) else "Running"
+
+
+def get_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Batch document with status and per-status counts read live from its jobs."""
+    doc = db.batches.find_one({"id": batch_id}, PUBLIC)
+    if doc and doc["status"] not in ("Succeeded", "Completed"):
+        doc["counts"] = batch_counts(batch_id)
+        doc["status"] = _batch_status(doc["counts"])
+    return doc
+
+
+def finish_batch(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Record final counts once every job of the batch has run (chord callback)."""
+    counts = batch_counts(batch_id)
+    status = _batch_status(counts)
+    now = _utcnow()
+    sets = {"status": status, "counts": counts, "updatedAt": _to_iso(now), "ts.updated": now}
+    # Jobs deduplicated onto work outside the batch may still be running
+    if status in ("Succeeded", "Completed"):
+        sets.update({"finishedAt": _to_iso(now), "ts.finished": now})
+    db.batches.update_one({"id": batch_id}, {"$set": sets})
+    return get_batch(batch_id)
+
+
+def queue_wait_stats(since: datetime) -> Dict[str, Dict[str, Any]]:
+    """
+    Per queue: jobs started since `since` with mean / max wait (created ->
+    started), and the jobs still Queued with the age of the oldest.
+    Deduplicated jobs never wait and are left out.
+    """
+    now = _utcnow()
+    out: Dict[str, Dict[str, Any]] = {}
+    started = db.jobs.aggregate(
+        [
+            {"$match": {"ts.started": {"$gte": since}, "dedupedFrom": None}},
+            {
+                "$group": {
+                    "_id": "$queue",
+                    "started": {"$sum": 1},
+                    "avgWaitMs": {"$avg": {"$subtract": ["$ts.started", "$ts.created"]}},
+                    "maxWaitMs": {"$max": {"$subtract": ["$ts.started", "$ts.created"]}},
+                }
+            },
+        ]
+    )
+    for r in started:
+        out.setdefault(r["_id"], {}).update(
+            started=r["started"],
+            avgWaitSec=round(r["avgWaitMs"] / 1000.0, 3),
+            maxWaitSec=round(r["maxWaitMs"] / 1000.0, 3),
+        )
+    waiting = db.jobs.aggregate(
+        [
+            {"$match": {"status": "Queued", "dedupedFrom": None}},
+            {"$group": {"_id": "$queue", "queued": {"$sum": 1}, "oldest": {"$min": "$ts.created"}}},
+        ]
+    )
+    for r in waiting:
+        oldest = r["oldest"]
+        if oldest is not None and oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        out.setdefault(r["_id"], {}).update(
+            queued=r["queued"],
+            oldestWaitSec=round((now - oldest).total_seconds(), 3) if oldest else None,
+        )
+    return out
 
 
 def list_jobs(q: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -81,11 +565,21 @@ def list_jobs(q: Dict[str, Any]) -> List[Dict[str, Any]]:
         filt["clientId"] = q["clientId"]
     if q.get("portfolioId"):
         filt["portfolioId"] = q["portfolioId"]
-    return list(db.jobs.find(filt, {"_id": 0}).sort("createdAt", -1).limit(200))
+    return list(db.jobs.find(filt, PUBLIC).sort("createdAt", -1).limit(200))
 
 
 def get_job(jid: str) -> Optional[Dict[str, Any]]:
-    return db.jobs.find_one({"id": jid}, {"_id": 0})
+    return db.jobs.find_one({"id": jid}, PUBLIC)
+
+
+def _since(field: str, iso_field: str):
+    """Native date of a lifecycle field; jobs written before "ts" parse the ISO string."""
+    return {
+        "$ifNull": [
+            f"$ts.{field}",
+            {"$dateFromString": {"dateString": f"${iso_field}", "onNull": None, "onError": None}},
+        ]
+    }
 
 
 def set_job_status(
@@ -93,34 +587,60 @@ def set_job_status(
     status: str,
     result: Optional[Dict[str, Any]] = None,
     error: Optional[str] = None,
-) -> None:
+) -> bool:
+    """
+    Move a job to `status` in one find_one_and_update. The filter only matches
+    from a legal previous status, and startedAt / durationSec are computed by
+    the pipeline from the stored dates, so a retried or late task cannot
+    reopen a finished job or race another writer. Jobs deduplicated onto
+    this one (see new_job) make the same transition, except Cancelled: a
+    cancel is the original's own, and its followers are handed on by
+    promote_followers instead. False if nothing matched.
+    """
     now = _utcnow()
-    upd: Dict[str, Any] = {"status": status, "updatedAt": _to_iso(now)}
-
-    # Read existing timestamps and normalize to aware UTC
-    doc = db.jobs.find_one({"id": jid}, {"_id": 0, "startedAt": 1, "createdAt": 1})
-    started_at = (
-        _parse_iso(doc.get("startedAt")) if (doc and doc.get("startedAt")) else None
-    )
-    created_at = (
-        _parse_iso(doc.get("createdAt")) if (doc and doc.get("createdAt")) else None
-    )
-
-    if status == "Running" and not started_at:
-        upd["startedAt"] = _to_iso(now)
-
-    if status in ("Succeeded", "Failed", "Cancelled"):
-        upd["finishedAt"] = _to_iso(now)
-        # Use startedAt if present, else createdAt
-        base = started_at or created_at or now
-        duration = (now - base).total_seconds()
-        upd["durationSec"] = max(0, int(duration))
-        upd["result"] = result
-        upd["error"] = error
-    elif result is not None or error is not None:
-        # Allow updating result/error mid-flight if caller wants
-        upd["result"] = result
-        upd["error"] = error
-    if "result" in upd and isinstance(upd["result"], dict):
-        upd["result"] = clean_numbers(upd["result"])
-    db.jobs.update_one({"id": jid}, {"$set": upd})
+    iso = _to_iso(now)
+    sets: Dict[str, Any] = {
+        "status": {"$literal": status},
+        "updatedAt": {"$literal": iso},
+        "ts.updated": now,
+    }
+    if status == "Running":
+        sets["startedAt"] = {"$ifNull": ["$startedAt", {"$literal": iso}]}
+        sets["ts.started"] = {"$ifNull": [_since("started", "startedAt"), now]}
+    if status in TERMINAL:
+        base = {
+            "$ifNull": [
+                _since("started", "startedAt"),
+                {"$ifNull": [_since("created", "createdAt"), now]},
+            ]
+        }
+        sets["finishedAt"] = {"$literal": iso}
+        sets["ts.finished"] = now
+        sets["durationSec"] = {
+            "$max": [0, {"$toInt": {"$divide": [{"$subtract": [now, base]}, 1000]}}]
+        }
+        # Live progress is only meaningful while running (see models.progress)
+        sets["progress"] = {"$literal": None}
+        # Frees the params hash for the next submission to lead
+        sets["inflightKey"] = {"$literal": None}
+    if status in TERMINAL or result is not None or error is not None:
+        if isinstance(result, dict):
+            result = clean_numbers(result)
+        sets["result"] = {"$literal": result}
+        sets["error"] = {"$literal": error}
+    filt: Dict[str, Any] = {"id": jid}
+    if status in _ENTER_FROM:
+        filt["status"] = {"$in": list(_ENTER_FROM[status])}
+    doc = db.jobs.find_one_and_update(filt, [{"$set": sets}], projection={"_id": 1, "followers": 1})
+    if doc is None:
+        return False
+    # Success and failure both describe the work the followers asked for, so
+    # they share them (a failure is deterministic for the same params and
+    # market snapshot; resubmitting with dedupe off forces a fresh run).
+    # Jobs without followers (the common case) stay at one round trip; a
+    # document without the counter predates it and is updated to be safe.
+    if status != "Cancelled" and doc.get("followers", 1):
+        db.jobs.update_many(
+            {"dedupedFrom": jid, "status": {"$nin": list(TERMINAL)}}, [{"$set": sets}]
+        )
+    return True
@@ -0,0 +1,161 @@
+# backend/models/progress.py
+"""
+Live progress for running jobs.
+
+Engines take an optional `progress(done, total, **fields)` callback and call
+it as often as is convenient (per chunk, per solve, per node). A
+ProgressReporter is that callback: it throttles to one Redis write every
+PROGRESS_EVERY_MS under job:progress:<id> (short TTL, read by the job
+endpoints) and writes Mongo only when the fraction done crosses one of
+PROGRESS_MILESTONES, so a job costs a handful of database writes however
+chatty its engine is.
+
+The reporter is also the job's cancellation token. POST /jobs/<id>/cancel
+sets job:cancel:<id>; every report (and check(), for loops that do not
+report) looks at that flag at most every CANCEL_POLL_MS and raises
+JobCancelled, which unwinds the engine between chunks.
+"""
+import json, os, threading, time
+from typing import Dict, Iterable, Optional
+from .db import db
+from utils.finance_cache import _get_redis
+
+PROGRESS_EVERY_MS = int(os.getenv("PROGRESS_EVERY_MS", "500"))
+PROGRESS_TTL = int(os.getenv("PROGRESS_TTL", "3600"))
+PROGRESS_MILESTONES = tuple(
+    float(x) for x in os.getenv("PROGRESS_MILESTONES", "0.25,0.5,0.75").split(",")
+)
+CANCEL_POLL_MS = int(os.getenv("CANCEL_POLL_MS", "200"))
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside an engine when its job has been cancelled. A BaseException
+    (like asyncio.CancelledError) so the engines' own `except Exception`
+    fallbacks do not swallow it.
+    """
+
+
+def _key(job_id: str) -> str:
+    return f"job:progress:{job_id}"
+
+
+def _cancel_key(job_id: str) -> str:
+    return f"job:cancel:{job_id}"
+
+
+def request_cancel(job_id: str) -> bool:
+    """Flag a running job for cancellation; False if Redis is unavailable."""
+    try:
+        _get_redis().set(_cancel_key(job_id), "1", ex=PROGRESS_TTL)
+        return True
+    except Exception:
+        return False
+
+
+class ProgressReporter:
+    def __init__(
+        self,
+        job_id: str,
+        unit: str = "steps",
+        every_ms: int = PROGRESS_EVERY_MS,
+        milestones: Iterable[float] = PROGRESS_MILESTONES,
+    ):
+        self.job_id = job_id
+        self.unit = unit
+        self.every = every_ms / 1000.0
+        self.milestones = sorted(milestones)
+        self.t0 = time.monotonic()
+        self.last = -float("inf")
+        self.payload: Optional[dict] = None
+        self._lock = threading.Lock()  # engines may report from worker threads
+        self._redis = True
+        self._polled = -float("inf")
+        self.cancelled = False
+
+    def check(self) -> None:
+        """Raise JobCancelled if the job was cancelled (one Redis read per CANCEL_POLL_MS)."""
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+        now = time.monotonic()
+        if now - self._polled < CANCEL_POLL_MS / 1000.0:
+            return
+        self._polled = now
+        try:
+            self.cancelled = bool(_get_redis().exists(_cancel_key(self.job_id)))
+        except Exception:
+            return
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def __call__(self, done: float, total: Optional[float] = None, **fields) -> None:
+        self.check()
+        now = time.monotonic()
+        frac = min(max(done / total, 0.0), 1.0) if total else None
+        with self._lock:
+            milestone = bool(frac is not None and self.milestones and frac >= self.milestones[0])
+            due = now - self.last >= self.every
+            if not (due or milestone):
+                return
+            elapsed = now - self.t0
+            self.payload = {
+                "done": done,
+                "total": total,
+                "unit": self.unit,
+                "fraction": frac,
+                "elapsedSec": round(elapsed, 3),
+                "etaSec": round(elapsed * (1.0 - frac) / frac, 3) if frac else None,
+                **fields,
+            }
+            if due:
+                self.last = now
+                self._publish()
+            if milestone:
+                while self.milestones and frac >= self.milestones[0]:
+                    self.milestones.pop(0)
+                db.jobs.update_one(
+                    {"id": self.job_id, "status": "Running"},
+                    {"$set": {"progress": self.payload}},
+                )
+
+    def _publish(self) -> None:
+        if not self._redis:
+            return
+        try:
+            _get_redis().set(_key(self.job_id), json.dumps(self.payload, default=float), ex=PROGRESS_TTL)
+        except Exception:
+            # Progress is best effort; never fail the job over it
+            self._redis = False
+
+    def close(self) -> None:
+        """Drop the live entry and any cancel flag; the job document is authoritative now."""
+        try:
+            _get_redis().delete(_key(self.job_id), _cancel_key(self.job_id))
+        except Exception:
+            pass
+
+
+def live_progress(job_ids: Iterable[str]) -> Dict[str, dict]:
+    """Latest Redis progress for each job that has one (one MGET)."""
+    ids = list(job_ids)
+    if not ids:
+        return {}
+    try:
+        raw = _get_redis().mget([_key(j) for j in ids])
+    except Exception:
+        return {}
+    return {j: json.loads(v) for j, v in zip(ids, raw) if v}
+
+
+def with_progress(jobs):
+    """
+    Overlay live progress on the Queued / Running jobs among `jobs` (dicts);
+    a deduplicated job shows the progress of the job doing the work.
+    """
+    active = [j for j in jobs if j and j.get("status") in ("Queued", "Running")]
+    live = live_progress({j.get("dedupedFrom") or j["id"] for j in active})
+    for j in active:
+        src = j.get("dedupedFrom") or j["id"]
+        if src in live:
+            j["progress"] = live[src]
+    return jobs
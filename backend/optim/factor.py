@@ -0,0 +1,125 @@
+# backend/optim/factor.py
+"""
+Factor-model covariance Σ = B F B' + diag(d), kept in factored form.
+
+`FactorCov` implements the same operator API as `optim.qp.DenseCov`, so the QP
+solver, frontier sweeps and risk numbers work on it unchanged: products cost
+O(n k), and every solve goes through the Woodbury identity on a (k + m)-sized
+core, where m is the number of dense constraint rows. Σ itself is never formed.
+"""
+from typing import Optional, Tuple
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+
+# Specific variance floor, relative to the median total variance
+_D_FLOOR = 1e-4
+
+
+def _sqrt_psd(F: np.ndarray) -> np.ndarray:
+    vals, vecs = np.linalg.eigh((F + F.T) / 2.0)
+    return vecs * np.sqrt(np.maximum(vals, 0.0))
+
+
+class FactorCov:
+    def __init__(self, B: np.ndarray, F: np.ndarray, d: np.ndarray):
+        self.B = np.asarray(B, dtype=float)  # n x k exposures
+        self.F = np.asarray(F, dtype=float)  # k x k factor covariance
+        self.d = np.asarray(d, dtype=float)  # n specific variances
+        self.n, self.k = self.B.shape
+        self._L = self.B @ _sqrt_psd(self.F)  # Σ = L L' + D
+        self._factor = (None, None)
+
+    def matvec(self, x):
+        return self._L @ (self._L.T @ x) + self.d * x
+
+    def diag(self):
+        return np.einsum("ij,ij->i", self._L, self._L) + self.d
+
+    def sub(self, idx):
+        """Dense block Σ[idx, idx]; only used for small index sets."""
+        L = self._L[idx]
+        S = L @ L.T
+        S[np.diag_indices_from(S)] += self.d[idx]
+        return S
+
+    def restrict(self, idx) -> "FactorCov":
+        out = FactorCov.__new__(FactorCov)
+        out.B, out.F, out.d = self.B[idx], self.F, self.d[idx]
+        out.n, out.k = out.B.shape
+        out._L = self._L[idx]
+        out._factor = (None, None)
+        return out
+
+    def solver(self, scale: float, shift: float, U: np.ndarray):
+        """
+        b -> (scale*Σ + shift*I + U U')^-1 b via Woodbury: with W = [√scale·L, U]
+        and D' = scale*d + shift, the inverse is D'^-1 - D'^-1 W (I + W'D'^-1 W)^-1 W'D'^-1.
+        """
+        key = (scale, shift, U.shape, U.tobytes())
+        if self._factor[0] == key:
+            return self._factor[1]
+        dk = scale * self.d + shift
+        W = np.hstack([np.sqrt(scale) * self._L, U])
+        Wd = W / dk[:, None]
+        core = cho_factor(np.eye(W.shape[1]) + W.T @ Wd, check_finite=False)
+
+        def solve(b):
+            y = b / dk
+            return y - Wd @ cho_solve(core, W.T @ y, check_finite=False)
+
+        self._factor = (key, solve)
+        return solve
+
+    def dense(self) -> np.ndarray:
+        return self.sub(np.arange(self.n))
+
+    def risk_split(self, w) -> Tuple[float, float]:
+        """(factor variance, specific variance) of portfolio w."""
+        f = self._L.T @ w
+        return float(f @ f), float(np.sum(self.d * w * w))
+
+
+def _floor(d, total):
+    return np.maximum(d, _D_FLOOR * max(float(np.median(total)), 1e-12))
+
+
+def pca_model(X: np.ndarray, k: int, valid: Optional[np.ndarray] = None) -> FactorCov:
+    """
+    Statistical factors from a (T, n) returns matrix: top-k principal components
+    of the demeaned returns via a thin SVD (O(T n min(T, n)), no n x n matrix).
+    Missing observations (valid=False) contribute zero after demeaning.
+    """
+    if valid is None:
+        valid = np.isfinite(X)
+    cnt = np.maximum(valid.sum(axis=0), 2)
+    Xz = np.where(valid, X, 0.0)
+    Xc = np.where(valid, Xz - Xz.sum(axis=0) / cnt, 0.0)
+    var = (Xc**2).sum(axis=0) / (cnt - 1)
+    k = max(1, min(k, min(Xc.shape) - 1))
+    _, s, Vt = np.linalg.svd(Xc, full_matrices=False)
+    B = Vt[:k].T
+    F = np.diag(s[:k] ** 2 / (Xc.shape[0] - 1))
+    d = _floor(var - np.einsum("ij,j,ij->i", B, np.diag(F), B), var)
+    return FactorCov(B, F, d)
+
+
+def regression_model(
+    X: np.ndarray, Fr: np.ndarray, valid: Optional[np.ndarray] = None
+) -> FactorCov:
+    """
+    User-supplied factors: time-series regression of each asset's returns X (T, n)
+    on factor returns Fr (T, k), from pairwise moments so gaps in X are fine.
+    B = Cov(x, f) Cov(f)^-1, F = Cov(f), d = Var(x) - b F b'.
+    """
+    if valid is None:
+        valid = np.isfinite(X)
+    Fc = Fr - Fr.mean(axis=0)
+    F = Fc.T @ Fc / (len(Fr) - 1)
+    cnt = np.maximum(valid.sum(axis=0), 2)
+    Xz = np.where(valid, X, 0.0)
+    Xc = np.where(valid, Xz - Xz.sum(axis=0) / cnt, 0.0)
+    var = (Xc**2).sum(axis=0) / (cnt - 1)
+    cross = (Xc.T @ Fc) / (cnt - 1)[:, None]  # n x k
+    B = np.linalg.solve(F + 1e-12 * np.eye(len(F)), cross.T).T
+    d = _floor(var - np.einsum("ij,jk,ik->i", B, F, B), var)
+    return FactorCov(B, F, d)
@@ -0,0 +1,365 @@
+# backend/optim/qp.py
+"""
+Convex QP for portfolio problems:
+
+    min 0.5 * scale * x'Σx + q'x   s.t.  lo <= x <= hi,  l <= A x <= u
+
+solved with the OSQP operator-splitting (ADMM) iteration: Σ is factored once
+(together with the few dense rows of A), every iteration is two triangular
+solves, and the result is polished by solving the KKT system of the detected
+active set, which makes bounds and equalities hold to machine precision.
+Results carry the primal/dual state so the next solve can warm-start from it.
+"""
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+
+_INF = np.inf
+# Free sets up to this size are polished with a dense KKT solve
+POLISH_DENSE_MAX = 500
+# Dense systems up to this size are solved with an explicit inverse
+DENSE_INVERSE_MAX = 256
+
+
+class DenseCov:
+    """Σ as a dense matrix. Other operators (optim.factor.FactorCov) mirror this API."""
+
+    def __init__(self, S):
+        self.S = np.asarray(S, dtype=float)
+        self.n = self.S.shape[0]
+        self._factor = (None, None)
+
+    def matvec(self, x):
+        return self.S @ x
+
+    def diag(self):
+        return np.diag(self.S).copy()
+
+    def sub(self, idx):
+        return self.S[np.ix_(idx, idx)]
+
+    def solver(self, scale: float, shift: float, U: np.ndarray):
+        """
+        Factor scale*Σ + shift*I + U U' once; returns b -> solution. The last
+        factorization is memoized, so a sweep of solves over the same operator
+        and constraint rows (e.g. a frontier) factors only once.
+        """
+        key = (scale, shift, U.shape, U.tobytes())
+        if self._factor[0] == key:
+            return self._factor[1]
+        K = scale * self.S + U @ U.T
+        K[np.diag_indices_from(K)] += shift
+        c = cho_factor(K, check_finite=False)
+        if self.n <= DENSE_INVERSE_MAX:
+            # One GEMV per iteration beats two triangular solves at this size
+            Kinv = cho_solve(c, np.eye(self.n), check_finite=False)
+            solve = lambda b: Kinv @ b
+        else:
+            solve = lambda b: cho_solve(c, b, check_finite=False)
+        self._factor = (key, solve)
+        return solve
+
+
+def as_cov(cov):
+    return cov if hasattr(cov, "matvec") else DenseCov(cov)
+
+
+@dataclass
+class QPResult:
+    x: np.ndarray
+    obj: float
+    status: str  # "solved" | "max_iter"
+    iters: int
+    polished: bool
+    # ADMM state for warm starts
+    rho: float
+    zb: np.ndarray
+    za: np.ndarray
+    yb: np.ndarray
+    ya: np.ndarray
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "solved"
+
+
+def _objective(P, scale, q, x):
+    return float(0.5 * scale * x @ P.matvec(x) + q @ x)
+
+
+def _project_budget(x, lo, hi, budget, iters=100):
+    """Exact projection onto {lo <= x <= hi, sum(x) = budget} by bisection on a shift."""
+    a, b = np.min(x - hi), np.max(x - lo)
+    for _ in range(iters):
+        tau = 0.5 * (a + b)
+        if np.clip(x - tau, lo, hi).sum() > budget:
+            a = tau
+        else:
+            b = tau
+    return np.clip(x - 0.5 * (a + b), lo, hi)
+
+
+def _kkt(P, scale, F, g, AF, b, delta=1e-11):
+    """
+    Solve [P_FF A'; A 0][x; nu] = [-g; b]. Structured operators (restrict +
+    solver) use the Schur complement on the few rows of A, so a large free set
+    never becomes a dense block; dense ones use a direct solve.
+    """
+    k, m = len(F), AF.shape[0]
+    if hasattr(P, "restrict") and k > POLISH_DENSE_MAX:
+        solve = P.restrict(F).solver(scale, delta, np.zeros((k, 0)))
+        Pg = solve(-g)
+        PA = np.column_stack([solve(a) for a in AF]) if m else np.zeros((k, 0))
+        if m:
+            nu = np.linalg.solve(AF @ PA, AF @ Pg - b)
+            return Pg - PA @ nu, nu
+        return Pg, np.zeros(0)
+    K = np.zeros((k + m, k + m))
+    K[:k, :k] = scale * P.sub(F) + delta * np.eye(k)
+    K[:k, k:] = AF.T
+    K[k:, :k] = AF
+    K[k:, k:] = -delta * np.eye(m)
+    sol = np.linalg.solve(K, np.concatenate([-g, b]))
+    return sol[:k], sol[k:]
+
+
+def _polish(P, scale, q, lo, hi, A, l, u, eq, zb, za, yb, ya, tol):
+    """
+    Guess the active set from (z, y), solve its KKT system and accept the point
+    only if it is feasible and every active multiplier has the right sign.
+    """
+    n = len(q)
+    at_lo = zb - lo < -yb
+    at_hi = hi - zb < yb
+    fixed = at_lo | at_hi
+    xfix = np.zeros(n)
+    xfix[at_lo] = lo[at_lo]
+    xfix[at_hi] = hi[at_hi]
+    F = np.flatnonzero(~fixed)
+
+    row_lo = (za - l < -ya) & ~eq
+    row_hi = (u - za < ya) & ~eq
+    act = eq | row_lo | row_hi
+    b_act = np.where(row_lo, l, u)[act]
+    Aa = A[act]
+
+    x = xfix.copy()
+    nu = np.zeros(Aa.shape[0])
+    if len(F):
+        g = q[F] + scale * P.matvec(xfix)[F]
+        AF = Aa[:, F]
+        rhs = b_act - Aa @ xfix
+        try:
+            x[F], nu = _kkt(P, scale, F, g, AF, rhs)
+        except np.linalg.LinAlgError:
+            return None
+
+    Ax = A @ x
+    if not (
+        np.all(x >= lo - tol)
+        and np.all(x <= hi + tol)
+        and np.all(Ax >= l - tol)
+        and np.all(Ax <= u + tol)
+    ):
+        return None
+    # Stationarity P x + q + y_box + A'y_rows = 0 gives the bound multipliers
+    grad = scale * P.matvec(x) + q + Aa.T @ nu
+    y_box = -grad
+    dtol = 1e-7 * max(1.0, np.max(np.abs(grad)), np.max(np.abs(nu), initial=0.0))
+    y_rows = np.zeros(A.shape[0])
+    y_rows[act] = nu
+    if (
+        np.any(y_box[at_lo] > dtol)
+        or np.any(y_box[at_hi] < -dtol)
+        or np.any(y_rows[row_lo] > dtol)
+        or np.any(y_rows[row_hi] < -dtol)
+    ):
+        return None
+    return np.clip(x, lo, hi)
+
+
+def solve_qp(
+    cov,
+    q: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    A: Optional[np.ndarray] = None,
+    l: Optional[np.ndarray] = None,
+    u: Optional[np.ndarray] = None,
+    scale: float = 1.0,
+    warm: Optional[QPResult] = None,
+    rho: float = 0.1,
+    sigma: float = 1e-6,
+    alpha: float = 1.6,
+    eps_abs: float = 1e-6,
+    eps_rel: float = 1e-6,
+    max_iter: int = 10000,
+    polish: bool = True,
+) -> QPResult:
+    P = as_cov(cov)
+    q = np.asarray(q, dtype=float)
+    n = len(q)
+    lo = np.broadcast_to(np.asarray(lo, dtype=float), (n,)).copy()
+    hi = np.broadcast_to(np.asarray(hi, dtype=float), (n,)).copy()
+    A = np.zeros((0, n)) if A is None else np.atleast_2d(np.asarray(A, dtype=float))
+    l = np.full(A.shape[0], -_INF) if l is None else np.asarray(l, dtype=float)
+    u = np.full(A.shape[0], _INF) if u is None else np.asarray(u, dtype=float)
+    eq = np.abs(u - l) < 1e-12
+
+    # Equilibrate: unit-norm constraint rows and an O(1) objective. Neither
+    # changes the minimizer; both matter a lot for ADMM convergence.
+    norms = np.linalg.norm(A, axis=1)
+    norms[norms == 0] = 1.0
+    budget_rows = [i for i in np.flatnonzero(eq) if np.all(A[i] == 1.0)]
+    budgets = l[budget_rows]
+    A, l, u = A / norms[:, None], l / norms, u / norms
+    c = 1.0 / max(float(np.mean(P.diag())) * scale, 1e-12)
+    c = min(c, 1.0 / max(np.max(np.abs(q)), 1e-12)) if np.any(q) else c
+    scale, q = scale * c, q * c
+
+    def rhos(r):
+        return r, np.where(eq, 1e3 * r, r)
+
+    if warm is not None and len(warm.x) == n and len(warm.ya) == A.shape[0]:
+        rho = warm.rho
+        x, zb, za = warm.x.copy(), warm.zb.copy(), warm.za.copy()
+        yb, ya = warm.yb.copy(), warm.ya.copy()
+    else:
+        warm = None
+    rho_b, rho_a = rhos(rho)
+    solve = P.solver(scale, sigma + rho_b, A.T * np.sqrt(rho_a))
+
+    if warm is None:
+        x = np.clip(np.full(n, 1.0 / n), lo, hi)
+        zb, za = x.copy(), np.clip(A @ x, l, u)
+        yb, ya = np.zeros(n), np.zeros(A.shape[0])
+
+    status, it = "max_iter", 0
+    check_every = 10
+    for it in range(1, max_iter + 1):
+        rhs = sigma * x - q + (rho_b * zb - yb) + A.T @ (rho_a * za - ya)
+        xt = solve(rhs)
+        zat = A @ xt
+        x = alpha * xt + (1.0 - alpha) * x
+        zb_hat = alpha * xt + (1.0 - alpha) * zb
+        za_hat = alpha * zat + (1.0 - alpha) * za
+        zb_new = np.clip(zb_hat + yb / rho_b, lo, hi)
+        za_new = np.clip(za_hat + ya / rho_a, l, u)
+        yb = yb + rho_b * (zb_hat - zb_new)
+        ya = ya + rho_a * (za_hat - za_new)
+        zb, za = zb_new, za_new
+
+        if it % check_every:
+            continue
+        Px = scale * P.matvec(x)
+        Ax = A @ x
+        Aty = A.T @ ya
+        r_prim = max(np.max(np.abs(x - zb)), np.max(np.abs(Ax - za), initial=0.0))
+        r_dual = np.max(np.abs(Px + q + yb + Aty))
+        n_prim = max(np.max(np.abs(x)), np.max(np.abs(Ax), initial=0.0), 1e-12)
+        n_dual = max(np.max(np.abs(Px)), np.max(np.abs(q)), np.max(np.abs(yb + Aty)), 1e-12)
+        eps_p, eps_d = eps_abs + eps_rel * n_prim, eps_abs + eps_rel * n_dual
+        if r_prim <= eps_p and r_dual <= eps_d:
+            status = "solved"
+            break
+        if it % (5 * check_every) == 0:
+            # The active set is usually settled long before the tolerances are met
+            if polish and r_prim <= 1e4 * eps_p and r_dual <= 1e4 * eps_d:
+                early = _polish(P, scale, q, lo, hi, A, l, u, eq, zb, za, yb, ya, 1e-9)
+                if early is not None:
+                    status = "solved"
+                    break
+            # Rebalance primal vs dual progress (OSQP's adaptive rho)
+            ratio = np.sqrt((r_prim / eps_p) / max(r_dual / eps_d, 1e-30))
+            if ratio > 5.0 or ratio < 0.2:
+                rho_b, rho_a = rhos(float(np.clip(rho_b * ratio, 1e-6, 1e6)))
+                solve = P.solver(scale, sigma + rho_b, A.T * np.sqrt(rho_a))
+
+    w = zb.copy()
+    polished = False
+    if polish:
+        xp = _polish(P, scale, q, lo, hi, A, l, u, eq, zb, za, yb, ya, 1e-9)
+        if xp is not None:
+            w, polished = xp, True
+    if not polished:
+        # Make the budget row (all ones, equality; unscaled) exact as well
+        for b in budgets:
+            w = _project_budget(w, lo, hi, b)
+    return QPResult(
+        x=w,
+        obj=_objective(P, scale, q, w) / c,
+        status="solved" if polished else status,
+        iters=it,
+        polished=polished,
+        rho=rho_b,
+        zb=zb,
+        za=za,
+        yb=yb,
+        ya=ya,
+    )
+
+
+def max_return_weights(mu, lo, hi, budget: float) -> np.ndarray:
+    """argmax mu'w over the box with sum(w) = budget (greedy fill from the top)."""
+    w = np.array(lo, dtype=float, copy=True)
+    room = budget - w.sum()
+    for i in np.argsort(-mu, kind="stable"):
+        take = min(hi[i] - w[i], max(room, 0.0))
+        w[i] += take
+        room -= take
+    return w
+
+
+def max_return(mu, lo, hi, budget: float) -> float:
+    return float(mu @ max_return_weights(mu, lo, hi, budget))
+
+
+def mean_variance(
+    cov,
+    mu: np.ndarray,
+    target: Optional[float] = None,
+    lam: Optional[float] = None,
+    lo=0.0,
+    hi=1.0,
+    budget: Optional[float] = 1.0,
+    groups: Sequence[Tuple[Iterable[int], Optional[float], Optional[float]]] = (),
+    warm: Optional[QPResult] = None,
+) -> QPResult:
+    """
+    min 0.5 w'Σw - lam * mu'w  subject to box bounds, optional budget sum(w)=budget,
+    optional mu'w >= target and group limits gmin <= sum(w[idx]) <= gmax.
+    lam defaults to 0 with a target and to a small tilt (1e-3) without one.
+    """
+    mu = np.asarray(mu, dtype=float)
+    n = len(mu)
+    lo = np.broadcast_to(np.asarray(lo, dtype=float), (n,))
+    hi = np.broadcast_to(np.asarray(hi, dtype=float), (n,))
+    if lam is None:
+        lam = 0.0 if target is not None else 1e-3
+    rows, l, u = [], [], []
+    if budget is not None:
+        rows.append(np.ones(n))
+        l.append(budget)
+        u.append(budget)
+    if target is not None:
+        rows.append(mu)
+        l.append(target)
+        u.append(_INF)
+    for idx, gmin, gmax in groups:
+        row = np.zeros(n)
+        row[list(idx)] = 1.0
+        rows.append(row)
+        l.append(-_INF if gmin is None else gmin)
+        u.append(_INF if gmax is None else gmax)
+    A = np.array(rows) if rows else None
+    return solve_qp(
+        cov,
+        -lam * mu,
+        lo,
+        hi,
+        A,
+        np.array(l) if rows else None,
+        np.array(u) if rows else None,
+        warm=warm,
+    )
@@ -0,0 +1,258 @@
+# backend/optim/qubo.py
+"""
+Cardinality selection as a QUBO, with classical solvers.
+
+    E(x) = x'Qx + c'x + const,   x in {0,1}^n
+
+`cardinality_qubo` builds Q and c directly as arrays for
+x'Σx - γ μ'x + P (Σx - k)². Solvers share one result schema:
+  - exact:  vectorized enumeration, restricted to |x| = k when k is given
+  - anneal: simulated annealing, many chains in lockstep; with k given the
+            moves are swaps (one in, one out) so every state is feasible
+  - tabu:   best-swap / best-flip local search with a tabu tenure
+`solve_qubo(method="auto")` picks exact for small n and anneal + tabu above.
+An optional `cancel()` runs between enumeration chunks / annealing blocks
+and may raise to stop the search.
+"""
+import os
+from itertools import combinations
+from math import comb
+from typing import Optional
+import numpy as np
+
+QUBO_EXACT_MAX_N = int(os.getenv("QUBO_EXACT_MAX_N", "20"))
+_CHUNK = 1 << 15
+
+
+def cardinality_qubo(cov, mu, k: Optional[int], gamma: float = 0.5, penalty=None):
+    """(Q, c, const) for x'Σx - γμ'x + P(Σx - k)²; Q symmetric."""
+    cov = np.asarray(cov, dtype=float)
+    mu = np.asarray(mu, dtype=float)
+    n = len(mu)
+    Q = (cov + cov.T) / 2.0
+    c = -gamma * mu
+    const = 0.0
+    if k is not None:
+        if penalty is None:
+            # Larger than any single move can gain, so violating |x| = k never pays
+            penalty = float(
+                np.max(np.abs(np.diag(Q)) + 2.0 * np.abs(Q).sum(axis=1))
+                + gamma * np.max(np.abs(mu))
+                + 1e-9
+            )
+        # P(Σx - k)² = P Σ_ij x_i x_j - 2Pk Σ x_i + P k²
+        Q = Q + penalty
+        c = c - 2.0 * penalty * k
+        const = penalty * k * k
+    return Q, c, const
+
+
+def energies(Q, c, X):
+    """E for each row of X (m, n), without the constant."""
+    return np.einsum("ij,ij->i", X @ Q, X) + X @ c
+
+
+def _result(Q, c, x, method, evaluated):
+    x = np.asarray(x, dtype=float)
+    return {
+        "x": x,
+        "energy": float(x @ Q @ x + c @ x),
+        "method": method,
+        "evaluated": int(evaluated),
+    }
+
+
+def solve_exact(Q, c, k: Optional[int] = None, cancel=None):
+    n = len(c)
+    best_e, best_x, seen = np.inf, None, 0
+    if k is not None:
+        # Only the C(n, k) feasible subsets, in chunks
+        it = combinations(range(n), k)
+        while True:
+            if cancel is not None:
+                cancel()
+            idx = np.array([s for _, s in zip(range(_CHUNK), it)], dtype=np.int64)
+            if idx.size == 0:
+                break
+            X = np.zeros((len(idx), n))
+            np.put_along_axis(X, idx.reshape(len(idx), -1), 1.0, axis=1)
+            e = energies(Q, c, X)
+            j = int(np.argmin(e))
+            if e[j] < best_e:
+                best_e, best_x = e[j], X[j].copy()
+            seen += len(idx)
+    else:
+        shifts = np.arange(n, dtype=np.int64)
+        for lo in range(0, 1 << n, _CHUNK):
+            if cancel is not None:
+                cancel()
+            codes = np.arange(lo, min(lo + _CHUNK, 1 << n), dtype=np.int64)
+            X = ((codes[:, None] >> shifts) & 1).astype(float)
+            e = energies(Q, c, X)
+            j = int(np.argmin(e))
+            if e[j] < best_e:
+                best_e, best_x = e[j], X[j].copy()
+            seen += len(codes)
+    return _result(Q, c, best_x, "exact", seen)
+
+
+def _random_states(rng, chains, n, k):
+    if k is None:
+        return (rng.random((chains, n)) < 0.5).astype(float)
+    order = np.argsort(rng.random((chains, n)), axis=1)
+    X = np.zeros((chains, n))
+    np.put_along_axis(X, order[:, :k], 1.0, axis=1)
+    return X
+
+
+def simulated_annealing(
+    Q,
+    c,
+    k: Optional[int] = None,
+    sweeps: int = 200,
+    chains: int = 32,
+    seed: int = 0,
+    max_steps: int = 50_000,
+    cancel=None,
+):
+    """
+    `chains` independent annealers advanced together; each step proposes one
+    move per chain and updates the local fields g = 2Qx + c in O(n).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(c)
+    if k is not None and (k <= 0 or k >= n):
+        x = np.ones(n) if k and k >= n else np.zeros(n)
+        return _result(Q, c, x, "anneal", 1)
+    X = _random_states(rng, chains, n, k)
+    G = 2.0 * X @ Q + c
+    E = energies(Q, c, X)
+    dq = np.diag(Q)
+    rows = np.arange(chains)
+    if k is not None:
+        ins = np.argsort(-X, axis=1, kind="stable")
+        outs, ins = ins[:, k:], ins[:, :k]
+
+    steps = max(1, min(sweeps * n, max_steps))
+    # Temperature from the typical size of an uphill move at the start
+    scale = float(np.median(np.abs(G))) + 1e-12
+    temps = scale * np.geomspace(1.0, 1e-4, steps)
+    best_e, best_x = E.copy(), X.copy()
+    for step, T in enumerate(temps):
+        if cancel is not None and step % 1024 == 0:
+            cancel()
+        if k is None:
+            i = rng.integers(0, n, chains)
+            s = 1.0 - 2.0 * X[rows, i]
+            delta = s * G[rows, i] + dq[i]
+        else:
+            a = rng.integers(0, k, chains)
+            b = rng.integers(0, n - k, chains)
+            i, j = ins[rows, a], outs[rows, b]
+            delta = G[rows, j] - G[rows, i] + dq[i] + dq[j] - 2.0 * Q[i, j]
+        accept = (delta <= 0) | (rng.random(chains) < np.exp(-np.maximum(delta, 0) / T))
+        if not accept.any():
+            continue
+        r = rows[accept]
+        if k is None:
+            ii, ss = i[accept], s[accept]
+            X[r, ii] += ss
+            G[r] += 2.0 * ss[:, None] * Q[ii]
+        else:
+            ii, jj = i[accept], j[accept]
+            X[r, ii], X[r, jj] = 0.0, 1.0
+            G[r] += 2.0 * (Q[jj] - Q[ii])
+            ins[r, a[accept]], outs[r, b[accept]] = jj, ii
+        E[r] += delta[accept]
+        better = E < best_e
+        best_e[better], best_x[better] = E[better], X[better]
+    j = int(np.argmin(best_e))
+    return _result(Q, c, best_x[j], "anneal", steps * chains)
+
+
+def tabu_search(
+    Q,
+    c,
+    k: Optional[int] = None,
+    x0=None,
+    iters: int = None,
+    tenure: int = None,
+    seed: int = 0,
+):
+    """Take the best non-tabu move each iteration (aspiration if it beats the best)."""
+    rng = np.random.default_rng(seed)
+    n = len(c)
+    if k is not None and (k <= 0 or k >= n):
+        return _result(Q, c, np.ones(n) if k and k >= n else np.zeros(n), "tabu", 1)
+    x = (
+        np.asarray(x0, dtype=float).copy()
+        if x0 is not None
+        else _random_states(rng, 1, n, k)[0]
+    )
+    iters = iters or 20 * n
+    tenure = tenure or max(3, min(n // 4, 20))
+    g = 2.0 * Q @ x + c
+    e = float(x @ Q @ x + c @ x)
+    best_e, best_x = e, x.copy()
+    dq = np.diag(Q)
+    tabu_until = np.zeros(n, dtype=np.int64)
+    evaluated = 0
+    for it in range(1, iters + 1):
+        free = tabu_until < it
+        if k is None:
+            s = 1.0 - 2.0 * x
+            delta = s * g + dq
+            ok = free | (e + delta < best_e - 1e-12)
+            if not ok.any():
+                continue
+            i = int(np.argmin(np.where(ok, delta, np.inf)))
+            x[i] += s[i]
+            g += 2.0 * s[i] * Q[i]
+            e += float(delta[i])
+            tabu_until[i] = it + tenure
+            evaluated += n
+        else:
+            I, J = np.flatnonzero(x > 0.5), np.flatnonzero(x < 0.5)
+            D = (
+                g[J][None, :]
+                - g[I][:, None]
+                + dq[I][:, None]
+                + dq[J][None, :]
+                - 2.0 * Q[np.ix_(I, J)]
+            )
+            ok = (free[I][:, None] & free[J][None, :]) | (e + D < best_e - 1e-12)
+            if not ok.any():
+                continue
+            a, b = np.unravel_index(int(np.argmin(np.where(ok, D, np.inf))), D.shape)
+            i, j = I[a], J[b]
+            x[i], x[j] = 0.0, 1.0
+            g += 2.0 * (Q[j] - Q[i])
+            e += float(D[a, b])
+            tabu_until[[i, j]] = it + tenure
+            evaluated += D.size
+        if e < best_e - 1e-12:
+            best_e, best_x = e, x.copy()
+    return _result(Q, c, best_x, "tabu", evaluated)
+
+
+def solve_qubo(Q, c, k: Optional[int] = None, method: str = "auto", seed: int = 0, cancel=None):
+    """Dispatch by method; "auto" = exact when small enough, else anneal then tabu."""
+    n = len(c)
+    if k is not None and not 0 <= k <= n:
+        raise ValueError(f"Cardinality {k} is outside 0..{n} for {n} assets")
+    if method == "auto":
+        small = n <= QUBO_EXACT_MAX_N and (k is None or comb(n, k) <= 1 << 20)
+        method = "exact" if small else "anneal+tabu"
+    if method == "exact":
+        return solve_exact(Q, c, k, cancel)
+    if method == "anneal":
+        return simulated_annealing(Q, c, k, seed=seed, cancel=cancel)
+    if method == "tabu":
+        return tabu_search(Q, c, k, seed=seed)
+    if method == "anneal+tabu":
+        sa = simulated_annealing(Q, c, k, seed=seed, cancel=cancel)
+        tb = tabu_search(Q, c, k, x0=sa["x"], seed=seed)
+        out = tb if tb["energy"] <= sa["energy"] else sa
+        out.update(method="anneal+tabu", evaluated=sa["evaluated"] + tb["evaluated"])
+        return out
+    raise ValueError(f"Unknown QUBO solver {method}; use auto, exact, anneal or tabu")
@@ -0,0 +1,192 @@
+# backend/pricing/basket.py
+"""
+European options on several correlated underlyings, by Monte Carlo.
+
+Terminal prices are drawn jointly, S_T = S0 exp((r - q - σ²/2)T + L z) with
+L L' = Σ T, so one matrix product per chunk gives every path. Payoffs:
+
+  basket   max(±(Σ w_i S_i - K), 0)   (a spread is a basket with weights 1, -1)
+  best     max(±(max_i w_i S_i - K), 0)
+  worst    max(±(min_i w_i S_i - K), 0)
+
+Antithetic pairs (z, -z) are averaged into one sample before any statistics,
+so the standard error stays honest. Control variates with exact means are
+regressed out: the discounted terminal prices always, and for long-only
+baskets the geometric basket option with the same value weights, which is
+lognormal and priced in closed form. Chunks only accumulate sums, so memory
+is O(chunk x assets) at any path count.
+"""
+import os
+import numpy as np
+from scipy.special import ndtr
+
+BASKET_CHUNK = int(os.getenv("BASKET_CHUNK", "50000"))
+BASKET_MAX_PATHS = int(os.getenv("BASKET_MAX_PATHS", "20000000"))
+PAYOFFS = ("basket", "best", "worst")
+
+
+def _black(F, K, v, disc, is_call):
+    """Discounted Black price for a lognormal forward F with log-variance v."""
+    if v <= 0:
+        return disc * max((F - K) if is_call else (K - F), 0.0)
+    sv = np.sqrt(v)
+    d1 = (np.log(F / K) + 0.5 * v) / sv
+    d2 = d1 - sv
+    if is_call:
+        return disc * (F * ndtr(d1) - K * ndtr(d2))
+    return disc * (K * ndtr(-d2) - F * ndtr(-d1))
+
+
+def moment_matched(S0, w, K, T, r, q, cov, is_call=True):
+    """
+    Basket price from a lognormal with the basket's first two moments (Levy).
+    An approximation, reported next to the MC price; None when the basket
+    forward is not positive (e.g. most spreads).
+    """
+    fwd = S0 * np.exp((r - q) * T)
+    F = float(w @ fwd)
+    if F <= 0 or K <= 0:
+        return None
+    a = w * fwd
+    m2 = float(a @ np.exp(np.asarray(cov) * T) @ a)
+    return float(_black(F, K, np.log(m2 / F**2), np.exp(-r * T), is_call))
+
+
+def _geometric(S0, w, K, T, r, q, cov, is_call):
+    """Value weights a, base B0, and closed-form price of the geometric basket option."""
+    B0 = float(w @ S0)
+    a = w * S0 / B0
+    m = float(a @ (r - q - 0.5 * np.diag(cov))) * T
+    v = float(a @ cov @ a) * T
+    return a, B0, float(_black(B0 * np.exp(m + 0.5 * v), K, v, np.exp(-r * T), is_call))
+
+
+def _factor(cov, T):
+    try:
+        return np.linalg.cholesky(cov * T + 1e-14 * np.eye(len(cov)))
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(cov * T)
+        return vecs * np.sqrt(np.maximum(vals, 0.0))
+
+
+def basket_mc(
+    S0,
+    w,
+    K: float,
+    T: float,
+    r: float,
+    q,
+    cov,
+    payoff: str = "basket",
+    is_call: bool = True,
+    paths: int = 200_000,
+    antithetic: bool = True,
+    control: bool = True,
+    seed=None,
+    chunk: int = None,
+    progress=None,
+) -> dict:
+    """
+    Price, standard error and diagnostics; cov is the annualized covariance.
+    `progress(done, total, **fields)` gets the running (uncontrolled) estimate
+    after every chunk.
+    """
+    S0 = np.asarray(S0, dtype=float)
+    w = np.asarray(w, dtype=float)
+    n = len(S0)
+    q = np.broadcast_to(np.asarray(q, dtype=float), (n,))
+    cov = np.asarray(cov, dtype=float)
+    if payoff not in PAYOFFS:
+        raise ValueError(f"Unknown payoff {payoff}; use {', '.join(PAYOFFS)}")
+    if cov.shape != (n, n) or len(w) != n:
+        raise ValueError("S0, weights and covariance sizes differ")
+    if T <= 0:
+        raise ValueError("T must be positive")
+    if not 1000 <= paths <= BASKET_MAX_PATHS:
+        raise ValueError(f"num_paths must be between 1000 and {BASKET_MAX_PATHS}")
+    chunk = int(chunk or BASKET_CHUNK)
+
+    sign = 1.0 if is_call else -1.0
+    disc = np.exp(-r * T)
+    L = _factor(cov, T)
+    drift = (r - q - 0.5 * np.diag(cov)) * T
+    # Controls with known means: e^{-rT} S_i(T) has mean S0_i e^{-q_i T}
+    means = [S0 * np.exp(-q * T)]
+    geo = None
+    if control and payoff == "basket" and np.all(w >= 0) and w.sum() > 0:
+        a, B0, g_price = _geometric(S0, w, K, T, r, q, cov, is_call)
+        geo = (a, B0)
+        means.append(np.array([g_price]))
+    EX = np.concatenate(means) if control else np.zeros(0)
+    m = len(EX)
+
+    def sample(z):
+        lnS = drift + z @ L.T
+        ST = S0 * np.exp(lnS)
+        if payoff == "basket":
+            U = ST @ w
+        elif payoff == "best":
+            U = (ST * w).max(axis=1)
+        else:
+            U = (ST * w).min(axis=1)
+        Y = disc * np.maximum(sign * (U - K), 0.0)
+        if not control:
+            return Y, None
+        cols = [disc * ST]
+        if geo is not None:
+            G = geo[1] * np.exp(lnS @ geo[0])
+            cols.append((disc * np.maximum(sign * (G - K), 0.0))[:, None])
+        return Y, np.hstack(cols)
+
+    # Running sums over independent samples (antithetic pairs count once)
+    n_samples = paths // 2 if antithetic else paths
+    sy = syy = 0.0
+    sx = np.zeros(m)
+    sxx = np.zeros((m, m))
+    sxy = np.zeros(m)
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_samples // chunk))
+    for i, ss in enumerate(seeds):
+        c = min(chunk, n_samples - i * chunk)
+        z = np.random.default_rng(ss).standard_normal((c, n))
+        Y, X = sample(z)
+        if antithetic:
+            Y2, X2 = sample(-z)
+            Y = 0.5 * (Y + Y2)
+            X = 0.5 * (X + X2) if X is not None else None
+        sy += Y.sum()
+        syy += Y @ Y
+        if X is not None:
+            sx += X.sum(axis=0)
+            sxx += X.T @ X
+            sxy += X.T @ Y
+        if progress is not None:
+            k = i * chunk + c
+            run = sy / k
+            progress(
+                k * (2 if antithetic else 1), paths, unit="paths", price=float(run),
+                stderr=float(np.sqrt(max(syy / k - run * run, 0.0) / k)),
+            )
+
+    N = float(n_samples)
+    mean_y = sy / N
+    var_y = max(syy / N - mean_y**2, 0.0) * N / (N - 1)
+    plain_se = np.sqrt(var_y / N)
+    price, se, beta = mean_y, plain_se, None
+    if control:
+        mean_x = sx / N
+        cxx = (sxx / N - np.outer(mean_x, mean_x)) * N / (N - 1)
+        cxy = (sxy / N - mean_x * mean_y) * N / (N - 1)
+        beta = np.linalg.lstsq(cxx, cxy, rcond=None)[0]
+        price = mean_y - float(beta @ (mean_x - EX))
+        se = np.sqrt(max(var_y - float(cxy @ beta), 0.0) / N)
+    return {
+        "price": float(price),
+        "stderr": float(se),
+        "plainPrice": float(mean_y),
+        "plainStderr": float(plain_se),
+        "varianceReduction": float((plain_se / se) ** 2) if se > 0 else None,
+        "geometricControl": geo is not None,
+        "paths": int(n_samples * (2 if antithetic else 1)),
+        "antithetic": bool(antithetic),
+        "chunks": len(seeds),
+    }
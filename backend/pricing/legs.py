@@ -0,0 +1,95 @@
+# backend/pricing/legs.py
+"""
+Market inputs for option legs ({ticker, expiry, strike, option_type, qty}),
+resolved together and returned as arrays for the vectorized pricers.
+"""
+from datetime import datetime, timezone
+from typing import List
+import numpy as np
+from services.market_data import get_chain_table, get_spot, prefetch
+from storage.history import load_close
+from utils.sanitize import normalize_ticker
+
+
+def year_fraction(expiry: str) -> float:
+    """Years from now to a "YYYY-MM-DD" expiry (floored at 1e-6)."""
+    dt = datetime.fromisoformat(str(expiry)).replace(tzinfo=timezone.utc)
+    return max(1e-6, (dt - datetime.now(timezone.utc)).days / 365.0)
+
+
+def _chain_vol(ticker, expiry, strike, is_call):
+    try:
+        tbl = get_chain_table(ticker, expiry)["calls" if is_call else "puts"]
+    except Exception:
+        return None
+    if tbl is None or len(tbl["strike"]) == 0:
+        return None
+    i = int(np.argmin(np.abs(tbl["strike"] - strike)))
+    vol = float(tbl["impliedVol"][i])
+    return vol if vol > 0 else None
+
+
+def _hist_vol(ticker):
+    ret = load_close(ticker, "1y").pct_change().dropna()
+    if ret.empty:
+        raise ValueError(f"{ticker}: cannot infer sigma")
+    return float(ret.std() * np.sqrt(252))
+
+
+def spot_or_last(ticker: str) -> float:
+    S0 = get_spot(ticker)
+    if not S0:
+        hist = load_close(ticker, "1mo")
+        if hist.empty:
+            raise ValueError(f"{ticker}: no recent price")
+        S0 = float(hist.iloc[-1])
+    return float(S0)
+
+
+def resolve_legs(legs: List[dict]) -> dict:
+    """
+    {"ticker", "expiry", "S0", "K", "T", "sigma", "is_call", "american", "qty",
+    "multiplier"} with one entry per leg; "style": "American" marks early
+    exercise. A leg's own "sigma"/"T"/"S0" override market data; otherwise vol
+    is the chain IV nearest the strike, else 1y historical.
+    """
+    rows = []
+    for idx, leg in enumerate(legs):
+        tkr = normalize_ticker(str(leg.get("ticker", "")))
+        expiry = str(leg.get("expiry") or "")
+        strike = float(leg.get("strike") or 0)
+        if not tkr or not strike or not (expiry or leg.get("T") is not None):
+            raise ValueError(f"Leg {idx+1}: ticker, expiry (or T) and strike required")
+        is_call = str(leg.get("option_type", "CALL")).upper().startswith("C")
+        rows.append((tkr, expiry, strike, is_call, leg))
+    # Only legs that lack their own spot / vol need market data
+    need_vol = [r for r in rows if r[4].get("sigma") in (None, "")]
+    need = [r for r in rows if r[4].get("S0") in (None, "")] + need_vol
+    if need:
+        prefetch(
+            [r[0] for r in need], [(r[0], r[1]) for r in need_vol if r[1]], history=True
+        )
+    out = {
+        k: []
+        for k in ("ticker", "expiry", "S0", "K", "T", "sigma", "is_call", "american", "qty", "multiplier")
+    }
+    for tkr, expiry, strike, is_call, leg in rows:
+        S0 = float(leg["S0"]) if leg.get("S0") not in (None, "") else spot_or_last(tkr)
+        T = float(leg["T"]) if leg.get("T") not in (None, "") else year_fraction(expiry)
+        if leg.get("sigma") not in (None, ""):
+            sigma = float(leg["sigma"])
+        else:
+            sigma = (expiry and _chain_vol(tkr, expiry, strike, is_call)) or _hist_vol(tkr)
+        for k, v in (
+            ("ticker", tkr), ("expiry", expiry), ("S0", S0), ("K", strike), ("T", T),
+            ("sigma", sigma), ("is_call", is_call),
+            ("american", str(leg.get("style", "European")).upper().startswith("A")),
+            ("qty", float(leg.get("qty", 1.0))),
+            ("multiplier", float(leg.get("multiplier", 1.0))),
+        ):
+            out[k].append(v)
+    for k in ("S0", "K", "T", "sigma", "qty", "multiplier"):
+        out[k] = np.array(out[k], dtype=float)
+    out["is_call"] = np.array(out["is_call"], dtype=bool)
+    out["american"] = np.array(out["american"], dtype=bool)
+    return out
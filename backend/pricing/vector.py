@@ -0,0 +1,121 @@
+# backend/pricing/vector.py
+"""
+Broadcasting option pricers for revaluing many positions under many scenarios
+in one call: every argument may be a scalar or an array, and the result has
+the broadcast shape. Expired or zero-vol options are worth their intrinsic
+value, as in tasks.option_pricing.black_scholes_price.
+
+`binomial_price` runs many CRR lattices side by side (one row per option), so
+American legs can be repriced over a scenario grid without a Python loop per
+scenario; `option_price` sends each option to the cheapest exact engine.
+"""
+import os
+import numpy as np
+from scipy.special import ndtr
+
+BINOMIAL_STEPS = int(os.getenv("BINOMIAL_STEPS", "100"))
+# Lattices rolled back together; small enough for a chunk's nodes to stay in cache
+_LATTICE_CHUNK = 512
+
+
+def intrinsic(S, K, is_call):
+    return np.where(is_call, np.maximum(S - K, 0.0), np.maximum(K - S, 0.0))
+
+
+def bs_price(S, K, T, r, sigma, is_call, q=0.0):
+    """
+    Black-Scholes-Merton price. Terms that do not involve S are formed at their
+    own (usually per-leg) shape, puts come from the call by parity, and the
+    scenario-sized arrays are updated in place: one log and two ndtr per price.
+    """
+    S, K, T, sigma = (np.asarray(a, dtype=float) for a in (S, K, T, sigma))
+    is_call = np.asarray(is_call, dtype=bool)
+    live = (T > 0) & (sigma > 0)
+    Tl = np.where(live, T, 1.0)
+    sq = np.where(live, sigma, 1.0) * np.sqrt(Tl)
+    shift = ((r - q) * Tl - np.log(K)) / sq + 0.5 * sq
+    pv_k = K * np.exp(-r * Tl)
+    shape = np.broadcast_shapes(S.shape, K.shape, T.shape, sigma.shape, is_call.shape)
+    with np.errstate(divide="ignore"):
+        d = np.log(np.broadcast_to(S, shape))
+    d /= sq
+    d += shift
+    fwd = np.broadcast_to(S * np.exp(-q * Tl), shape)
+    price = ndtr(d)
+    price *= fwd
+    d -= sq
+    n2 = ndtr(d)
+    n2 *= pv_k
+    price -= n2
+    if not is_call.all():
+        # put = call - S e^{-qT} + K e^{-rT}
+        price += np.where(is_call, 0.0, pv_k - fwd)
+    if not live.all():
+        price = np.where(live, price, intrinsic(S, K, is_call))
+    return price
+
+
+def _crr(S, K, T, sigma, sgn, r, q, steps, american):
+    """CRR values for 1-d arrays of live options; sgn is +1 call / -1 put."""
+    dt = T / steps
+    u = np.exp(sigma * np.sqrt(dt))
+    p = np.clip((np.exp((r - q) * dt) - 1.0 / u) / (u - 1.0 / u), 0.0, 1.0)
+    disc = np.exp(-r * dt)
+    pu, pd = disc * p, disc * (1.0 - p)
+    # Node j after i steps sits at S u^(2j - i): only 2N + 1 distinct spots, so
+    # exercise values are formed once and each step reads a strided slice.
+    # Rows are nodes and columns options, so every slice is contiguous rows.
+    E = np.maximum(sgn * (S * u ** np.arange(-steps, steps + 1)[:, None] - K), 0.0)
+    V = E[::2].copy()
+    A = np.empty_like(V)
+    for i in range(steps - 1, -1, -1):
+        new, tmp = A[: i + 1], V[1 : i + 2]
+        np.multiply(V[: i + 1], pd, out=new)
+        tmp *= pu
+        new += tmp
+        if american:
+            np.maximum(new, E[steps - i : steps + i + 1 : 2], out=new)
+        V, A = A, V
+    return V[0]
+
+
+def binomial_price(S, K, T, r, sigma, is_call, q=0.0, steps=None, american=True, cancel=None):
+    """
+    Cox-Ross-Rubinstein price, broadcast like bs_price. `cancel()`, if given,
+    runs between lattice chunks and may raise to stop.
+    """
+    steps = int(steps or BINOMIAL_STEPS)
+    S, K, T, sigma, is_call = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (S, K, T, sigma)), np.asarray(is_call, dtype=bool)
+    )
+    out = intrinsic(S, K, is_call).astype(float).ravel()
+    S, K, T, sigma = S.ravel(), K.ravel(), T.ravel(), sigma.ravel()
+    sgn = np.where(is_call.ravel(), 1.0, -1.0)
+    live = np.flatnonzero((T > 0) & (sigma > 0))
+    for lo in range(0, len(live), _LATTICE_CHUNK):
+        if cancel is not None:
+            cancel()
+        j = live[lo : lo + _LATTICE_CHUNK]
+        out[j] = _crr(S[j], K[j], T[j], sigma[j], sgn[j], r, q, steps, american)
+    return out.reshape(is_call.shape)
+
+
+def option_price(S, K, T, r, sigma, is_call, american=False, q=0.0, steps=None, cancel=None):
+    """
+    Black-Scholes for European options and for American calls without a
+    dividend yield (never exercised early); the lattice for the rest.
+    """
+    lattice = np.asarray(american, dtype=bool) & ~(np.asarray(is_call, dtype=bool) & (q <= 0))
+    if not lattice.any():
+        return bs_price(S, K, T, r, sigma, is_call, q)
+    args = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (S, K, T, sigma)), np.asarray(is_call, dtype=bool), lattice
+    )
+    S, K, T, sigma, is_call, lattice = args
+    out = bs_price(S, K, T, r, sigma, is_call, q) if not lattice.all() else np.empty(S.shape)
+    out = np.array(out, dtype=float)
+    out[lattice] = binomial_price(
+        S[lattice], K[lattice], T[lattice], r, sigma[lattice], is_call[lattice], q, steps,
+        cancel=cancel,
+    )
+    return out
@@ -60,7 +60,9 @@ def qae_price(
     epsilon: float = 1e-2,
     alpha: float = 0.05,
     sampler="terra",
+    cancel=None,
 ) -> Dict[float, float]:
+    # cancel(), if given, runs before each strike's estimation and may raise to stop
     sampler_inst = _make_sampler(sampler)
     bds = _bounds(m, strikes)
     dist = _uncertainty(m, num_qubits, bds)
@@ -70,6 +72,8 @@ def qae_price(
 
     out: Dict[float, float] = {}
     for K in strikes:
+        if cancel is not None:
+            cancel()
         if option_type.upper() == "CALL":
             pricer = EuropeanCallPricing(
                 num_state_qubits=num_qubits,
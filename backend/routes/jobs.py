@@ -51,9 +51,25 @@
 
 
 # backend/routes/jobs.py
+import os
 from flask import Blueprint, jsonify, request
-from models.jobs import new_job, list_jobs, get_job
-from tasks import option_pricing, optimization
+from datetime import datetime, timedelta, timezone
+from models.jobs import (
+    PUBLIC,
+    TERMINAL,
+    get_batch,
+    get_job,
+    list_jobs,
+    new_batch,
+    new_job,
+    new_jobs,
+    queue_wait_stats,
+)
+from models.progress import request_cancel, with_progress
+from tasks import celery_app
+from tasks.batch import dispatch_batch
+from tasks.dispatch import cancel_job, enqueue, task_for
+from tasks.routing import JOB_QUEUES, queue_depths, queue_for
 from models.db import db
 from storage.paths import load_paths_subset
 
@@ -66,26 +82,80 @@ def http_list():
         "clientId": request.args.get("clientId"),
         "portfolioId": request.args.get("portfolioId"),
     }
-    return jsonify(list_jobs(q))
+    return jsonify(with_progress(list_jobs(q)))
+
+
+JOB_TYPES = ("OptionPricing", "PortfolioOptimization", "Backtest", "PortfolioRisk", "ScenarioGrid")
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "10000"))
+QUEUE_METRICS_WINDOW_SEC = int(os.getenv("QUEUE_METRICS_WINDOW_SEC", "3600"))
 
 
 @bp.post("/jobs")
 def http_submit():
-    job = new_job(request.get_json() or {})
-    if job["type"] == "OptionPricing":
-        option_pricing.run_option_job.apply_async(
-            args=[job["id"], job["product"], job["algo"], job["params"]]
-        )
-    elif job["type"] == "PortfolioOptimization":
-        optimization.run_optimization_job.apply_async(
-            args=[job["id"], job["algo"], job["params"]]
-        )
+    payload = request.get_json() or {}
+    payload["queue"] = queue_for(payload)
+    job = new_job(payload)
+    if job.get("dedupedFrom"):
+        # Attached to an identical running job, or given its fresh result
+        return jsonify(job), 201
+    enqueue(job)
     return jsonify(job), 201
 
 
+@bp.post("/jobs/batch")
+def http_submit_batch():
+    """
+    {"jobs": [spec, ...], "clientId"?, "portfolioId"?, "priority"?, "submitter"?}
+    Top-level fields are defaults for every spec. All specs are validated
+    before anything is written; the response is the batch and its jobs.
+    """
+    body = request.get_json() or {}
+    specs = body.get("jobs")
+    if not isinstance(specs, list) or not specs:
+        return jsonify({"error": "jobs must be a non-empty list"}), 400
+    if len(specs) > BATCH_MAX_JOBS:
+        return jsonify({"error": f"At most {BATCH_MAX_JOBS} jobs per batch"}), 400
+    defaults = {k: body[k] for k in ("clientId", "portfolioId", "priority", "submitter") if k in body}
+    payloads, errors = [], []
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            errors.append({"index": i, "error": "job spec must be an object"})
+            continue
+        p = {**defaults, **spec}
+        p["queue"] = queue_for(p)
+        if p.get("type") not in JOB_TYPES:
+            errors.append({"index": i, "error": f"type must be one of {', '.join(JOB_TYPES)}"})
+        elif not p.get("algo"):
+            errors.append({"index": i, "error": "algo required"})
+        elif not isinstance(p.get("params", {}), dict):
+            errors.append({"index": i, "error": "params must be an object"})
+        payloads.append(p)
+    if errors:
+        return jsonify({"error": "Invalid job specs", "errors": errors}), 400
+
+    batch = new_batch(len(payloads), body.get("submitter", "You"))
+    jobs = new_jobs(payloads, batch["id"])
+    dispatch_batch(batch["id"], [j for j in jobs if not j.get("dedupedFrom")], task_for)
+    return jsonify({**get_batch(batch["id"]), "jobs": jobs}), 201
+
+
+@bp.get("/jobs/batch/<bid>")
+def http_get_batch(bid):
+    b = get_batch(bid)
+    if not b:
+        return jsonify({"error": "Not found"}), 404
+    if request.args.get("jobs", "").lower() in ("1", "true", "yes"):
+        b["jobs"] = with_progress(
+            list(db.jobs.find({"batchId": bid}, PUBLIC).sort("createdAt", 1).limit(BATCH_MAX_JOBS))
+        )
+    return jsonify(b), 200
+
+
 @bp.get("/jobs/<jid>")
 def http_get(jid):
     j = get_job(jid)
+    if j:
+        with_progress([j])
     return (jsonify(j), 200) if j else (jsonify({"error": "Not found"}), 404)
 
 
@@ -94,15 +164,58 @@ def jobs_stats():
     statuses = ["Queued", "Running", "Succeeded", "Failed", "Cancelled"]
     by_status = {s: db.jobs.count_documents({"status": s}) for s in statuses}
     total = sum(by_status.values())
-    recent = list(db.jobs.find({}, {"_id": 0}).sort("createdAt", -1).limit(10))
-    running = list(
-        db.jobs.find({"status": "Running"}, {"_id": 0}).sort("updatedAt", -1).limit(10)
+    recent = list(db.jobs.find({}, PUBLIC).sort("createdAt", -1).limit(10))
+    running = with_progress(
+        list(db.jobs.find({"status": "Running"}, PUBLIC).sort("updatedAt", -1).limit(10))
     )
     return jsonify(
         {"total": total, "byStatus": by_status, "recent": recent, "running": running}
     )
 
 
+@bp.get("/jobs/queues")
+def jobs_queues():
+    """Broker depth plus wait times (last ?window= seconds) for each job queue."""
+    try:
+        window = int(request.args.get("window", QUEUE_METRICS_WINDOW_SEC))
+        if window <= 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "window must be a positive integer"}), 400
+    waits = queue_wait_stats(datetime.now(timezone.utc) - timedelta(seconds=window))
+    depth = queue_depths()
+    queues = {
+        q: {"depth": depth.get(q), "started": 0, "queued": 0, **waits.get(q, {})}
+        for q in (*JOB_QUEUES, *(k for k in waits if k and k not in JOB_QUEUES))
+    }
+    return jsonify({"windowSec": window, "queues": queues})
+
+
+@bp.post("/jobs/<jid>/cancel")
+def http_cancel(jid):
+    """
+    Queued jobs (and jobs deduplicated onto another) are cancelled at once
+    and their message revoked. Running jobs get a flag their engine polls
+    between chunks (models.progress), so the worker is free within about
+    CANCEL_POLL_MS plus one chunk; 202 until the engine has stopped. Jobs
+    deduplicated onto a cancelled one carry on (tasks.dispatch.cancel_job).
+    """
+    j = get_job(jid)
+    if not j:
+        return jsonify({"error": "Not found"}), 404
+    if j["status"] in TERMINAL:
+        return jsonify({"error": f"Job already {j['status']}", "job": j}), 409
+    if not j.get("dedupedFrom"):
+        try:
+            celery_app.control.revoke(jid)
+        except Exception:
+            pass  # the status guard in every task still stops it
+    if (j["status"] == "Queued" or j.get("dedupedFrom")) and cancel_job(jid):
+        return jsonify(get_job(jid)), 200
+    request_cancel(jid)
+    return jsonify(get_job(jid)), 202
+
+
 @bp.get("/jobs/<jid>/paths")
 def job_paths(jid):
     j = get_job(jid)
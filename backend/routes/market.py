@@ -1,57 +1,69 @@
 # backend/routes/market.py
+import math
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timezone
-from utils.finance_cache import cache_json
-import yfinance as yf
+from utils.columnar import rows
+from utils.finance_cache import cache_stats
+from services.market_data import (
+    CHAIN_COLUMNS,
+    filter_chain,
+    get_chain_table,
+    get_expirations,
+    get_spot,
+    lookup,
+    lookup_many,
+)
+from tasks.warmup import warm_stats
 
 bp = Blueprint("market", __name__)
 
-def _now_utc():
-    return datetime.now(timezone.utc)
+# Fields returned per chain row unless the caller asks for others
+CHAIN_FIELDS = ("strike", "lastPrice", "bid", "ask", "impliedVol")
+MAX_LOOKUP_BATCH = 200
+
+def _opt_float(name):
+    v = request.args.get(name, "").strip()
+    if not v:
+        return None
+    x = float(v)
+    if not math.isfinite(x):
+        raise ValueError(f"{name} must be finite")
+    return x
+
+def _opt_pos_int(name):
+    v = request.args.get(name, "").strip()
+    if not v:
+        return None
+    n = int(v)
+    if n <= 0:
+        raise ValueError(f"{name} must be positive")
+    return n
 
 @bp.get("/market/lookup")
 def market_lookup():
     ticker = request.args.get("ticker","").strip().upper()
     if not ticker:
         return jsonify({"error":"ticker required"}), 400
+    return jsonify(lookup(ticker))
 
-    def fetch():
-        t = yf.Ticker(ticker)
-        info = t.fast_info or {}
-        price = info.get("last_price") or info.get("lastPrice") or info.get("regularMarketPrice")
-        currency = info.get("currency") or info.get("currencyCode") or "USD"
-        try:
-            name = t.info.get("shortName") or t.info.get("longName") or ticker
-        except Exception:
-            name = ticker
-        dy = None
-        try:
-            dy = t.info.get("dividendYield")
-        except Exception:
-            dy = None
-        return {
-            "ticker": ticker,
-            "name": name,
-            "price": float(price) if price is not None else None,
-            "currency": currency,
-            "dividendYield": dy,
-            "ts": _now_utc().isoformat().replace("+00:00","Z")
-        }
-
-    return jsonify(cache_json(f"yf:lookup:{ticker}", fetch))
+@bp.post("/market/lookup/batch")
+def market_lookup_batch():
+    data = request.get_json() or {}
+    raw = data.get("tickers") or []
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    tickers = [str(t).strip().upper() for t in raw if str(t).strip()]
+    if not tickers:
+        return jsonify({"error":"tickers required"}), 400
+    if len(tickers) > MAX_LOOKUP_BATCH:
+        return jsonify({"error":f"at most {MAX_LOOKUP_BATCH} tickers per batch"}), 400
+    return jsonify({"results": lookup_many(tickers)})
 
 @bp.get("/market/options/expirations")
 def market_option_expirations():
     ticker = request.args.get("ticker","").strip().upper()
     if not ticker:
         return jsonify({"error":"ticker required"}), 400
-
-    def fetch():
-        t = yf.Ticker(ticker)
-        exps = t.options or []
-        return {"ticker": ticker, "expirations": list(exps)}
-
-    return jsonify(cache_json(f"yf:opts:expirations:{ticker}", fetch))
+    return jsonify(get_expirations(ticker))
 
 @bp.get("/market/options/chain")
 def market_option_chain():
@@ -60,22 +72,44 @@ def market_option_chain():
     if not ticker or not expiry:
         return jsonify({"error":"ticker and expiry required"}), 400
 
-    def fetch():
-        t = yf.Ticker(ticker)
-        chain = t.option_chain(expiry)
-        calls = chain.calls.fillna(0)
-        puts = chain.puts.fillna(0)
-        def to_rows(df):
-            rows = []
-            for _, r in df.iterrows():
-                rows.append({
-                    "strike": float(r.get("strike", 0)),
-                    "lastPrice": float(r.get("lastPrice", 0) or 0),
-                    "bid": float(r.get("bid", 0) or 0),
-                    "ask": float(r.get("ask", 0) or 0),
-                    "impliedVol": float(r.get("impliedVolatility", 0) or r.get("impliedVol",0) or 0),
-                })
-            return rows
-        return {"ticker": ticker, "expiry": expiry, "calls": to_rows(calls), "puts": to_rows(puts) }
-    
-    return jsonify(cache_json(f"yf:opts:chain:{ticker}:{expiry}", fetch))
\ No newline at end of file
+    try:
+        min_strike = _opt_float("minStrike")
+        max_strike = _opt_float("maxStrike")
+        moneyness = _opt_float("moneyness")
+    except ValueError:
+        return jsonify({"error":"minStrike, maxStrike and moneyness must be finite numbers"}), 400
+    try:
+        max_rows = _opt_pos_int("maxRows")
+    except ValueError:
+        return jsonify({"error":"maxRows must be a positive integer"}), 400
+    fields = request.args.get("fields","").strip()
+    if fields == "all":
+        fields = tuple(CHAIN_COLUMNS)
+    elif fields:
+        fields = tuple(f.strip() for f in fields.split(",") if f.strip() in CHAIN_COLUMNS)
+        if not fields:
+            return jsonify({"error":f"fields must name some of {', '.join(CHAIN_COLUMNS)} (or be 'all')"}), 400
+    else:
+        fields = CHAIN_FIELDS
+
+    tables = get_chain_table(ticker, expiry)
+    out = {"ticker": ticker, "expiry": expiry}
+    spot = None
+    if moneyness is not None or max_rows is not None:
+        spot = get_spot(ticker)
+        out["spot"] = spot
+    for side in ("calls", "puts"):
+        tbl = filter_chain(
+            tables[side],
+            spot=spot,
+            min_strike=min_strike,
+            max_strike=max_strike,
+            moneyness=moneyness,
+            max_rows=max_rows,
+        )
+        out[side] = rows(tbl, fields)
+    return jsonify(out)
+
+@bp.get("/market/cache/stats")
+def market_cache_stats():
+    return jsonify({"cache": cache_stats(), "warmer": warm_stats()})
@@ -44,7 +44,7 @@ def post_bs():
         body.get("priority", "Normal"),
         body.get("submitter", "API"),
     )
-    opt_tasks.run_option_job.delay(job["id"], body)
+    opt_tasks.run_option_job.delay(job["id"], job["product"], job["algo"], body)
     return jsonify({"jobId": job["id"]})
 
 
@@ -68,7 +68,7 @@ def post_mc():
         body.get("priority", "Normal"),
         body.get("submitter", "API"),
     )
-    opt_tasks.run_option_job.delay(job["id"], body)
+    opt_tasks.run_option_job.delay(job["id"], job["product"], job["algo"], body)
     return jsonify({"jobId": job["id"]})
 
 
@@ -103,7 +103,7 @@ def post_qae():
         body.get("priority", "Normal"),
         body.get("submitter", "API"),
     )
-    opt_tasks.run_option_job.delay(job["id"], body)
+    opt_tasks.run_option_job.delay(job["id"], job["product"], job["algo"], body)
     return jsonify({"jobId": job["id"]})
 
 
@@ -0,0 +1,21 @@
+# backend/routes/scenarios.py
+from flask import Blueprint, jsonify, request
+from tasks.scenario import SCENARIO_SYNC_MAX_PRICES, book_for, scenario_grid
+from utils.json_safe import json_sanitize
+
+bp = Blueprint("scenarios", __name__)
+
+
+@bp.post("/scenarios/grid")
+def http_grid():
+    """Revalue legs / a portfolio over a spot x vol x days grid, inline.
+    Larger grids go through a ScenarioGrid job."""
+    body = request.get_json() or {}
+    try:
+        book = book_for(body, body.get("portfolioId"))
+        res = scenario_grid(
+            book, body, body.get("algo"), max_prices=SCENARIO_SYNC_MAX_PRICES
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(json_sanitize(res))
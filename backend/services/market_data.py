@@ -1,25 +1,214 @@
-import os, json
-import yfinance as yf
-from redis import Redis
-from dotenv import load_dotenv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from services.providers import CHAIN_COLUMNS, get_provider
+from storage.history import load_close, sync as sync_history
+from utils import columnar
+from utils.finance_cache import cache_columnar, cache_json, peek_json_many, peek_many
 
-load_dotenv()
-REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
-YF_CACHE_TTL = int(os.getenv("YF_CACHE_TTL", "900"))
-r = Redis.from_url(REDIS_URL)
+YF_LOOKUP_WORKERS = int(os.getenv("YF_LOOKUP_WORKERS", "8"))
+
+
+def fetch_lookup(ticker: str, price: Optional[float] = None) -> dict:
+    provider = get_provider()
+    currency = None
+    if price is None:
+        quote = provider.quote(ticker)
+        price, currency = quote["price"], quote["currency"]
+    info = provider.info(ticker)
+    return {
+        "ticker": ticker,
+        "name": info.get("shortName") or info.get("longName") or ticker,
+        "price": float(price) if price is not None else None,
+        "currency": currency or info.get("currency") or "USD",
+        "dividendYield": info.get("dividendYield"),
+        "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+    }
+
+
+def lookup_key(ticker: str) -> str:
+    return f"yf:lookup:{ticker}"
+
+
+def lookup(ticker: str) -> dict:
+    return cache_json(lookup_key(ticker), lambda: fetch_lookup(ticker))
+
+
+def spot_key(ticker: str) -> str:
+    return f"yf:lk:{ticker}"
+
+
+def fetch_spot(ticker: str) -> dict:
+    return get_provider().quote(ticker)
+
+
+def get_spot(ticker: str) -> Optional[float]:
+    """Cached quote price only (no reference data), as used by pricing jobs."""
+    return cache_json(spot_key(ticker), lambda: fetch_spot(ticker)).get("price")
+
+
+def expirations_key(ticker: str) -> str:
+    return f"yf:opts:expirations:{ticker}"
+
+
+def fetch_expirations(ticker: str) -> dict:
+    return {"ticker": ticker, "expirations": get_provider().expirations(ticker)}
+
+
+def get_expirations(ticker: str) -> dict:
+    return cache_json(expirations_key(ticker), lambda: fetch_expirations(ticker))
+
+
+def lookup_many(tickers: List[str]) -> List[dict]:
+    """
+    Lookups for many tickers in input order. Fresh cache entries are served from
+    one local/MGET pass; misses share one bulk price download and then fetch
+    `info` concurrently, all under the shared upstream rate limit.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    keys = {t: lookup_key(t) for t in tickers}
+    found = peek_json_many(list(keys.values()))
+    misses = [t for t in tickers if keys[t] not in found]
+    if misses:
+        # One bulk price request for every miss; `info` is still per ticker
+        prices = get_provider().last_prices(misses)
+
+        def one(t):
+            try:
+                return cache_json(keys[t], lambda: fetch_lookup(t, prices.get(t)))
+            except Exception as e:
+                return {"ticker": t, "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=min(YF_LOOKUP_WORKERS, len(misses))) as pool:
+            for t, res in zip(misses, pool.map(one, misses)):
+                found[keys[t]] = res
+    return [found[keys[t]] for t in tickers]
+
+
+def get_history_columns(ticker: str, period: str = "1y", interval: str = "1d"):
+    """History as parallel arrays: t (int64 epoch seconds), c (float64 close)."""
+    if interval == "1d":
+        # Daily bars come from the incremental local store; no Redis needed
+        close = load_close(ticker, period)
+        return {
+            "t": columnar.epoch_seconds(close.index),
+            "c": close.to_numpy(dtype=np.float64),
+        }
+
+    def fetch():
+        t, c = get_provider().bars(ticker, period, interval)
+        return {"history": {"t": t, "c": c}}, {}
+
+    tables, _ = cache_columnar(f"yf:hist:{ticker}:{period}:{interval}", fetch)
+    return tables.get("history", {"t": np.empty(0, np.int64), "c": np.empty(0)})
 
 
 def get_history(ticker: str, period: str = "1y", interval: str = "1d") -> dict:
-    key = f"yf:{ticker}:{period}:{interval}"
-    c = r.get(key)
-    if c:
-        return json.loads(c)
-    df = yf.download(ticker, period=period, interval=interval, progress=False)
-    data = {
+    cols = get_history_columns(ticker, period, interval)
+    ts = np.datetime_as_string(cols["t"].astype("datetime64[s]"), unit="s")
+    return {
         "ticker": ticker,
-        "points": [
-            {"t": str(ts), "c": float(row["Close"])} for ts, row in df.iterrows()
-        ],
+        "points": columnar.rows({"t": ts, "c": cols["c"]}),
+    }
+
+
+def chain_key(ticker: str, expiry: str) -> str:
+    return f"yf:opts:chain:{ticker}:{expiry}"
+
+
+def fetch_chain(ticker: str, expiry: str):
+    tables = get_provider().chain(ticker, expiry)
+    return tables, {"ticker": ticker, "expiry": expiry}
+
+
+def get_chain_table(ticker: str, expiry: str) -> dict:
+    """
+    {"calls": columns, "puts": columns} for one expiry, cached in Redis in the
+    compact columnar codec. Arrays are read-only when served from cache.
+    """
+    tables, _ = cache_columnar(
+        chain_key(ticker, expiry), lambda: fetch_chain(ticker, expiry)
+    )
+    return tables
+
+
+def filter_chain(
+    table: dict,
+    spot: Optional[float] = None,
+    min_strike: Optional[float] = None,
+    max_strike: Optional[float] = None,
+    moneyness: Optional[float] = None,
+    max_rows: Optional[int] = None,
+) -> dict:
+    """
+    Boolean-mask a chain table before serialization: strike range, moneyness band
+    |K/S - 1| <= moneyness, then the `max_rows` strikes closest to the money
+    (kept in strike order).
+    """
+    k = table["strike"]
+    keep = np.ones(len(k), dtype=bool)
+    if min_strike is not None:
+        keep &= k >= min_strike
+    if max_strike is not None:
+        keep &= k <= max_strike
+    if moneyness is not None and spot:
+        keep &= np.abs(k / spot - 1.0) <= moneyness
+    idx = np.flatnonzero(keep)
+    if max_rows is not None and len(idx) > max_rows:
+        center = spot if spot else float(np.median(k[idx]))
+        nearest = np.argpartition(np.abs(k[idx] - center), max_rows - 1)[:max_rows]
+        idx = np.sort(idx[nearest])
+    return {name: col[idx] for name, col in table.items()}
+
+
+def prefetch(
+    tickers: Iterable[str],
+    chains: Iterable[Tuple[str, str]] = (),
+    history: bool = False,
+) -> Tuple[Dict[str, Optional[float]], Dict[Tuple[str, str], Optional[dict]]]:
+    """
+    Resolve every spot and (ticker, expiry) chain a job needs before pricing:
+    one local/MGET pass for cache hits, then all misses (plus an optional bulk
+    history sync) concurrently. Returns (spots, chain tables); failed fetches map
+    to None. Afterwards get_spot/get_chain_table are in-process hits.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    chains = list(dict.fromkeys(chains))
+    keys = {spot_key(t): "json" for t in tickers}
+    keys.update({chain_key(t, e): "columnar" for t, e in chains})
+    found = peek_many(keys)
+
+    def spot(t):
+        try:
+            return get_spot(t)
+        except Exception:
+            return None
+
+    def chain(te):
+        try:
+            return get_chain_table(*te)
+        except Exception:
+            return None
+
+    jobs = [(spot, t) for t in tickers if spot_key(t) not in found]
+    jobs += [(chain, te) for te in chains if chain_key(*te) not in found]
+    results = {}
+    if jobs or history:
+        with ThreadPoolExecutor(max_workers=max(1, min(YF_LOOKUP_WORKERS, len(jobs) + 1))) as pool:
+            hist = pool.submit(sync_history, tickers) if history else None
+            for (fn, arg), res in zip(jobs, pool.map(lambda j: j[0](j[1]), jobs)):
+                results[arg] = res
+            if hist is not None:
+                hist.result()
+
+    spots = {
+        t: results[t] if t in results else found[spot_key(t)].get("price")
+        for t in tickers
+    }
+    tables = {
+        te: results[te] if te in results else found[chain_key(*te)][0]
+        for te in chains
     }
-    r.setex(key, YF_CACHE_TTL, json.dumps(data))
-    return data
+    return spots, tables
@@ -0,0 +1,316 @@
+# backend/services/providers.py
+"""
+Market-data providers. Everything that needs spot, history, expirations or
+chains goes through `get_provider()`, selected by MARKET_DATA_PROVIDER:
+  - "yfinance" (default): live data, shared upstream rate limit
+  - "synthetic": deterministic, offline; seeded GBM histories and model chains
+
+Cached values are not tagged with the provider, so point REDIS_URL at its own
+database when running the synthetic provider next to a live deployment.
+"""
+import os, zlib
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy.special import ndtr
+from utils.rate_limit import acquire
+
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance").lower()
+SYNTH_SEED = int(os.getenv("SYNTH_SEED", "7"))
+SYNTH_START = os.getenv("SYNTH_START", "2005-01-03")
+
+# Chain columns: output name -> yfinance column
+CHAIN_COLUMNS = {
+    "strike": "strike",
+    "lastPrice": "lastPrice",
+    "bid": "bid",
+    "ask": "ask",
+    "impliedVol": "impliedVolatility",
+    "volume": "volume",
+    "openInterest": "openInterest",
+}
+
+Series = Tuple[np.ndarray, np.ndarray]  # (int64 days or epoch seconds, float64 closes)
+
+
+class MarketDataProvider(ABC):
+    """Upstream market data; get_provider() picks the implementation."""
+
+    name = "base"
+
+    @abstractmethod
+    def quote(self, ticker: str) -> dict:
+        """{"price": float | None, "currency": str | None} — cheap, real-time-ish."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def info(self, ticker: str) -> dict:
+        """Reference data: shortName/longName, currency, dividendYield."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def last_prices(self, tickers: List[str]) -> Dict[str, float]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def daily_closes(
+        self, tickers: List[str], start: Optional[str] = None, period: Optional[str] = None
+    ) -> Dict[str, Series]:
+        """Adjusted daily closes as (epoch days, closes); from `start` or over `period`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def bars(self, ticker: str, period: str, interval: str) -> Series:
+        """Intraday/other-interval closes as (epoch seconds, closes)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def expirations(self, ticker: str) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def chain(self, ticker: str, expiry: str) -> Dict[str, Dict[str, np.ndarray]]:
+        """{"calls": columns, "puts": columns} with CHAIN_COLUMNS as float64 arrays."""
+        raise NotImplementedError
+
+
+def _empty_chain_table() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0) for name in CHAIN_COLUMNS}
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def __init__(self):
+        import yfinance as yf
+
+        self._yf = yf
+
+    def quote(self, ticker):
+        acquire()
+        fi = self._yf.Ticker(ticker).fast_info or {}
+        px = fi.get("last_price") or fi.get("lastPrice") or fi.get("regularMarketPrice")
+        cur = fi.get("currency") or fi.get("currencyCode")
+        return {"price": float(px) if px else None, "currency": cur}
+
+    def info(self, ticker):
+        # `info` is the slowest yfinance call: callers fetch it once per ticker
+        acquire()
+        try:
+            return self._yf.Ticker(ticker).info or {}
+        except Exception:
+            return {}
+
+    def _download(self, tickers, **kw):
+        acquire()
+        data = self._yf.download(tickers=tickers, progress=False, **kw)
+        if data is None or len(data) == 0:
+            return None
+        close = data["Close"] if "Close" in data else data
+        if getattr(close, "ndim", 1) == 1:
+            close = close.to_frame(name=tickers[0])
+        return close
+
+    def last_prices(self, tickers):
+        try:
+            close = self._download(tickers, period="5d", interval="1d", auto_adjust=False)
+        except Exception:
+            return {}
+        if close is None:
+            return {}
+        last = close.ffill().iloc[-1]
+        return {
+            t: float(last[t]) for t in tickers if t in last.index and np.isfinite(last[t])
+        }
+
+    def daily_closes(self, tickers, start=None, period=None):
+        kw = {"start": start} if start else {"period": period or "max"}
+        close = self._download(tickers, interval="1d", auto_adjust=True, **kw)
+        if close is None:
+            return {}
+        days = close.index.values.astype("datetime64[D]").astype(np.int64)
+        out = {}
+        for tkr in tickers:
+            if tkr not in close.columns:
+                continue
+            col = close[tkr].to_numpy(dtype=np.float64)
+            ok = ~np.isnan(col)
+            if ok.any():
+                out[tkr] = (days[ok], col[ok])
+        return out
+
+    def bars(self, ticker, period, interval):
+        close = self._download([ticker], period=period, interval=interval)
+        if close is None:
+            return np.empty(0, np.int64), np.empty(0)
+        col = close.iloc[:, 0].dropna()
+        t = col.index.values.astype("datetime64[s]").astype(np.int64)
+        return t, col.to_numpy(dtype=np.float64)
+
+    def expirations(self, ticker):
+        acquire()
+        return list(self._yf.Ticker(ticker).options or [])
+
+    def chain(self, ticker, expiry):
+        acquire()
+        ch = self._yf.Ticker(ticker).option_chain(expiry)
+        return {"calls": self._table(ch.calls), "puts": self._table(ch.puts)}
+
+    @staticmethod
+    def _table(df):
+        """yfinance chain DataFrame -> float64 columns, built column-wise."""
+        if df is None or df.empty:
+            return _empty_chain_table()
+        out = {}
+        for name, src in CHAIN_COLUMNS.items():
+            if src in df.columns:
+                out[name] = df[src].to_numpy(dtype=np.float64, na_value=0.0)
+            else:
+                out[name] = np.zeros(len(df))
+        return out
+
+
+def _bs(S, K, T, r, sigma, call: bool):
+    """Vectorized Black-Scholes (no dividends)."""
+    sT = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma * sigma) * T) / sT
+    d2 = d1 - sT
+    if call:
+        return S * ndtr(d1) - K * np.exp(-r * T) * ndtr(d2)
+    return K * np.exp(-r * T) * ndtr(-d2) - S * ndtr(-d1)
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Deterministic offline market. Each ticker gets its own seeded GBM (drift, vol
+    and start price drawn from the seed) over business days from SYNTH_START to
+    today; chains are Black-Scholes prices on a skewed smile around the ATM vol.
+    The same ticker, seed and date always give the same numbers.
+    """
+
+    name = "synthetic"
+    RATE = 0.03
+
+    def __init__(self, seed: int = SYNTH_SEED, start: str = SYNTH_START):
+        self.seed = seed
+        self.start = np.datetime64(start, "D")
+
+    def _rng(self, *parts) -> np.random.Generator:
+        key = ":".join(str(p) for p in (self.seed, *parts))
+        return np.random.default_rng(zlib.crc32(key.encode()))
+
+    def _params(self, ticker):
+        rng = self._rng(ticker, "params")
+        s0 = float(rng.uniform(20.0, 400.0))
+        mu = float(rng.uniform(-0.02, 0.15))
+        sigma = float(rng.uniform(0.15, 0.55))
+        return s0, mu, sigma
+
+    @lru_cache(maxsize=1024)
+    def _path(self, ticker: str, today: np.datetime64) -> Series:
+        days = np.arange(self.start, today + 1, dtype="datetime64[D]")
+        days = days[np.is_busday(days)]
+        s0, mu, sigma = self._params(ticker)
+        dt = 1.0 / 252.0
+        # Normals are drawn sequentially, so yesterday's path is a prefix of today's
+        z = self._rng(ticker, "path").standard_normal(len(days))
+        logret = (mu - 0.5 * sigma * sigma) * dt + sigma * np.sqrt(dt) * z
+        logret[0] = 0.0
+        closes = s0 * np.exp(np.cumsum(logret))
+        return days.astype(np.int64), closes
+
+    def _today(self):
+        return np.datetime64("today", "D")
+
+    def _spot(self, ticker):
+        return float(self._path(ticker, self._today())[1][-1])
+
+    def quote(self, ticker):
+        return {"price": self._spot(ticker), "currency": "USD"}
+
+    def info(self, ticker):
+        rng = self._rng(ticker, "info")
+        return {
+            "shortName": f"{ticker} (synthetic)",
+            "currency": "USD",
+            "dividendYield": round(float(rng.uniform(0.0, 0.04)), 4),
+        }
+
+    def last_prices(self, tickers):
+        return {t: self._spot(t) for t in tickers}
+
+    def daily_closes(self, tickers, start=None, period=None):
+        from storage.history import period_start
+
+        today = self._today()
+        lo = np.datetime64(start, "D") if start else period_start(period or "max", today)
+        out = {}
+        for tkr in tickers:
+            t, c = self._path(tkr, today)
+            i = 0 if lo is None else int(np.searchsorted(t, lo.astype(np.int64)))
+            out[tkr] = (t[i:], c[i:])
+        return out
+
+    def bars(self, ticker, period, interval):
+        # Daily path is the only resolution we simulate; timestamps at 00:00 UTC
+        t, c = self.daily_closes([ticker], period=period)[ticker]
+        return t * 86400, c
+
+    def expirations(self, ticker):
+        today = date.fromisoformat(str(self._today()))
+        fridays = [
+            today + timedelta(days=(4 - today.weekday()) % 7 + 7 * w) for w in range(8)
+        ]
+        monthly = []
+        y, m = today.year, today.month
+        for _ in range(9):
+            first = date(y, m, 1)
+            third = first + timedelta(days=(4 - first.weekday()) % 7 + 14)
+            if third > today:
+                monthly.append(third)
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+        return sorted({d.isoformat() for d in fridays + monthly if d > today})
+
+    def chain(self, ticker, expiry):
+        S = self._spot(ticker)
+        _, _, vol = self._params(ticker)
+        today = self._today()
+        T = max((np.datetime64(expiry, "D") - today).astype(int), 1) / 365.0
+        step = 10 ** np.floor(np.log10(S)) / 20.0
+        strikes = np.arange(np.floor(0.5 * S / step), np.ceil(1.5 * S / step) + 1) * step
+        lm = np.log(strikes / S)
+        iv = np.clip(vol * (1.0 - 0.25 * lm + 0.6 * lm * lm), 0.05, 3.0)
+        rng = self._rng(ticker, expiry, str(today))
+        out = {}
+        for side, call in (("calls", True), ("puts", False)):
+            px = np.maximum(_bs(S, strikes, T, self.RATE, iv, call), 0.01)
+            half = np.maximum(0.01, px * 0.02)
+            oi = np.round(5000.0 * np.exp(-8.0 * lm * lm) * rng.uniform(0.5, 1.5, len(strikes)))
+            out[side] = {
+                "strike": strikes,
+                "lastPrice": np.round(px, 2),
+                "bid": np.round(px - half, 2),
+                "ask": np.round(px + half, 2),
+                "impliedVol": iv,
+                "volume": np.round(oi * rng.uniform(0.0, 0.3, len(strikes))),
+                "openInterest": oi,
+            }
+        return out
+
+
+_PROVIDERS = {
+    "yfinance": YFinanceProvider,
+    "synthetic": SyntheticProvider,
+}
+_provider: Optional[MarketDataProvider] = None
+
+
+def get_provider() -> MarketDataProvider:
+    global _provider
+    if _provider is None:
+        if MARKET_DATA_PROVIDER not in _PROVIDERS:
+            raise ValueError(f"Unknown MARKET_DATA_PROVIDER: {MARKET_DATA_PROVIDER}")
+        _provider = _PROVIDERS[MARKET_DATA_PROVIDER]()
+    return _provider
@@ -0,0 +1,397 @@
+# backend/services/statistics.py
+"""
+Return statistics for optimizer universes.
+
+Per-ticker return series are cached in process, keyed by (ticker, period, freq)
+and the ticker's last stored bar. Covariances are built from pairwise blocks
+computed on each pair's overlapping dates and cached in a Redis hash per
+(period, freq, day); a pair's field embeds both tickers' last bar dates, so a
+new bar for one ticker only invalidates that ticker's row. Adding one asset to
+a universe therefore computes exactly one new row of Σ.
+
+Estimators on top of the assembled sample blocks:
+  - sample:      pairwise sample covariance (made PSD if pairwise gaps broke it)
+  - ledoit_wolf: shrinkage to a scaled identity, intensity from cached π_ij
+  - oas:         oracle-approximating shrinkage to the same target
+  - ewma:        RiskMetrics zero-mean EWMA, ages in business days from today
+
+`universe_factor_model` instead returns Σ = B F B' + D in factored form
+(optim.factor.FactorCov) for universes too large for a dense n x n matrix.
+"""
+import os, struct, threading
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+import numpy as np
+import redis
+from optim.factor import pca_model, regression_model
+from storage.history import load_arrays, sync as sync_history
+from utils.finance_cache import _get_redis
+from utils.sanitize import normalize_ticker
+
+STATS_TTL = int(os.getenv("STATS_TTL", "172800"))
+EWMA_LAMBDA = float(os.getenv("EWMA_LAMBDA", "0.94"))
+COV_ESTIMATOR = os.getenv("COV_ESTIMATOR", "ledoit_wolf")
+ESTIMATORS = ("sample", "ledoit_wolf", "oas", "ewma")
+FACTOR_COUNT = int(os.getenv("FACTOR_COUNT", "5"))
+ANNUALIZE = {"1d": 252.0, "1wk": 52.0, "1mo": 12.0}
+MIN_OVERLAP = 3
+
+# Pair block: sample covariance, LW π (mean squared deviation of x_i x_j), count
+_PAIR = struct.Struct("<3d")
+_ret_cache: Dict[Tuple[str, str, str], Tuple[tuple, np.ndarray, np.ndarray]] = {}
+_ret_lock = threading.Lock()
+
+
+def _today() -> np.datetime64:
+    return np.datetime64(datetime.now(timezone.utc).date(), "D")
+
+
+def _resample(t: np.ndarray, c: np.ndarray, freq: str):
+    """Last close per week/month; daily passes through."""
+    if freq == "1d":
+        return t, c
+    if freq == "1wk":
+        bucket = (t + 3) // 7  # epoch day 0 is a Thursday: Monday-based weeks
+    elif freq == "1mo":
+        bucket = t.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    else:
+        raise ValueError(f"Unsupported frequency: {freq}")
+    last = np.flatnonzero(np.diff(bucket, append=bucket[-1] + 1))
+    return t[last], c[last]
+
+
+def returns(ticker: str, period: str = "3y", freq: str = "1d"):
+    """(epoch days, simple returns) for one ticker from the local history store."""
+    if freq not in ANNUALIZE:
+        raise ValueError(f"Unsupported frequency: {freq}")
+    rec = load_arrays(ticker, period)
+    if rec is None or len(rec[0]) < 2:
+        return None
+    t, c = rec
+    version = (int(t[-1]), len(t), int(_today().astype(np.int64)))
+    key = (ticker, period, freq)
+    hit = _ret_cache.get(key)
+    if hit and hit[0] == version:
+        return hit[1], hit[2]
+    t, c = _resample(t, c, freq)
+    out = t[1:], c[1:] / c[:-1] - 1.0
+    with _ret_lock:
+        _ret_cache[key] = (version, *out)
+    return out
+
+
+def _aligned(series: List[Tuple[np.ndarray, np.ndarray]]):
+    """Union calendar (T,) and returns matrix (T, n) with NaN where missing."""
+    cal = np.unique(np.concatenate([t for t, _ in series]))
+    X = np.full((len(cal), len(series)), np.nan)
+    for j, (t, r) in enumerate(series):
+        X[np.searchsorted(cal, t), j] = r
+    return cal, X
+
+
+def _pair_row(X, valid, i, cols):
+    """Sample blocks (s, π, count) of column i against `cols`, pairwise-complete."""
+    M = valid[:, cols] & valid[:, [i]]
+    cnt = M.sum(axis=0).astype(float)
+    safe = np.maximum(cnt, 1.0)
+    xa = np.where(M, X[:, [i]], 0.0)
+    xb = np.where(M, X[:, cols], 0.0)
+    da = np.where(M, xa - xa.sum(axis=0) / safe, 0.0)
+    db = np.where(M, xb - xb.sum(axis=0) / safe, 0.0)
+    prod = da * db
+    s_biased = prod.sum(axis=0) / safe
+    pi = np.where(M, (prod - s_biased) ** 2, 0.0).sum(axis=0) / safe
+    s = prod.sum(axis=0) / np.maximum(cnt - 1.0, 1.0)
+    return s, pi, cnt
+
+
+def _ewma_row(X, valid, w, i, cols):
+    M = valid[:, cols] & valid[:, [i]]
+    W = np.where(M, w[:, None], 0.0)
+    num = (W * np.where(M, X[:, [i]] * X[:, cols], 0.0)).sum(axis=0)
+    return num / np.maximum(W.sum(axis=0), 1e-300)
+
+
+def _fields(tickers, last):
+    tags = [f"{t}@{d}" for t, d in zip(tickers, last)]
+    n = len(tags)
+    iu, ju = np.triu_indices(n)
+    # Canonical pair order so the field is the same in any universe ordering
+    return iu, ju, ["|".join(sorted((tags[i], tags[j]))) for i, j in zip(iu, ju)]
+
+
+def _blocks(key, tickers, last, compute_rows):
+    """
+    Upper-triangle pair blocks for the universe: cached ones via one HMGET, the
+    rest row by row (greedily, the ticker with most missing pairs first).
+    Returns triu indices, an (npairs, 3) array in triu order and the number of
+    rows computed.
+    """
+    iu, ju, fields = _fields(tickers, last)
+    r = _get_redis()
+    try:
+        cached = r.hmget(key, fields) if fields else []
+    except redis.RedisError:
+        cached = [None] * len(fields)
+    out = np.full((len(fields), _PAIR.size // 8), np.nan)
+    missing = np.zeros(len(fields), dtype=bool)
+    for k, raw in enumerate(cached):
+        if raw is None:
+            missing[k] = True
+        else:
+            out[k] = _PAIR.unpack(raw)
+    if not missing.any():
+        return iu, ju, out, 0
+
+    n = len(tickers)
+    need = np.zeros((n, n), dtype=bool)
+    need[iu[missing], ju[missing]] = True
+    need |= need.T
+    pos = {(i, j): k for k, (i, j) in enumerate(zip(iu, ju))}
+    fresh = {}
+    rows = compute_rows()
+    computed = 0
+    while need.any():
+        computed += 1
+        i = int(np.argmax(need.sum(axis=1)))
+        cols = np.flatnonzero(need[i])
+        block = rows(i, cols)
+        for c, vals in zip(cols, block):
+            k = pos[(min(i, c), max(i, c))]
+            out[k] = vals
+            fresh[fields[k]] = _PAIR.pack(*vals)
+        need[i, cols] = need[cols, i] = False
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(key, mapping=fresh)
+        pipe.expire(key, STATS_TTL)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+    return iu, ju, out, computed
+
+
+def _symmetric(n, iu, ju, vals):
+    S = np.empty((n, n))
+    S[iu, ju] = vals
+    S[ju, iu] = vals
+    return S
+
+
+def _psd(S):
+    """Clip negative eigenvalues that pairwise-complete estimates can produce."""
+    try:
+        np.linalg.cholesky(S + 1e-12 * np.eye(len(S)))
+        return S
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(S)
+        return (vecs * np.maximum(vals, 0.0)) @ vecs.T
+
+
+def _shrink_identity(S, delta):
+    m = np.trace(S) / len(S)
+    out = (1.0 - delta) * S
+    out[np.diag_indices_from(out)] += delta * m
+    return out
+
+
+def ledoit_wolf(S, pi_sum):
+    """Ledoit-Wolf (2004) intensity toward m·I given S and Σ_ij π_ij / T_ij."""
+    m = np.trace(S) / len(S)
+    d2 = float(np.sum((S - m * np.eye(len(S))) ** 2))
+    if d2 <= 0:
+        return S, 0.0
+    delta = min(pi_sum, d2) / d2
+    return _shrink_identity(S, delta), delta
+
+
+def oas(S, nobs):
+    """Oracle-approximating shrinkage (Chen et al. 2010) toward m·I."""
+    p = len(S)
+    m = np.trace(S) / p
+    alpha = float(np.mean(S**2))
+    num = alpha + m * m
+    den = (nobs + 1.0) * (alpha - m * m / p)
+    delta = 1.0 if den == 0 else float(min(num / den, 1.0))
+    return _shrink_identity(S, delta), delta
+
+
+def _load(tickers, period, freq):
+    """Normalized tickers, their unique order and return series; all-or-nothing."""
+    if freq not in ANNUALIZE:
+        raise ValueError(f"Unsupported frequency: {freq}")
+    tix = [normalize_ticker(t) for t in tickers if t]
+    sync_history(tix)
+    series = {t: returns(t, period, freq) for t in dict.fromkeys(tix)}
+    missing = [t for t, s in series.items() if s is None or len(s[0]) < MIN_OVERLAP]
+    if missing:
+        raise ValueError(
+            f"Missing price data for: {', '.join(missing)} (check symbols)"
+        )
+    uniq = list(series)
+    return tix, uniq, [series[t] for t in uniq]
+
+
+def universe_stats(
+    tickers: List[str],
+    period: str = "3y",
+    freq: str = "1d",
+    estimator: str = None,
+    ewma_lambda: float = EWMA_LAMBDA,
+):
+    """
+    Annualized (mu, Sigma, meta) for `tickers` in the given order. Raises
+    ValueError naming tickers without enough price data.
+    """
+    estimator = (estimator or COV_ESTIMATOR).lower()
+    if estimator not in ESTIMATORS:
+        raise ValueError(
+            f"Unknown estimator {estimator}; use one of {', '.join(ESTIMATORS)}"
+        )
+    tix, uniq, data = _load(tickers, period, freq)
+    last = [int(t[-1]) for t, _ in data]
+    ann = ANNUALIZE[freq]
+    day = str(_today())
+    state = {}
+
+    def matrix():
+        if "X" not in state:
+            cal, X = _aligned(data)
+            state.update(cal=cal, X=np.nan_to_num(X), valid=~np.isnan(X))
+        return state
+
+    def sample_rows():
+        st = matrix()
+        return lambda i, cols: np.column_stack(_pair_row(st["X"], st["valid"], i, cols))
+
+    iu, ju, blocks, computed = _blocks(
+        f"stats:cov:{freq}:{period}:{day}", uniq, last, sample_rows
+    )
+    n = len(uniq)
+    S = _symmetric(n, iu, ju, blocks[:, 0]) * ann
+    counts = _symmetric(n, iu, ju, blocks[:, 2])
+    mu = np.array([r.mean() for _, r in data]) * ann
+    meta = {"estimator": estimator, "observations": int(np.median(np.diag(counts)))}
+
+    if estimator == "sample":
+        Sigma = _psd(S)
+    elif estimator == "ledoit_wolf":
+        pi = _symmetric(n, iu, ju, blocks[:, 1]) * ann * ann
+        pi_sum = float(np.sum(pi / np.maximum(counts, 1.0)))
+        Sigma, meta["shrinkage"] = ledoit_wolf(_psd(S), pi_sum)
+    elif estimator == "oas":
+        Sigma, meta["shrinkage"] = oas(_psd(S), meta["observations"])
+    else:
+        def ewma_rows():
+            st = matrix()
+            if "w" not in st:
+                cal = st["cal"].astype("datetime64[D]")
+                age = np.busday_count(cal, _today())
+                st["w"] = ewma_lambda ** age.astype(float)
+            def row(i, cols):
+                s = _ewma_row(st["X"], st["valid"], st["w"], i, cols)
+                return np.column_stack([s, np.zeros_like(s), np.zeros_like(s)])
+
+            return row
+
+        iu, ju, eb, more = _blocks(
+            f"stats:ewma:{ewma_lambda:g}:{freq}:{period}:{day}", uniq, last, ewma_rows
+        )
+        computed += more
+        Sigma = _psd(_symmetric(n, iu, ju, eb[:, 0]) * ann)
+        meta["lambda"] = ewma_lambda
+
+    meta["computedRows"] = computed
+    # Back to the caller's order (duplicates allowed)
+    idx = [uniq.index(t) for t in tix]
+    return mu[idx], Sigma[np.ix_(idx, idx)], meta
+
+
+def universe_factor_model(
+    tickers: List[str],
+    period: str = "3y",
+    freq: str = "1d",
+    factors: List[str] = None,
+    k: int = FACTOR_COUNT,
+):
+    """
+    Annualized (mu, FactorCov, meta) for `tickers` without forming Σ: regression
+    on the given factor tickers' returns (e.g. index/sector ETFs) or, without
+    them, k statistical (PCA) factors.
+    """
+    tix, uniq, data = _load(tickers, period, freq)
+    ann = ANNUALIZE[freq]
+    meta = {"estimator": "factor"}
+    if factors:
+        ftix, _, fdata = _load(factors, period, freq)
+        cal, X = _aligned(data + fdata)
+        Fr = X[:, len(data):]
+        rows = np.isfinite(Fr).all(axis=1)
+        X, Fr = X[rows, : len(data)], Fr[rows]
+        if len(Fr) < MIN_OVERLAP:
+            raise ValueError("Not enough overlapping history with the factor series")
+        model = regression_model(X * np.sqrt(ann), Fr * np.sqrt(ann))
+        meta.update(factorModel="regression", factors=list(dict.fromkeys(ftix)))
+    else:
+        cal, X = _aligned(data)
+        model = pca_model(X * np.sqrt(ann), k)
+        meta.update(factorModel="pca", factors=model.k)
+    meta["observations"] = int(len(X))
+    mu = np.array([r.mean() for _, r in data]) * ann
+    idx = [uniq.index(t) for t in tix]
+    return mu[idx], model.restrict(idx), meta
+
+
+def aligned_returns(tickers: List[str], period: str = "3y", freq: str = "1d"):
+    """
+    (tickers, epoch-day calendar (T,), returns (T, n) with NaN where missing),
+    columns in the caller's order; for engines that slice their own windows.
+    """
+    tix, uniq, data = _load(tickers, period, freq)
+    cal, X = _aligned(data)
+    return tix, cal, X[:, [uniq.index(t) for t in tix]]
+
+
+def window_stats(
+    X: np.ndarray,
+    freq: str = "1d",
+    estimator: str = None,
+    ewma_lambda: float = EWMA_LAMBDA,
+):
+    """
+    Annualized (mu, Sigma, meta) from an in-memory (T, n) returns window, NaN =
+    missing. Same estimators as `universe_stats`, but from column means and
+    pairwise counts in a few matrix products, with no cache round trips.
+    """
+    estimator = (estimator or COV_ESTIMATOR).lower()
+    if estimator not in ESTIMATORS:
+        raise ValueError(
+            f"Unknown estimator {estimator}; use one of {', '.join(ESTIMATORS)}"
+        )
+    ann = ANNUALIZE[freq]
+    valid = np.isfinite(X)
+    V = valid.astype(float)
+    cnt = np.maximum(V.T @ V, 1.0)
+    Xz = np.where(valid, X, 0.0)
+    mean = Xz.sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    Xc = np.where(valid, X - mean, 0.0)
+    P = Xc.T @ Xc
+    S = P / np.maximum(cnt - 1.0, 1.0) * ann
+    meta = {"estimator": estimator, "observations": int(np.median(np.diag(cnt)))}
+
+    if estimator == "sample":
+        Sigma = _psd(S)
+    elif estimator == "ledoit_wolf":
+        # π_ij = mean_t (x_ti x_tj - s_ij)² with biased s
+        X2 = Xc * Xc
+        pi = (X2.T @ X2 / cnt - (P / cnt) ** 2) * ann * ann
+        Sigma, meta["shrinkage"] = ledoit_wolf(_psd(S), float(np.sum(pi / cnt)))
+    elif estimator == "oas":
+        Sigma, meta["shrinkage"] = oas(_psd(S), meta["observations"])
+    else:
+        w = ewma_lambda ** np.arange(len(X) - 1, -1, -1, dtype=float)
+        W = V * w[:, None]
+        num = (Xz * w[:, None]).T @ Xz
+        Sigma = _psd(num / np.maximum(W.T @ V, 1e-300) * ann)
+        meta["lambda"] = ewma_lambda
+    return mean * ann, Sigma, meta
@@ -0,0 +1,186 @@
+# backend/storage/history.py
+"""
+Local daily close history, one columnar .npz per ticker:
+  - t: int64 days since epoch (ascending)
+  - c: float64 auto-adjusted close
+  - checked: float64 epoch seconds of the last upstream sync
+
+A ticker is bootstrapped once with its full history; afterwards only the tail
+since the last stored bar is downloaded. Any `period` is then a slice of the
+local arrays.
+"""
+import os, re, time, threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from services.providers import MARKET_DATA_PROVIDER, get_provider
+from utils.sanitize import normalize_ticker
+
+HISTORY_DIR = os.getenv(
+    "HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "history"),
+)
+if MARKET_DATA_PROVIDER != "yfinance":
+    # Never mix offline series into the live store
+    HISTORY_DIR = os.path.join(HISTORY_DIR, MARKET_DATA_PROVIDER)
+# How often a ticker's tail is re-synced with upstream
+HISTORY_REFRESH_SEC = int(os.getenv("HISTORY_REFRESH_SEC", "3600"))
+HISTORY_BOOTSTRAP = os.getenv("HISTORY_BOOTSTRAP", "max")
+# Bars re-downloaded before the last stored one; if they moved, a dividend or
+# split re-adjusted the series and the ticker is re-bootstrapped. The last
+# stored bar itself may be a partial intraday bar and is always refreshed.
+HISTORY_OVERLAP_BARS = 5
+_ADJ_RTOL = 1e-4
+
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
+_mem: Dict[str, Tuple[float, np.ndarray, np.ndarray, float]] = {}
+_sync_lock = threading.Lock()
+
+
+def _path(ticker: str) -> str:
+    return os.path.join(HISTORY_DIR, quote(ticker, safe="") + ".npz")
+
+
+def _read(ticker: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+    path = _path(ticker)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    hit = _mem.get(ticker)
+    if hit and hit[0] == mtime:
+        return hit[1], hit[2], hit[3]
+    with np.load(path) as npz:
+        t, c, checked = npz["t"], npz["c"], float(npz["checked"])
+    _mem[ticker] = (mtime, t, c, checked)
+    return t, c, checked
+
+
+def _write(ticker: str, t: np.ndarray, c: np.ndarray, checked: float) -> None:
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    path = _path(ticker)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(
+            f,
+            t=t.astype(np.int64, copy=False),
+            c=c.astype(np.float64, copy=False),
+            checked=np.float64(checked),
+        )
+    os.replace(tmp, path)  # atomic: readers never see a half-written file
+
+
+def _merge_tail(t, c, nt, nc) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Replace the last stored bar (intraday it is today's partial bar) and append
+    newer ones; None if an older, settled bar moved, i.e. the series was re-adjusted.
+    """
+    idx = np.searchsorted(t, nt)
+    overlap = (idx < len(t)) & (t[np.minimum(idx, len(t) - 1)] == nt) & (nt < t[-1])
+    if overlap.any() and not np.allclose(
+        c[idx[overlap]], nc[overlap], rtol=_ADJ_RTOL, atol=0.0
+    ):
+        return None
+    keep = len(t) - 1 if (nt == t[-1]).any() else len(t)
+    newer = nt > t[keep - 1] if keep else np.ones(len(nt), dtype=bool)
+    return np.concatenate([t[:keep], nt[newer]]), np.concatenate([c[:keep], nc[newer]])
+
+
+def sync(tickers: Iterable[str], force: bool = False) -> None:
+    """Bring the local store up to date for `tickers` with at most two bulk downloads."""
+    now = time.time()
+    bootstrap: List[str] = []
+    tail: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    with _sync_lock:
+        for tkr in dict.fromkeys(tickers):
+            rec = _read(tkr)
+            if rec is None or len(rec[0]) == 0:
+                bootstrap.append(tkr)
+            elif force or now - rec[2] > HISTORY_REFRESH_SEC:
+                tail[tkr] = (rec[0], rec[1])
+
+        if tail:
+            back = max(HISTORY_OVERLAP_BARS, 1) * 2  # calendar days ~ trading bars
+            start = min(int(t[-1]) for t, _ in tail.values()) - back
+            fresh = get_provider().daily_closes(
+                list(tail), start=str(np.datetime64(start, "D"))
+            )
+            for tkr, (t, c) in tail.items():
+                if tkr not in fresh:
+                    _write(tkr, t, c, now)  # nothing new (holiday / delisted)
+                    continue
+                merged = _merge_tail(t, c, *fresh[tkr])
+                if merged is None:
+                    bootstrap.append(tkr)
+                else:
+                    _write(tkr, merged[0], merged[1], now)
+
+        if bootstrap:
+            full = get_provider().daily_closes(bootstrap, period=HISTORY_BOOTSTRAP)
+            for tkr in bootstrap:
+                if tkr in full:
+                    _write(tkr, full[tkr][0], full[tkr][1], now)
+
+
+def period_start(period: str, end: np.datetime64) -> Optional[np.datetime64]:
+    """First calendar day covered by a yfinance-style period ('5d', '6mo', '3y', 'ytd', 'max')."""
+    period = (period or "1y").strip().lower()
+    if period == "max":
+        return None
+    end_ts = pd.Timestamp(end)
+    if period == "ytd":
+        return np.datetime64(f"{end_ts.year}-01-01", "D")
+    m = _PERIOD_RE.match(period)
+    if not m:
+        raise ValueError(f"Bad period: {period}")
+    n, unit = int(m.group(1)), m.group(2)
+    offset = {
+        "d": pd.DateOffset(days=n),
+        "wk": pd.DateOffset(weeks=n),
+        "mo": pd.DateOffset(months=n),
+        "y": pd.DateOffset(years=n),
+    }[unit]
+    return np.datetime64((end_ts - offset).date(), "D")
+
+
+def load_arrays(
+    ticker: str, period: str = "1y"
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Stored (epoch days, closes) for `ticker` over `period`; no upstream sync."""
+    rec = _read(ticker)
+    if rec is None:
+        return None
+    t, c, _ = rec
+    start = period_start(period, np.datetime64("today", "D"))
+    lo = 0 if start is None else np.searchsorted(t, start.astype(np.int64))
+    return t[lo:], c[lo:]
+
+
+def load_closes(tickers: Iterable[str], period: str = "1y") -> pd.DataFrame:
+    """
+    Daily closes for `tickers` over `period`, one column per ticker, outer-joined
+    on date. Tickers with no data are simply absent from the columns.
+    """
+    tix = [normalize_ticker(t) for t in tickers if t]
+    sync(tix)
+    cols = {}
+    for tkr in tix:
+        rec = load_arrays(tkr, period)
+        if rec is None:
+            continue
+        t, c = rec
+        cols[tkr] = pd.Series(
+            c, index=pd.to_datetime(t.astype("datetime64[D]")), name=tkr
+        )
+    if not cols:
+        return pd.DataFrame()
+    return pd.concat(cols.values(), axis=1, join="outer").sort_index()
+
+
+def load_close(ticker: str, period: str = "1y") -> pd.Series:
+    df = load_closes([ticker], period)
+    tkr = normalize_ticker(ticker)
+    if tkr not in df.columns:
+        return pd.Series(dtype=float, name=tkr)
+    return df[tkr].dropna()
@@ -1,13 +1,9 @@
 # backend/storage/paths.py
-from typing import Tuple, Optional
-from io import BytesIO
+import io
 import numpy as np
-import gridfs
-from bson import ObjectId
+from gridfs import GridFS  # uses 'fs.files'/'fs.chunks'
 from models.db import db
 
-_fs = gridfs.GridFS(db)  # uses 'fs.files'/'fs.chunks'
-
 
 # def save_paths_npz(job_id: str, time_grid: np.ndarray, paths: np.ndarray) -> str:
 #     """
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from kombu import Queue
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,10 +18,43 @@ celery_app = Celery(
     include=[
         "tasks.option_pricing",
         "tasks.optimization",
+        "tasks.basket",
+        "tasks.backtest",
+        "tasks.risk",
+        "tasks.scenario",
+        "tasks.batch",
+        "tasks.warmup",
     ],
 )
 
+# Long tasks: hold one message per worker process and acknowledge only when
+# done, so a crashed worker's job is redelivered rather than lost. The Redis
+# visibility timeout must outlast the longest job or it is delivered twice.
+CELERY_VISIBILITY_TIMEOUT = int(os.getenv("CELERY_VISIBILITY_TIMEOUT", "21600"))
+
 celery_app.conf.update(
     timezone="UTC",
     task_track_started=True,  # mark as STARTED before RUNNING
+    task_queues=[
+        Queue(q, queue_arguments={"x-max-priority": 10})
+        for q in ("light", "heavy_mc", "quantum", "celery")
+    ],
+    task_default_queue="celery",
+    task_queue_max_priority=10,
+    task_routes={"batch.finish_batch": {"queue": "light"}},
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    broker_transport_options={
+        "visibility_timeout": CELERY_VISIBILITY_TIMEOUT,
+        "priority_steps": list(range(10)),
+        "queue_order_strategy": "priority",
+    },
+    beat_schedule={
+        # The task itself throttles to market hours (see tasks/warmup.py)
+        "warm-market-caches": {
+            "task": "warmup.warm_market_caches",
+            "schedule": float(os.getenv("WARM_TICK_SEC", "60")),
+        },
+    },
 )
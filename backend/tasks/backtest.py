@@ -0,0 +1,294 @@
+# backend/tasks/backtest.py
+"""
+Walk-forward backtests of the portfolio optimizers.
+
+At every rebalance date the chosen optimizer is re-run on the trailing
+`lookback` window of daily returns (statistics from services.statistics,
+solvers warm-started from the previous rebalance). Holdings are then
+simulated for all dates at once: with C the cumulative growth of each asset,
+a segment bought at rebalance r with weights w is worth
+(1 - Σw) + C_t · (w / C_r) on any later day t, so equity, drift weights and
+turnover come from a few array operations rather than a day-by-day loop.
+Costs are charged on turnover at each rebalance.
+"""
+import os
+import numpy as np
+from . import celery_app
+from models.jobs import set_job_status
+from models.db import db
+from models.progress import JobCancelled, ProgressReporter
+from .dispatch import cancel_job
+from services.statistics import MIN_OVERLAP, aligned_returns, window_stats
+from optim.cardinality import CARD_GAP, cardinality_mv
+from optim.qp import max_return, mean_variance
+from optim.qubo import cardinality_qubo, solve_qubo, tabu_search
+from .optimization import _bounds, _get_portfolio_assets, _parse_constraint, _parse_groups
+
+BACKTEST_ALGOS = ("MeanVariance", "QUBO", "EqualWeight")
+# Per-rebalance search limit for cardinality-constrained mean-variance; a
+# search stopped by it keeps its best portfolio and reports the gap
+BACKTEST_CARD_TIME_LIMIT = float(os.getenv("BACKTEST_CARD_TIME_LIMIT", "0.5"))
+# Share of the lookback window an asset needs to be eligible at a rebalance
+_MIN_COVERAGE = 0.8
+_DAYS = 252.0
+
+
+def _rebalance_points(cal: np.ndarray, every, lookback: int) -> np.ndarray:
+    """Indices of the closes at which the book is rebalanced (last day of each period)."""
+    T = len(cal)
+    if every in ("1wk", "1mo"):
+        if every == "1wk":
+            bucket = (cal + 3) // 7  # Monday-based weeks, as in statistics._resample
+        else:
+            bucket = cal.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        pts = np.flatnonzero(np.diff(bucket) != 0)
+    else:
+        step = 1 if every == "1d" else int(every)
+        if step < 1:
+            raise ValueError("rebalance must be 1d, 1wk, 1mo or a positive number of days")
+        pts = np.arange(lookback - 1, T, step)
+    pts = pts[(pts >= lookback - 1) & (pts < T - 1)]
+    if len(pts) == 0:
+        raise ValueError(
+            f"Not enough history for a {lookback}-day lookback; extend the period"
+        )
+    return pts
+
+
+def _simulate(R: np.ndarray, pts: np.ndarray, W: np.ndarray, cost: float):
+    """
+    Equity (T - pts[0],) for weights W[s] set at close pts[s], plus per-rebalance
+    turnover and cost (fractions of equity). R has no NaN (missing = 0 return).
+    """
+    T = len(R)
+    C = np.cumprod(1.0 + R, axis=0)
+    Cr = np.where(C[pts] > 0, C[pts], np.inf)
+    units = W / Cr  # value of each position per unit of C
+    cash = 1.0 - W.sum(axis=1)
+
+    t = np.arange(pts[0] + 1, T)
+    seg = np.searchsorted(pts, t - 1, side="right") - 1
+    growth = np.einsum("tn,tn->t", C[t], units[seg]) + cash[seg]
+
+    # Growth of each segment to its last day, and the drifted weights held then
+    ends = np.append(pts[1:], T - 1)
+    end_growth = np.einsum("sn,sn->s", C[ends], units) + cash
+    drift = W[:-1] * (C[pts[1:]] / Cr[:-1]) / end_growth[:-1, None]
+    turnover = np.abs(W).sum(axis=1)
+    turnover[1:] = np.abs(W[1:] - drift).sum(axis=1)
+    kept = 1.0 - cost * turnover
+    start = np.cumprod(np.concatenate([[1.0], end_growth[:-1] * kept[:-1]])) * kept
+    equity = np.concatenate([[kept[0]], start[seg] * growth])
+    # Cost as a fraction of the portfolio value at each rebalance
+    return equity, turnover, cost * turnover
+
+
+def _summary(equity: np.ndarray):
+    daily = equity[1:] / equity[:-1] - 1.0
+    years = max(len(daily) / _DAYS, 1e-12)
+    vol = float(np.std(daily, ddof=1) * np.sqrt(_DAYS)) if len(daily) > 1 else 0.0
+    cagr = float(equity[-1] / equity[0]) ** (1.0 / years) - 1.0
+    peak = np.maximum.accumulate(equity)
+    drawdown = equity / peak - 1.0
+    return {
+        "cagr": cagr,
+        "volatility": vol,
+        "sharpe": (float(np.mean(daily) * _DAYS) / vol if vol > 0 else None),
+        "maxDrawdown": float(drawdown.min()),
+    }, drawdown
+
+
+def _window_problem(X, r, lookback, estimator):
+    """Eligible assets and their (mu, Sigma) over the window ending at close r."""
+    win = X[r - lookback + 1 : r + 1]
+    cover = np.isfinite(win).sum(axis=0)
+    elig = np.flatnonzero(
+        (cover >= max(MIN_OVERLAP, _MIN_COVERAGE * lookback)) & np.isfinite(X[r])
+    )
+    if len(elig) == 0:
+        return elig, None, None
+    mu, S, _ = window_stats(win[:, elig], "1d", estimator)
+    return elig, mu, S
+
+
+def run_backtest(X, cal, tickers, algo, params, progress=None):
+    """
+    The backtest itself; X is (T, n) daily returns with NaN where missing.
+    `progress(done, total, **fields)` is called after each rebalance.
+    """
+    if algo not in BACKTEST_ALGOS:
+        raise ValueError(f"Unknown backtest algo {algo}; use {', '.join(BACKTEST_ALGOS)}")
+    T, n = X.shape
+    lookback = int(params.get("lookback", 252))
+    if lookback < MIN_OVERLAP:
+        raise ValueError(f"lookback must be at least {MIN_OVERLAP} observations")
+    pts = _rebalance_points(cal, str(params.get("rebalance", "1mo")), lookback)
+    cost = float(params.get("costBps", 10.0)) * 1e-4
+    estimator = params.get("estimator")
+    constraint = str(params.get("constraint", "None"))
+    long_only, gross_leq_1, w_max, cardinality = _parse_constraint(constraint, n)
+    lo, hi = _bounds(long_only, gross_leq_1, w_max)
+    budget = 1.0 if gross_leq_1 else None
+    target = params.get("target")
+    target = float(target) if (target is not None and str(target) != "") else None
+    groups = _parse_groups(params.get("groups"), tickers)
+    gamma = float(params.get("gamma", 0.5))
+
+    W = np.zeros((len(pts), n))
+    B = np.zeros((len(pts), n))  # equal-weight benchmark on the same schedule
+    warm, selected, solves, failed = None, None, 0, 0
+    # Relative optimality gap of each cardinality search (NaN elsewhere)
+    gaps = np.full(len(pts), np.nan)
+    for s, r in enumerate(pts):
+        if progress is not None and s:
+            progress(s, len(pts), unit="rebalances", solves=solves)
+        elig, mu, S = _window_problem(X, r, lookback, estimator)
+        if len(elig) == 0:
+            continue
+        B[s, elig] = 1.0 / len(elig)
+        if algo == "EqualWeight":
+            W[s] = B[s]
+            continue
+        if algo == "QUBO":
+            k = min(cardinality or max(1, int(np.sqrt(len(elig)))), len(elig))
+            Q, c, _ = cardinality_qubo(S, mu, k, gamma)
+            if selected is None:
+                x = solve_qubo(Q, c, k, method=params.get("solver", "auto"))["x"]
+            else:
+                # Warm start: last selection, topped up / trimmed by expected return
+                prev = selected[elig]
+                order = np.lexsort((-mu, -prev))
+                x0 = np.zeros(len(elig))
+                x0[order[:k]] = 1.0
+                x = tabu_search(Q, c, k, x0=x0, iters=4 * len(elig))["x"]
+            selected = np.zeros(n)
+            selected[elig] = x
+            W[s] = selected / k
+            solves += 1
+            continue
+
+        # Mean-variance over the full universe, ineligible names pinned to 0, so
+        # consecutive rebalances share dimensions and can warm-start.
+        mu_f = np.zeros(n)
+        mu_f[elig] = mu
+        S_f = np.diag(np.full(n, float(np.mean(np.diag(S)))))
+        S_f[np.ix_(elig, elig)] = S
+        lo_f = np.zeros(n)
+        lo_f[elig] = lo
+        hi_f = np.zeros(n)
+        hi_f[elig] = hi
+        tgt = target
+        if tgt is not None and budget is not None:
+            tgt = min(tgt, max_return(mu_f, lo_f, hi_f, budget))
+        if cardinality is not None:
+            out = cardinality_mv(
+                S_f, mu_f, cardinality, target=tgt, lo=lo_f, hi=hi_f,
+                budget=budget, groups=groups, time_limit=BACKTEST_CARD_TIME_LIMIT,
+                start=W[s - 1] if s else None,
+            )
+            ok = out["ok"]
+            x = out["x"] if ok else None
+            if ok:
+                gaps[s] = out["gap"]
+        else:
+            warm = mean_variance(
+                S_f, mu_f, target=tgt, lo=lo_f, hi=hi_f, budget=budget,
+                groups=groups, warm=warm,
+            )
+            ok, x = warm.ok, warm.x
+        solves += 1
+        if ok:
+            W[s] = x
+        else:
+            # Keep the previous book rather than trade on a failed solve
+            failed += 1
+            W[s] = W[s - 1] if s else B[s]
+
+    unproven = int(np.count_nonzero(gaps > CARD_GAP))
+    R = np.nan_to_num(X, nan=0.0)
+    equity, turnover, costs = _simulate(R, pts, W, cost)
+    gross, _, _ = _simulate(R, pts, W, 0.0)
+    bench, _, _ = _simulate(R, pts, B, cost)
+    stats, drawdown = _summary(equity)
+    bstats, _ = _summary(bench)
+    dates = [str(d) for d in cal[pts[0] :].astype("datetime64[D]")]
+    years = max((len(equity) - 1) / _DAYS, 1e-12)
+    return {
+        "tickers": tickers,
+        "dates": dates,
+        "equity": equity.tolist(),
+        "equityGross": gross.tolist(),
+        "benchmark": bench.tolist(),
+        "drawdown": drawdown.tolist(),
+        "rebalances": [
+            {
+                "date": dates[int(r - pts[0])],
+                "turnover": float(tu),
+                "cost": float(co),
+                "names": int(np.count_nonzero(np.abs(w) > 1e-6)),
+                "gap": None if np.isnan(g) else float(g),
+            }
+            for r, tu, co, w, g in zip(pts, turnover, costs, W, gaps)
+        ],
+        "weights": W[-1].tolist(),
+        "expectedReturn": stats["cagr"],
+        **stats,
+        "annualTurnover": float(turnover[1:].sum() / years),
+        "totalCost": float(costs.sum()),
+        "benchmarkCagr": bstats["cagr"],
+        "benchmarkMaxDrawdown": bstats["maxDrawdown"],
+        "maxGap": float(np.nanmax(gaps)) if np.isfinite(gaps).any() else None,
+        "ok": failed == 0,
+        "message": f"{len(pts)} rebalances, {solves} solves"
+        + (f", {failed} failed (previous weights kept)" if failed else "")
+        + (
+            f", {unproven} cardinality searches stopped at the "
+            f"{BACKTEST_CARD_TIME_LIMIT:g}s limit (max gap {np.nanmax(gaps):.1%})"
+            if unproven
+            else ""
+        ),
+    }
+
+
+@celery_app.task(name="backtest.run_backtest_job")
+def run_backtest_job(job_id: str, algo: str, params: dict):
+    if not set_job_status(job_id, "Running"):
+        return  # cancelled (or already finished) before it started
+    progress = ProgressReporter(job_id)
+    try:
+        portfolio_id = params.get("portfolioId") or params.get("portfolio_id")
+        job_doc = db.jobs.find_one({"id": job_id}, {"_id": 0, "portfolioId": 1})
+        if not portfolio_id and job_doc:
+            portfolio_id = job_doc.get("portfolioId")
+        if not portfolio_id:
+            raise ValueError("portfolioId required")
+
+        tickers = [a["ticker"] for a in _get_portfolio_assets(portfolio_id)]
+        if not tickers:
+            raise ValueError("No assets in portfolio")
+        tickers, cal, X = aligned_returns(tickers, period=params.get("period", "10y"))
+        res = run_backtest(X, cal, tickers, algo, params, progress)
+        set_job_status(
+            job_id,
+            "Succeeded",
+            result={
+                "algo": algo,
+                "constraint": str(params.get("constraint", "None")),
+                "insights": {
+                    "Assets": len(tickers),
+                    "Period": params.get("period", "10y"),
+                    "Rebalance": str(params.get("rebalance", "1mo")),
+                    "CAGR": res["cagr"],
+                    "Max drawdown": res["maxDrawdown"],
+                    "Ok": res["ok"],
+                    "Message": res["message"],
+                },
+                **res,
+            },
+        )
+    except JobCancelled:
+        cancel_job(job_id, result={"partial": progress.payload})
+    except Exception as e:
+        set_job_status(job_id, "Failed", error=str(e))
+    finally:
+        progress.close()
@@ -0,0 +1,150 @@
+# backend/tasks/basket.py
+"""
+OptionPricing jobs for multi-asset products (Basket, Spread, Rainbow).
+
+Underlyings come from params.underlyings ([{ticker, weight?, S0?, sigma?, q?}])
+or params.tickers + params.weights. Their covariance is estimated with the
+same services.statistics estimators the optimizers use; a leg's own sigma
+rescales its row/column, and params.correlation replaces the estimated
+correlation entirely. Pricing is pricing.basket.basket_mc.
+"""
+import numpy as np
+from . import celery_app
+from models.jobs import set_job_status
+from models.progress import JobCancelled, ProgressReporter
+from .dispatch import cancel_job
+from pricing.basket import basket_mc, moment_matched
+from pricing.legs import spot_or_last, year_fraction
+from services.statistics import universe_stats
+from utils.sanitize import normalize_ticker
+
+BASKET_PRODUCTS = ("Basket", "Spread", "Rainbow")
+
+
+def _flag(params, key, default):
+    return str(params.get(key, default)).lower() in ("1", "true", "yes", "on")
+
+
+def _underlyings(params: dict):
+    rows = params.get("underlyings")
+    if not rows:
+        tickers = params.get("tickers") or []
+        if isinstance(tickers, str):
+            tickers = tickers.split(",")
+        weights = params.get("weights") or [None] * len(tickers)
+        if len(weights) != len(tickers):
+            raise ValueError("weights must match tickers")
+        rows = [{"ticker": t, "weight": w} for t, w in zip(tickers, weights)]
+    out = []
+    for i, u in enumerate(rows):
+        tkr = normalize_ticker(str(u.get("ticker", "")))
+        if not tkr:
+            raise ValueError(f"Underlying {i+1}: ticker required")
+        out.append({**u, "ticker": tkr})
+    return out
+
+
+def _weights(product, rows, params):
+    given = [u.get("weight") for u in rows]
+    if all(w not in (None, "") for w in given):
+        return np.array([float(w) for w in given])
+    n = len(rows)
+    if product == "Spread":
+        return np.array([1.0, -1.0])
+    if product == "Rainbow":
+        return np.ones(n)
+    return np.full(n, 1.0 / n)
+
+
+def _covariance(rows, params):
+    tickers = [u["ticker"] for u in rows]
+    sig = [u.get("sigma") for u in rows]
+    corr = params.get("correlation")
+    if corr is not None:
+        C = np.asarray(corr, dtype=float)
+        if C.shape != (len(rows), len(rows)):
+            raise ValueError("correlation must be an n x n matrix")
+    if corr is None or any(s in (None, "") for s in sig):
+        _, Sigma, _ = universe_stats(
+            tickers, period=params.get("period", "3y"), estimator=params.get("estimator")
+        )
+        Sigma = np.asarray(Sigma, dtype=float)
+        vol = np.sqrt(np.diag(Sigma))
+        if corr is None:
+            C = Sigma / np.outer(vol, vol)
+    else:
+        vol = np.zeros(len(rows))
+    vol = np.array([float(s) if s not in (None, "") else v for s, v in zip(sig, vol)])
+    return C * np.outer(vol, vol), vol, C
+
+
+@celery_app.task(name="basket.run_basket_job")
+def run_basket_job(job_id: str, product: str, algo: str, params: dict):
+    if not set_job_status(job_id, "Running"):
+        return  # cancelled (or already finished) before it started
+    progress = ProgressReporter(job_id)
+    try:
+        if product not in BASKET_PRODUCTS:
+            raise ValueError(f"Unknown product {product}; use {', '.join(BASKET_PRODUCTS)}")
+        if algo != "MonteCarlo":
+            raise ValueError(f"{product} options are priced with MonteCarlo")
+        rows = _underlyings(params)
+        if len(rows) < 2:
+            raise ValueError(f"{product} needs at least two underlyings")
+        if product == "Spread" and len(rows) != 2:
+            raise ValueError("Spread needs exactly two underlyings")
+        w = _weights(product, rows, params)
+        K = float(params.get("strike", params.get("K", 0)) or 0)
+        if params.get("T") not in (None, ""):
+            T = float(params["T"])
+        elif params.get("expiry"):
+            T = year_fraction(params["expiry"])
+        else:
+            raise ValueError("expiry or T required")
+        r = float(params.get("r", 0.01))
+        q = np.array([float(u.get("q", params.get("q", 0.0))) for u in rows])
+        S0 = np.array(
+            [float(u["S0"]) if u.get("S0") not in (None, "") else spot_or_last(u["ticker"]) for u in rows]
+        )
+        cov, vol, C = _covariance(rows, params)
+        is_call = str(params.get("option_type", "CALL")).upper().startswith("C")
+        payoff = "basket" if product != "Rainbow" else str(params.get("rainbow", "best")).lower()
+        seed = params.get("seed")
+
+        res = basket_mc(
+            S0, w, K, T, r, q, cov,
+            payoff=payoff,
+            is_call=is_call,
+            paths=int(params.get("num_paths", 200_000)),
+            antithetic=_flag(params, "antithetic", "true"),
+            control=_flag(params, "control_variate", "true"),
+            seed=int(seed) if seed not in (None, "") else None,
+            progress=progress,
+        )
+        approx = moment_matched(S0, w, K, T, r, q, cov, is_call) if payoff == "basket" else None
+        set_job_status(
+            job_id,
+            "Succeeded",
+            result={
+                "product": product,
+                "algo": algo,
+                "payoff": payoff,
+                "underlyings": [
+                    {"ticker": u["ticker"], "weight": float(wi), "S0": float(s), "sigma": float(v), "q": float(qi)}
+                    for u, wi, s, v, qi in zip(rows, w, S0, vol, q)
+                ],
+                "correlation": C.tolist(),
+                "strike": K,
+                "T": T,
+                "r": r,
+                "otype": "CALL" if is_call else "PUT",
+                "momentMatched": approx,
+                **res,
+            },
+        )
+    except JobCancelled:
+        cancel_job(job_id, result={"partial": progress.payload})
+    except Exception as e:
+        set_job_status(job_id, "Failed", error=str(e))
+    finally:
+        progress.close()
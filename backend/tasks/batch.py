@@ -0,0 +1,72 @@
+# backend/tasks/batch.py
+"""
+Dispatch for POST /jobs/batch.
+
+Jobs that share type, product, algo, underlying (ticker, first leg ticker or
+portfolio), queue and priority are packed, up to BATCH_GROUP_SIZE at a time, into one
+batch.run_group task that runs them back to back in a single worker, so the
+market data, history and statistics caches are loaded once per underlying
+instead of once per job. The groups go out as one Celery chord whose callback
+records the batch's final counts.
+"""
+import os
+from typing import Callable, Dict, List, Optional
+from celery import chord, signature
+from . import celery_app
+from models.jobs import finish_batch
+
+BATCH_GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "25"))
+
+
+def _underlying(job: dict) -> Optional[str]:
+    params = job.get("params") or {}
+    legs = params.get("legs") or params.get("underlyings")
+    if params.get("ticker"):
+        return str(params["ticker"]).strip().upper()
+    if isinstance(legs, list) and legs and isinstance(legs[0], dict) and legs[0].get("ticker"):
+        return str(legs[0]["ticker"]).strip().upper()
+    if params.get("tickers"):
+        return str(params["tickers"]).strip().upper()
+    return job.get("portfolioId")
+
+
+def group_jobs(jobs: List[dict], size: int = BATCH_GROUP_SIZE) -> List[List[dict]]:
+    """Compatible jobs in runs of at most `size`, in submission order."""
+    buckets: Dict[tuple, List[dict]] = {}
+    for j in jobs:
+        key = (j["type"], j.get("product"), j["algo"], _underlying(j), j.get("queue"), j.get("priority"))
+        buckets.setdefault(key, []).append(j)
+    return [b[i : i + size] for b in buckets.values() for i in range(0, len(b), max(1, size))]
+
+
+def dispatch_batch(batch_id: str, jobs: List[dict], task_for: Callable):
+    """
+    Enqueue `jobs` (new, not deduplicated) as a chord ending in finish_batch.
+    task_for(job) is the job's Celery signature, or None to skip it.
+    """
+    groups = []
+    for g in group_jobs(jobs):
+        sigs = [s for s in (task_for(j) for j in g) if s is not None]
+        if len(sigs) == 1:
+            groups.append(sigs[0])
+        elif sigs:
+            # Members share queue and priority (both part of the group key)
+            opts = sigs[0].options
+            groups.append(run_group.si(sigs).set(queue=opts.get("queue"), priority=opts.get("priority")))
+    callback = finish_batch_job.si(batch_id)
+    if not groups:
+        return callback.apply_async()
+    return chord(groups)(callback)
+
+
+@celery_app.task(name="batch.run_group")
+def run_group(sigs: List[dict]):
+    """Run several jobs back to back in this worker; each records its own status."""
+    for s in sigs:
+        signature(s, app=celery_app).apply()
+
+
+@celery_app.task(name="batch.finish_batch")
+def finish_batch_job(batch_id: str):
+    doc = finish_batch(batch_id)
+    return doc["status"] if doc else None
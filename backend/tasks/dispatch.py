@@ -0,0 +1,54 @@
+# backend/tasks/dispatch.py
+"""
+Job -> Celery signature, and the cancel path shared by the API and the
+engines: a cancelled job's followers are promoted and re-enqueued rather
+than cancelled with it (models.jobs.promote_followers).
+"""
+from typing import Any, Dict, Optional
+from models.jobs import promote_followers, set_job_status
+from .routing import route
+
+
+def task_for(job: Dict[str, Any]):
+    """Celery signature that runs `job` on its queue; None for types without an engine."""
+    # Engines import this module for cancel_job, so they are imported lazily
+    from . import backtest, basket, option_pricing, optimization, risk, scenario
+
+    args = [job["id"], job["algo"], job["params"]]
+    if job["type"] == "OptionPricing" and job.get("product") in basket.BASKET_PRODUCTS:
+        sig = basket.run_basket_job.si(job["id"], job["product"], job["algo"], job["params"])
+    elif job["type"] == "OptionPricing":
+        sig = option_pricing.run_option_job.si(job["id"], job["product"], job["algo"], job["params"])
+    elif job["type"] == "PortfolioOptimization":
+        sig = optimization.run_optimization_job.si(*args)
+    elif job["type"] == "Backtest":
+        sig = backtest.run_backtest_job.si(*args)
+    elif job["type"] == "PortfolioRisk":
+        sig = risk.run_risk_job.si(*args)
+    elif job["type"] == "ScenarioGrid":
+        sig = scenario.run_scenario_job.si(*args)
+    else:
+        return None
+    # The job id doubles as the Celery task id so a cancel can revoke it
+    return sig.set(task_id=job["id"], **route(job))
+
+
+def enqueue(job: Dict[str, Any]) -> bool:
+    task = task_for(job)
+    if task is None:
+        return False
+    task.apply_async()
+    return True
+
+
+def cancel_job(job_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Cancel `job_id` (if its status allows) and re-enqueue the follower that
+    inherits its work. False if the job was already finished.
+    """
+    if not set_job_status(job_id, "Cancelled", result=result):
+        return False
+    heir = promote_followers(job_id)
+    if heir:
+        enqueue(heir)
+    return True
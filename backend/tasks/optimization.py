@@ -1,14 +1,21 @@
 # backend/tasks/optimization.py
+import os
 from . import celery_app
 from models.jobs import set_job_status
 from models.db import db
+from models.progress import JobCancelled, ProgressReporter
+from .dispatch import cancel_job
 import numpy as np
 from datetime import datetime, timezone
-import yfinance as yf
 
 from utils.sanitize import normalize_ticker
+from services.statistics import universe_factor_model, universe_stats
+from optim.cardinality import cardinality_mv
+from optim.qp import as_cov, max_return, max_return_weights, mean_variance
+from optim.qubo import cardinality_qubo, solve_qubo, tabu_search
 
-from scipy.optimize import minimize
+# Universes at least this large default to the factor risk model
+FACTOR_AUTO_ASSETS = int(os.getenv("FACTOR_AUTO_ASSETS", "1000"))
 
 
 def _utcnow():
@@ -19,26 +26,29 @@ def _get_portfolio_assets(portfolio_id: str):
     return list(db.assets.find({"portfolioId": portfolio_id}, {"_id": 0, "ticker": 1}))
 
 
-def _fetch_history(tickers, period="3y"):
-    tix = [normalize_ticker(t) for t in tickers if t]
-    data = yf.download(tickers=tix, period=period, auto_adjust=True, progress=False)
-    close = (
-        data["Close"]
-        if isinstance(data, dict)
-        else data["Adj Close"] if "Adj Close" in data else data
-    )
-    if close is None or len(close) == 0:
-        raise ValueError(f"No price data for tickers: {tix}")
-    if close.ndim == 1:
-        close = close.to_frame()
-    close = close.dropna(how="all")
-    # If any ticker fully empty → raise helpful error
-    missing = [t for t in tix if t not in close.columns]
-    if missing:
-        raise ValueError(
-            f"Missing price data for: {', '.join(missing)} (check symbols)"
+def _parse_groups(groups, tickers):
+    """
+    Group limits as [{"tickers": [...], "min": 0.1, "max": 0.4}, ...] or
+    {"Tech": {"tickers": [...], "max": 0.4}, ...} -> [(indices, min, max)].
+    """
+    if not groups:
+        return []
+    specs = groups.values() if isinstance(groups, dict) else groups
+    pos = {normalize_ticker(t): i for i, t in enumerate(tickers)}
+    out = []
+    for g in specs:
+        idx = [pos[t] for t in map(normalize_ticker, g.get("tickers") or []) if t in pos]
+        if not idx:
+            continue
+        gmin, gmax = g.get("min"), g.get("max")
+        out.append(
+            (
+                idx,
+                float(gmin) if gmin is not None else None,
+                float(gmax) if gmax is not None else None,
+            )
         )
-    return close
+    return out
 
 
 def _mv_optimize(
@@ -48,105 +58,243 @@ def _mv_optimize(
     long_only=True,
     gross_leq_1=True,
     w_max: float = None,
+    groups=(),
 ):
     n = len(returns)
     # Objective: min 0.5 w^T Σ w   (min variance). If no target given, we add -λμ^T w with small λ.
-    lam = 0.0 if target is not None else 1e-3
+    budget = 1.0 if gross_leq_1 else None
+    lo, hi = _bounds(long_only, gross_leq_1, w_max)
+
+    msg = "Optimal"
+    if target is not None and budget is not None:
+        best = max_return(returns, np.full(n, lo), np.full(n, hi), budget)
+        if target > best:
+            msg = f"Target return {target:.4f} not attainable (max {best:.4f}); using max"
+            target = best
+
+    res = mean_variance(
+        cov, returns, target=target, lo=lo, hi=hi, budget=budget, groups=groups
+    )
+    if not res.ok:
+        msg = f"QP stopped after {res.iters} iterations ({res.status})"
+    w = res.x
+    port_ret = float(np.dot(returns, w))
+    port_vol = float(np.sqrt(w @ as_cov(cov).matvec(w)))
+    return w, port_ret, port_vol, res.ok and msg == "Optimal", msg
+
+
+def _card_optimize(
+    returns,
+    cov,
+    cardinality: int,
+    target: float = None,
+    long_only=True,
+    gross_leq_1=True,
+    w_max: float = None,
+    groups=(),
+    progress=None,
+):
+    """Exact mean-variance with at most `cardinality` names (optim.cardinality)."""
+    n = len(returns)
+    budget = 1.0 if gross_leq_1 else None
+    lo, hi = _bounds(long_only, gross_leq_1, w_max)
+    if target is not None and budget is not None:
+        target = min(target, max_return(returns, np.full(n, lo), np.full(n, hi), budget))
+    out = cardinality_mv(
+        cov, returns, cardinality, target=target, lo=lo, hi=hi, budget=budget, groups=groups,
+        progress=progress,
+    )
+    if not out["ok"]:
+        return None, None, None, False, out["message"], out
+    w = out["x"]
+    port_ret = float(np.dot(returns, w))
+    port_vol = float(np.sqrt(w @ as_cov(cov).matvec(w)))
+    return w, port_ret, port_vol, out["optimal"], out["message"], out
 
-    def obj(w):
-        return 0.5 * np.dot(w, cov).dot(w) - lam * np.dot(returns, w)
 
-    cons = []
-    # Budget 1 if gross<=1 else unconstrained budget
-    if gross_leq_1:
-        cons.append({"type": "eq", "fun": lambda w: np.sum(w) - 1.0})
-    # Target return
-    if target is not None:
-        cons.append({"type": "ineq", "fun": lambda w: np.dot(returns, w) - target})
+def _parse_constraint(constraint: str, n: int):
+    """UI constraint label -> (long_only, gross_leq_1, w_max, cardinality)."""
+    w_max = None
+    long_only = True
+    gross_leq_1 = True
+    cardinality = None
 
-    bounds = None
+    if constraint == "Long-only":
+        long_only = True
+    elif constraint == "Gross<=1":
+        long_only = True
+        gross_leq_1 = True
+    elif constraint == "Max weight 20%":
+        long_only = True
+        gross_leq_1 = True
+        w_max = 0.20
+    elif constraint.startswith("Cardinality"):
+        # Expect "Cardinality=k"
+        try:
+            cardinality = int(constraint.split("=")[1])
+        except Exception:
+            cardinality = max(1, int(np.sqrt(n)))
+        if cardinality < 1:
+            raise ValueError(f"{constraint}: cardinality must be at least 1")
+        # Picking more names than the universe has means picking all of them
+        cardinality = min(cardinality, n)
+    return long_only, gross_leq_1, w_max, cardinality
+
+
+def _bounds(long_only, gross_leq_1, w_max):
     if long_only or w_max is not None:
         lo = 0.0 if long_only else -1.0
         hi = w_max if w_max is not None else (1.0 if gross_leq_1 else 10.0)
-        bounds = [(lo, hi)] * n
-
-    w0 = np.ones(n) / n
-    res = minimize(
-        obj,
-        w0,
-        bounds=bounds,
-        constraints=cons,
-        method="SLSQP",
-        options={"maxiter": 500},
-    )
-    w = res.x
-    # Normalize if needed
-    s = w.sum()
-    if s != 0:
-        w = w / s
+        return lo, hi
+    return -np.inf, np.inf
+
+
+def _efficient_frontier(
+    returns,
+    cov,
+    points: int = 20,
+    sweep: str = "target",
+    risk_aversions=None,
+    long_only=True,
+    gross_leq_1=True,
+    w_max: float = None,
+    groups=(),
+    progress=None,
+):
+    """
+    Sweep target returns (min-variance -> max-return) or risk-aversion values with
+    one covariance factorization, warm-starting every solve from the previous one.
+    Returns a list of frontier points ordered by increasing expected return.
+    """
+    n = len(returns)
+    P = as_cov(cov)
+    budget = 1.0 if gross_leq_1 else None
+    lo, hi = _bounds(long_only, gross_leq_1, w_max)
+    common = dict(lo=lo, hi=hi, budget=budget, groups=groups)
+
+    if sweep == "riskAversion":
+        lams = (
+            sorted(float(x) for x in risk_aversions)
+            if risk_aversions
+            else np.concatenate([[0.0], np.geomspace(1e-3, 10.0, points - 1)])
+        )
+        solves, warm = [], None
+        for lam in lams:
+            warm = mean_variance(P, returns, lam=float(lam), warm=warm, **common)
+            solves.append(("riskAversion", float(lam), warm.x, warm.ok, warm.iters))
+            if progress is not None:
+                progress(len(solves), len(lams), unit="frontier points")
+    else:
+        if budget is None:
+            raise ValueError("EfficientFrontier target sweep requires a budget constraint")
+        minvar = mean_variance(P, returns, lam=0.0, **common)
+        lo_ret = float(returns @ minvar.x)
+        w_top = max_return_weights(returns, np.full(n, lo), np.full(n, hi), budget)
+        hi_ret = float(returns @ w_top)
+        targets = np.linspace(lo_ret, hi_ret, max(points, 2))
+        solves, warm = [("target", lo_ret, minvar.x, minvar.ok, minvar.iters)], None
+        # Without group limits the top end is the greedy max-return portfolio;
+        # as a QP its feasible set collapses to a point and ADMM crawls.
+        inner = targets[1:-1] if not groups else targets[1:]
+        for tgt in inner:
+            warm = mean_variance(P, returns, target=float(tgt), warm=warm, **common)
+            solves.append(("target", float(tgt), warm.x, warm.ok, warm.iters))
+            if progress is not None:
+                progress(len(solves), len(targets), unit="frontier points")
+        if not groups:
+            solves.append(("target", hi_ret, w_top, True, 0))
+
+    frontier = []
+    for key, val, w, ok, iters in solves:
+        pret = float(returns @ w)
+        pvol = float(np.sqrt(w @ P.matvec(w)))
+        frontier.append(
+            {
+                key: val,
+                "expectedReturn": pret,
+                "volatility": pvol,
+                "sharpe": (pret / pvol if pvol > 0 else None),
+                "weights": w.tolist(),
+                "ok": ok,
+                "iterations": iters,
+            }
+        )
+    frontier.sort(key=lambda p: p["expectedReturn"])
+    return frontier
+
+
+def _selection(cov, returns, x):
+    """Equal weights over the selected assets."""
+    w = x / (x.sum() if x.sum() > 0 else 1.0)
     port_ret = float(np.dot(returns, w))
     port_vol = float(np.sqrt(np.dot(w, cov).dot(w)))
-    return w, port_ret, port_vol, res.success, res.message
+    return w, port_ret, port_vol
+
+
+def _qubo_optimize(cov, returns, cardinality=None, gamma=0.5, solver="auto", cancel=None):
+    """
+    Binary selection (x_i in {0,1}) of k assets minimizing x^T cov x - gamma * returns^T x,
+    solved classically (exact enumeration, annealing, tabu). Equal weights 1/k.
+    """
+    n = len(returns)
+    if cardinality is None:
+        cardinality = max(1, int(np.sqrt(n)))
+    Q, c, _ = cardinality_qubo(cov, returns, cardinality, gamma)
+    r = solve_qubo(Q, c, cardinality, method=solver, cancel=cancel)
+    w, port_ret, port_vol = _selection(cov, returns, r["x"])
+    msg = f"QUBO {r['method']} ok ({r['evaluated']} states evaluated)"
+    return w, port_ret, port_vol, True, msg, r["method"]
 
 
 def _qaoa_optimize(cov, returns, cardinality=None, gamma=0.5, shots=2048, reps=2):
     """
-    Binary selection (x_i in {0,1}) to choose k assets minimizing: x^T cov x - gamma * returns^T x
-    Constraint sum(x)=k enforced via penalty.
-    We map to QUBO and solve with QAOA (Aer simulator). Equal weights 1/k for selected.
+    Same QUBO as _qubo_optimize, solved with QAOA on the Aer simulator. Samples
+    that miss the cardinality are repaired with tabu search from the sampled set.
     """
     try:
         from qiskit_optimization import QuadraticProgram
         from qiskit_optimization.algorithms import MinimumEigenOptimizer
-        from qiskit.primitives import Estimator
         from qiskit.algorithms.minimum_eigensolvers import QAOA
         from qiskit_aer.primitives import Estimator as AerEstimator
 
         n = len(returns)
         if cardinality is None:
             cardinality = max(1, int(np.sqrt(n)))
+        Q, c, const = cardinality_qubo(cov, returns, cardinality, gamma)
 
         QP = QuadraticProgram()
         for i in range(n):
             QP.binary_var(name=f"x{i}")
-
-        # Build QUBO: x^T cov x - gamma * returns^T x + penalty*(sum x - k)^2
-        P = 10.0  # penalty
-        lin = {
-            f"x{i}": float(-gamma * returns[i] - 2 * P * cardinality) for i in range(n)
-        }
-        quad = {}
-        for i in range(n):
-            for j in range(n):
-                val = float(cov[i, j] + (P if i == j else 2 * P))
-                if val != 0.0:
-                    quad[(f"x{i}", f"x{j}")] = quad.get((f"x{i}", f"x{j}"), 0.0) + val
-        QP.minimize(linear=lin, quadratic=quad)
+        QP.minimize(constant=const, linear=c, quadratic=Q)
 
         estimator = AerEstimator()  # local simulator
         qaoa = QAOA(estimator=estimator, reps=reps)
         solver = MinimumEigenOptimizer(qaoa)
         res = solver.solve(QP)
         x = np.array([res.variables_dict[f"x{i}"] for i in range(n)], dtype=float)
-        k = int(x.sum()) if x.sum() > 0 else 1
-        w = x / (x.sum() if x.sum() > 0 else 1.0)
-        # If cardinality not met (sim artifacts), project to top-k by score
-        if k != cardinality:
-            score = -gamma * returns + np.diag(cov)  # crude heuristic
-            idx = np.argsort(score)[:cardinality]
-            w = np.zeros(n)
-            w[idx] = 1.0 / cardinality
-
-        port_ret = float(np.dot(returns, w))
-        port_vol = float(np.sqrt(np.dot(w, cov).dot(w)))
-        return w, port_ret, port_vol, True, "QAOA ok"
+        msg = "QAOA ok"
+        if int(round(x.sum())) != cardinality:
+            # Keep the sampled names first, fill/trim by linear score, then improve
+            order = np.lexsort((c, -x))
+            x0 = np.zeros(n)
+            x0[order[:cardinality]] = 1.0
+            x = tabu_search(Q, c, cardinality, x0=x0)["x"]
+            msg = (
+                f"QAOA sample had {int(res.x.sum())} names; "
+                f"repaired to {cardinality} with tabu search"
+            )
+
+        w, port_ret, port_vol = _selection(cov, returns, x)
+        return w, port_ret, port_vol, True, msg
     except Exception as e:
         return None, None, None, False, f"QAOA failed: {e}"
 
 
 @celery_app.task(name="optimization.run_optimization_job")
 def run_optimization_job(job_id: str, algo: str, params: dict):
-    set_job_status(job_id, "Running")
+    if not set_job_status(job_id, "Running"):
+        return  # cancelled (or already finished) before it started
+    progress = ProgressReporter(job_id)
     try:
         portfolio_id = params.get("portfolioId") or params.get(
             "portfolio_id"
@@ -161,38 +309,61 @@ def run_optimization_job(job_id: str, algo: str, params: dict):
         tickers = [a["ticker"] for a in _get_portfolio_assets(portfolio_id)]
         if not tickers:
             raise ValueError("No assets in portfolio")
-        hist = _fetch_history(tickers, period=params.get("period", "3y"))
-        rets = hist.pct_change().dropna()
-        mu = rets.mean().values * 252.0
-        Sigma = rets.cov().values * 252.0
+        risk_model = params.get("riskModel") or (
+            "factor" if len(tickers) >= FACTOR_AUTO_ASSETS else "covariance"
+        )
+        if risk_model == "factor":
+            # Sigma stays in factored form (optim.factor.FactorCov)
+            mu, Sigma, stats = universe_factor_model(
+                tickers,
+                period=params.get("period", "3y"),
+                freq=params.get("frequency", "1d"),
+                factors=params.get("factors"),
+                k=int(params.get("numFactors", 5)),
+            )
+        else:
+            mu, Sigma, stats = universe_stats(
+                tickers,
+                period=params.get("period", "3y"),
+                freq=params.get("frequency", "1d"),
+                estimator=params.get("estimator"),
+            )
 
         constraint = str(params.get("constraint", "None"))
         target = params.get("target", None)
         target = float(target) if (target is not None and str(target) != "") else None
-        w_max = None
-        long_only = True
-        gross_leq_1 = True
-        cardinality = None
-
-        if constraint == "Long-only":
-            long_only = True
-        elif constraint == "Gross<=1":
-            long_only = True
-            gross_leq_1 = True
-        elif constraint == "Max weight 20%":
-            long_only = True
-            gross_leq_1 = True
-            w_max = 0.20
-        elif constraint.startswith("Cardinality"):
-            # Expect "Cardinality=k"
-            try:
-                cardinality = int(constraint.split("=")[1])
-            except Exception:
-                cardinality = max(1, int(np.sqrt(len(mu))))
+        long_only, gross_leq_1, w_max, cardinality = _parse_constraint(constraint, len(mu))
 
         res = {}
 
-        if algo == "MeanVariance":
+        if algo == "MeanVariance" and cardinality is not None:
+            w, pret, pvol, ok, msg, search = _card_optimize(
+                mu,
+                Sigma,
+                cardinality,
+                target=target,
+                long_only=long_only,
+                gross_leq_1=gross_leq_1,
+                w_max=w_max,
+                groups=_parse_groups(params.get("groups"), tickers),
+                progress=progress,
+            )
+            if w is None:
+                raise RuntimeError(msg)
+            res = {
+                "weights": w.tolist(),
+                "tickers": tickers,
+                "expectedReturn": pret,
+                "volatility": pvol,
+                "sharpe": (pret / pvol if pvol > 0 else None),
+                "ok": ok,
+                "message": msg,
+                "cardinality": cardinality,
+                "nodes": search["nodes"],
+                "gap": search["gap"],
+            }
+
+        elif algo == "MeanVariance":
             w, pret, pvol, ok, msg = _mv_optimize(
                 mu,
                 Sigma,
@@ -200,6 +371,7 @@ def run_optimization_job(job_id: str, algo: str, params: dict):
                 long_only=long_only,
                 gross_leq_1=gross_leq_1,
                 w_max=w_max,
+                groups=_parse_groups(params.get("groups"), tickers),
             )
             res = {
                 "weights": w.tolist(),
@@ -211,8 +383,48 @@ def run_optimization_job(job_id: str, algo: str, params: dict):
                 "message": msg,
             }
 
+        elif algo == "EfficientFrontier":
+            points = min(max(int(params.get("points", 20)), 2), 200)
+            frontier = _efficient_frontier(
+                mu,
+                Sigma,
+                points=points,
+                sweep=str(params.get("sweep", "target")),
+                risk_aversions=params.get("riskAversions"),
+                long_only=long_only,
+                gross_leq_1=gross_leq_1,
+                w_max=w_max,
+                groups=_parse_groups(params.get("groups"), tickers),
+                progress=progress,
+            )
+            # Headline numbers are the max-Sharpe point on the curve
+            best = max(frontier, key=lambda p: p["sharpe"] or float("-inf"))
+            ok = all(p["ok"] for p in frontier)
+            res = {
+                "weights": best["weights"],
+                "tickers": tickers,
+                "expectedReturn": best["expectedReturn"],
+                "volatility": best["volatility"],
+                "sharpe": best["sharpe"],
+                "frontier": frontier,
+                "ok": ok,
+                "message": f"{len(frontier)} frontier points"
+                + ("" if ok else " (some solves inaccurate)"),
+            }
+
         elif algo in ("QAOA", "QUBO"):
-            w, pret, pvol, ok, msg = _qaoa_optimize(Sigma, mu, cardinality=cardinality)
+            dense = Sigma.dense() if hasattr(Sigma, "dense") else Sigma
+            if algo == "QAOA":
+                w, pret, pvol, ok, msg = _qaoa_optimize(dense, mu, cardinality=cardinality)
+                solver = "qaoa"
+            else:
+                w, pret, pvol, ok, msg, solver = _qubo_optimize(
+                    dense,
+                    mu,
+                    cardinality=cardinality,
+                    solver=params.get("solver", "auto"),
+                    cancel=progress.check,
+                )
             if w is None:
                 raise RuntimeError(msg)
             res = {
@@ -223,12 +435,18 @@ def run_optimization_job(job_id: str, algo: str, params: dict):
                 "sharpe": (pret / pvol if pvol > 0 else None),
                 "ok": ok,
                 "message": msg,
-                "cardinality": cardinality,
+                "cardinality": cardinality or max(1, int(np.sqrt(len(mu)))),
+                "solver": solver,
             }
 
         else:
             raise ValueError(f"Unknown algo {algo}")
 
+        if hasattr(Sigma, "risk_split") and res.get("weights") is not None:
+            fvar, svar = Sigma.risk_split(np.asarray(res["weights"]))
+            res["factorVolatility"] = float(np.sqrt(fvar))
+            res["specificVolatility"] = float(np.sqrt(svar))
+
         set_job_status(
             job_id,
             "Succeeded",
@@ -239,11 +457,17 @@ def run_optimization_job(job_id: str, algo: str, params: dict):
                 "insights": {
                     "Assets": len(tickers),
                     "Period": params.get("period", "3y"),
+                    "Estimator": stats.get("factorModel", stats["estimator"]),
+                    "Shrinkage": stats.get("shrinkage"),
                     "Ok": res.get("ok", True),
                     "Message": res.get("message", ""),
                 },
                 **res,
             },
         )
+    except JobCancelled:
+        cancel_job(job_id, result={"partial": progress.payload})
     except Exception as e:
         set_job_status(job_id, "Failed", error=str(e))
+    finally:
+        progress.close()
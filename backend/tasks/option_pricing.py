@@ -1,15 +1,20 @@
 # backend/tasks/option_pricing.py
 from . import celery_app
-from celery import shared_task
 from models.jobs import set_job_status
-from storage.paths import save_paths_npz
-from utils.finance_cache import cache_json
+from models.progress import JobCancelled, ProgressReporter
+from .dispatch import cancel_job
+from storage.paths import save_paths_npz_meta
 from utils.sanitize import normalize_ticker
+from storage.history import load_close
+from services.market_data import get_chain_table, get_spot, prefetch
 import numpy as np
 from math import log, sqrt, exp
 from datetime import datetime, timezone
 from scipy.stats import norm
-import yfinance as yf
+import os
+
+# Paths simulated per chunk by the Monte Carlo engines (memory ~ chunk x steps)
+MC_CHUNK = int(os.getenv("MC_CHUNK", "10000"))
 
 
 def _utcnow():
@@ -94,6 +99,38 @@ def european_mc_paths(S0, T, r, q, sigma, paths=10000, steps=252, otype="CALL"):
     return X, ST, payoff0
 
 
+def _mc_chunked(S0, T, r, q, sigma, paths, steps, payoff, progress=None):
+    """
+    Discounted mean and standard error of payoff(S) over `paths` GBM paths,
+    simulated MC_CHUNK paths at a time so memory stays O(chunk x steps).
+    payoff gets the (chunk, steps) price matrix after S0. After every chunk
+    progress(done, paths, unit="paths", price=..., stderr=...) is called; a
+    cancelled job's reporter raises there, between chunks.
+    """
+    if paths < 2 or steps < 1:
+        raise ValueError("num_paths must be at least 2 and num_steps at least 1")
+    dt = T / steps
+    mu = (r - q - 0.5 * sigma * sigma) * dt
+    sdt = sigma * np.sqrt(dt)
+    disc = exp(-r * T)
+    sy = syy = 0.0
+    done = 0
+    for lo in range(0, paths, MC_CHUNK):
+        c = min(MC_CHUNK, paths - lo)
+        S = S0 * np.exp(np.cumsum(mu + sdt * np.random.standard_normal((c, steps)), axis=1))
+        y = np.asarray(payoff(S), dtype=float)
+        sy += y.sum()
+        syy += y @ y
+        done += c
+        if progress is not None:
+            m = sy / done
+            var = max(syy / done - m * m, 0.0) * done / max(done - 1, 1)
+            progress(done, paths, unit="paths", price=float(disc * m), stderr=float(disc * np.sqrt(var / done)))
+    m = sy / paths
+    var = max(syy / paths - m * m, 0.0) * paths / (paths - 1)
+    return float(disc * m), float(disc * np.sqrt(var / paths))
+
+
 def european_mc_price(
     S0,
     K,
@@ -106,24 +143,25 @@ def european_mc_price(
     steps=252,
     save_paths=False,
     job_id=None,
+    progress=None,
 ):
-    X, ST, _ = european_mc_paths(
-        S0, T, r, q, sigma, paths=paths, steps=steps, otype=otype
-    )
-    payoff = np.maximum(ST - K, 0.0) if otype == "CALL" else np.maximum(K - ST, 0.0)
-    disc = exp(-r * T)
-    price = disc * payoff.mean()
-    stderr = disc * payoff.std(ddof=1) / np.sqrt(paths)
+    keep = save_paths and job_id
+    kept = []
+
+    def payoff(S):
+        if keep:
+            kept.append(S.astype(np.float32))
+        ST = S[:, -1]
+        return np.maximum(ST - K, 0.0) if otype == "CALL" else np.maximum(K - ST, 0.0)
+
+    price, stderr = _mc_chunked(S0, T, r, q, sigma, paths, steps, payoff, progress)
     paths_meta = None
-    if save_paths and job_id:
-        t = np.linspace(0.0, T, steps + 1, dtype=np.float32)
-        file_id = save_paths_npz(job_id, t, X)
-        paths_meta = {
-            "gridfs_id": file_id,
-            "n_paths": int(X.shape[0]),
-            "steps": int(X.shape[1]),
-        }
-    return float(price), float(stderr), paths_meta
+    if keep:
+        X = np.empty((paths, steps + 1), dtype=np.float32)
+        X[:, 0] = S0
+        X[:, 1:] = np.vstack(kept)
+        paths_meta = save_paths_npz_meta(job_id, X)
+    return price, stderr, paths_meta
 
 
 def american_binomial(S0, K, T, r, sigma, steps=200, otype="CALL", q=0.0):
@@ -143,24 +181,13 @@ def american_binomial(S0, K, T, r, sigma, steps=200, otype="CALL", q=0.0):
 
 
 def asian_arithmetic_mc(
-    S0, K, T, r, sigma, otype="CALL", q=0.0, paths=100000, steps=252
+    S0, K, T, r, sigma, otype="CALL", q=0.0, paths=100000, steps=252, progress=None
 ):
-    dt = T / steps
-    nudt = (r - q - 0.5 * sigma * sigma) * dt
-    sigsdt = sigma * np.sqrt(dt)
-    disc = exp(-r * T)
-    pay = np.empty(paths, dtype=float)
-    for i in range(paths):
-        S = S0
-        sumS = 0.0
-        for _ in range(steps):
-            S *= exp(nudt + sigsdt * np.random.normal())
-            sumS += S
-        A = sumS / steps
-        pay[i] = max(0.0, A - K) if otype == "CALL" else max(0.0, K - A)
-    price = disc * pay.mean()
-    stderr = disc * pay.std(ddof=1) / np.sqrt(paths)
-    return float(price), float(stderr)
+    def payoff(S):
+        A = S.mean(axis=1)
+        return np.maximum(A - K, 0.0) if otype == "CALL" else np.maximum(K - A, 0.0)
+
+    return _mc_chunked(S0, T, r, q, sigma, paths, steps, payoff, progress)
 
 
 def barrier_mc(
@@ -175,82 +202,46 @@ def barrier_mc(
     barrier_type="down-and-out",
     paths=100000,
     steps=252,
+    progress=None,
 ):
-    dt = T / steps
-    nudt = (r - q - 0.5 * sigma * sigma) * dt
-    sigsdt = sigma * np.sqrt(dt)
-    disc = exp(-r * T)
-    pay = np.empty(paths, dtype=float)
-    for i in range(paths):
-        S = S0
-        lo = S0
-        hi = S0
-        for _ in range(steps):
-            S *= exp(nudt + sigsdt * np.random.normal())
-            lo = min(lo, S)
-            hi = max(hi, S)
-        if "out" in barrier_type:
-            knocked = ("down" in barrier_type and lo <= barrier) or (
-                "up" in barrier_type and hi >= barrier
-            )
-            payoff = (
-                0.0
-                if knocked
-                else (max(0.0, S - K) if otype == "CALL" else max(0.0, K - S))
-            )
-        else:
-            knocked = ("down" in barrier_type and lo <= barrier) or (
-                "up" in barrier_type and hi >= barrier
-            )
-            payoff = (
-                (max(0.0, S - K) if otype == "CALL" else max(0.0, K - S))
-                if knocked
-                else 0.0
-            )
-        pay[i] = payoff
-    price = disc * pay.mean()
-    stderr = disc * pay.std(ddof=1) / np.sqrt(paths)
-    return float(price), float(stderr)
+    def payoff(S):
+        ST = S[:, -1]
+        vanilla = np.maximum(ST - K, 0.0) if otype == "CALL" else np.maximum(K - ST, 0.0)
+        knocked = np.zeros(len(S), dtype=bool)
+        if "down" in barrier_type:
+            knocked |= np.minimum(S.min(axis=1), S0) <= barrier
+        if "up" in barrier_type:
+            knocked |= np.maximum(S.max(axis=1), S0) >= barrier
+        hit = ~knocked if "out" in barrier_type else knocked
+        return np.where(hit, vanilla, 0.0)
+
+    return _mc_chunked(S0, T, r, q, sigma, paths, steps, payoff, progress)
 
 
 def _yf_price_and_vol_from_chain(ticker: str, expiry: str, strike: float, otype: str):
     tkr = normalize_ticker(ticker)
 
     # spot
-    def fetch_lookup():
-        t = yf.Ticker(tkr)
-        fi = t.fast_info or {}
-        px = fi.get("last_price") or fi.get("regularMarketPrice")
-        cur = fi.get("currency") or "USD"
-        return {"price": float(px) if px else None, "currency": cur}
-
-    look = cache_json(f"yf:lk:{tkr}", fetch_lookup)
-    S0 = look.get("price")
-
-    # option chain row
-    def fetch_chain():
-        t = yf.Ticker(tkr)
-        try:
-            ch = t.option_chain(expiry)
-        except Exception:
-            return {"impliedVol": 0.0, "lastPrice": 0.0, "empty": True}
-        df = ch.calls if otype == "CALL" else ch.puts
-        if df is None or df.empty:
-            return {"impliedVol": 0.0, "lastPrice": 0.0, "empty": True}
-        df = df.fillna(0)
-        idx = (df["strike"] - strike).abs().astype(float).sort_values().index[0]
-        row = df.loc[idx]
-        return {
-            "impliedVol": float(
-                row.get("impliedVolatility", 0) or row.get("impliedVol", 0) or 0
-            ),
-            "lastPrice": float(row.get("lastPrice", 0) or 0),
-            "empty": False,
-        }
+    S0 = get_spot(tkr)
+
+    # option chain row nearest the strike, from the cached columnar chain
+    try:
+        tbl = get_chain_table(tkr, expiry)["calls" if otype == "CALL" else "puts"]
+    except Exception:
+        tbl = None
+    if tbl is None or len(tbl["strike"]) == 0:
+        return tkr, S0, 0.0, True
+    i = int(np.argmin(np.abs(tbl["strike"] - strike)))
+    return tkr, S0, float(tbl["impliedVol"][i]), False
 
-    chain = cache_json(f"yf:chainrow:{tkr}:{expiry}:{otype}:{strike}", fetch_chain)
-    iv = chain.get("impliedVol") or 0.0
-    return tkr, S0, iv, bool(chain.get("empty", False))
+
+def _prefetch_legs(legs):
+    needs = [
+        (normalize_ticker(str(leg.get("ticker", ""))), str(leg.get("expiry", "")))
+        for leg in legs
+    ]
+    needs = [(t, e) for t, e in needs if t and e]
+    prefetch([t for t, _ in needs], needs, history=True)
 
 
 def _infer_T(expiry: str) -> float:
@@ -266,303 +257,12 @@ def _infer_T(expiry: str) -> float:
 
 @celery_app.task(name="option_pricing.run_option_job")
 def run_option_job(job_id: str, product: str, algo: str, params: dict):
-    set_job_status(job_id, "Running")
+    if not set_job_status(job_id, "Running"):
+        return  # cancelled (or already finished) before it started
+    progress = ProgressReporter(job_id)
     try:
-        # MULTI-LEG support: params.legs = [{ticker, expiry, strike, option_type, qty?, num_paths?, num_steps?}, ...]
-        legs = params.get("legs")
-        if legs and product in (None, "", "European"):
-            results = []
-            total_price = 0.0
-            total_qty = 0.0
-            for idx, leg in enumerate(legs):
-                otype = str(leg.get("option_type", "CALL")).upper()
-                tkr = normalize_ticker(str(leg.get("ticker", "")))
-                expiry = str(leg.get("expiry", ""))
-                strike = float(leg.get("strike"))
-                qty = float(leg.get("qty", 1.0))
-                if not tkr or not expiry or not strike:
-                    raise ValueError(f"Leg {idx+1}: ticker, expiry, strike required")
-                T = _infer_T(expiry)
-                r = float(params.get("r", 0.01))
-                q = float(params.get("q", 0.0))
-                tkr, S0, sigma, empty = _yf_price_and_vol_from_chain(
-                    tkr, expiry, strike, otype
-                )
-                if not S0:
-                    raise ValueError(
-                        f"{tkr}: no spot price from yfinance (symbol bad or market closed?)"
-                    )
-                if empty:
-                    raise ValueError(
-                        f"{tkr} {expiry}: empty option chain; try a different expiry"
-                    )
-                if sigma <= 0:
-                    # Fallback to 1y hist vol
-                    hist = (
-                        yf.Ticker(tkr)
-                        .history(period="1y")["Close"]
-                        .pct_change()
-                        .dropna()
-                    )
-                    if len(hist) == 0:
-                        raise ValueError(f"{tkr}: no historical data for IV fallback")
-                    sigma = float(hist.std() * np.sqrt(252))
-
-                steps = int(leg.get("num_steps", params.get("num_steps", 252)))
-                paths = int(leg.get("num_paths", params.get("num_paths", 50000)))
-                save_paths = str(params.get("save_paths", "false")).lower() in (
-                    "1",
-                    "true",
-                    "yes",
-                    "on",
-                )
-
-                if algo == "BlackScholes":
-                    price = black_scholes(
-                        float(S0), strike, T, r, float(sigma), otype, q
-                    )
-                    stderr = 0.0
-                    paths_meta = None
-                elif algo == "MonteCarlo":
-                    price, stderr, paths_meta = european_mc_price(
-                        float(S0),
-                        strike,
-                        T,
-                        r,
-                        float(sigma),
-                        otype,
-                        q,
-                        paths=paths,
-                        steps=steps,
-                        save_paths=save_paths and (idx == 0),
-                        job_id=job_id if (idx == 0) else None,
-                    )
-                else:
-                    price = None
-                    stderr = None
-                    paths_meta = None
-
-                results.append(
-                    {
-                        "leg": idx + 1,
-                        "ticker": tkr,
-                        "expiry": expiry,
-                        "strike": strike,
-                        "otype": otype,
-                        "qty": qty,
-                        "S0": S0,
-                        "sigma": sigma,
-                        "T": T,
-                        "algo": algo,
-                        "price": price,
-                        "stderr": stderr,
-                        "paths": paths_meta,
-                    }
-                )
-                if price is not None:
-                    total_price += price * qty
-                    total_qty += qty
-
-            set_job_status(
-                job_id,
-                "Succeeded",
-                result={
-                    "product": "European",
-                    "algo": algo,
-                    "legs": results,
-                    "totals": {
-                        "notional": total_price,
-                        "weightedAvg": (
-                            total_price / total_qty if total_qty > 0 else None
-                        ),
-                    },
-                },
-            )
-            return
-
-        # Single-instrument path (existing form)
-        otype = str(params.get("option_type", "CALL")).upper()
-        use_chain = str(params.get("use_chain", "false")).lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-
-        if product in (None, "", "European") and use_chain:
-            ticker = normalize_ticker(str(params.get("ticker", "")))
-            expiry = str(params.get("expiry", ""))
-            strike = float(params.get("strike"))
-            if not ticker or not expiry or not strike:
-                raise ValueError(
-                    "ticker, expiry and strike are required when use_chain=true"
-                )
-
-            T = _infer_T(expiry)
-            r = float(params.get("r", 0.01))
-            q = float(params.get("q", 0.0))
-            ticker, S0, sigma, empty = _yf_price_and_vol_from_chain(
-                ticker, expiry, strike, otype
-            )
-            if not S0:
-                raise ValueError(f"{ticker}: no spot price from yfinance")
-            if empty:
-                raise ValueError(f"{ticker} {expiry}: empty option chain")
-
-            steps = int(params.get("num_steps", 252))
-            paths = int(params.get("num_paths", 50000))
-            save_paths = str(params.get("save_paths", "false")).lower() in (
-                "1",
-                "true",
-                "yes",
-                "on",
-            )
-
-            res = {
-                "source": "yfinance_chain",
-                "ticker": ticker,
-                "expiry": expiry,
-                "strike": strike,
-                "inferred": {"S0": S0, "T": T, "sigma": sigma, "r": r, "q": q},
-            }
-
-            if algo == "BlackScholes":
-                price = black_scholes(float(S0), strike, T, r, float(sigma), otype, q)
-                res.update({"price": price, "stderr": 0.0})
-            elif algo == "MonteCarlo":
-                price, stderr, paths_meta = european_mc_price(
-                    float(S0),
-                    strike,
-                    T,
-                    r,
-                    float(sigma),
-                    otype,
-                    q,
-                    paths=paths,
-                    steps=steps,
-                    save_paths=save_paths,
-                    job_id=job_id,
-                )
-                res.update({"price": price, "stderr": stderr})
-                if paths_meta:
-                    res["paths"] = paths_meta
-            else:
-                res.update({"price": None, "stderr": None, "note": "QAE placeholder"})
-
-            res["product"] = product
-            res["algo"] = algo
-            set_job_status(job_id, "Succeeded", result=res)
-            return
-        # --- European historical (no option-chain), single instrument ---
-        if product in (None, "", "European") and str(
-            params.get("use_chain", "false")
-        ).lower() in ("0", "false", "no", "off"):
-            from utils.sanitize import normalize_ticker
-            import yfinance as yf
-            from datetime import datetime, timezone
-
-            otype = str(params.get("option_type", "CALL")).upper()
-            ticker = normalize_ticker(str(params.get("ticker", "")))
-            K = float(params.get("strike"))
-            r = float(params.get("r", 0.01))
-            q = float(params.get("q", 0.0))
-            algo = algo  # keep
-
-            # Get S0
-            tkr = yf.Ticker(ticker)
-            fi = tkr.fast_info or {}
-            S0 = fi.get("last_price") or fi.get("regularMarketPrice")
-            if not S0:
-                hist = tkr.history(period="5d")["Close"].dropna()
-                if hist.empty:
-                    raise ValueError(f"{ticker}: no recent price for S0")
-                S0 = float(hist.iloc[-1])
-
-            # T from expiry or T
-            if "expiry" in params and params["expiry"]:
-                dt = datetime.fromisoformat(params["expiry"]).replace(
-                    tzinfo=timezone.utc
-                )
-                T = max(1e-6, (dt - datetime.now(timezone.utc)).days / 365.0)
-            else:
-                T = float(params.get("T", 0.5))
-
-            # sigma: provided or estimate from 1y hist
-            if "sigma" in params and params["sigma"] not in (None, ""):
-                sigma = float(params["sigma"])
-            else:
-                hist = tkr.history(period="1y")["Close"].pct_change().dropna()
-                if len(hist) == 0:
-                    raise ValueError(f"{ticker}: no historical data for sigma")
-                sigma = float(hist.std() * np.sqrt(252))
-
-            steps = int(params.get("num_steps", 252))
-            paths = int(params.get("num_paths", 50000))
-            save_paths = str(params.get("save_paths", "false")).lower() in (
-                "1",
-                "true",
-                "yes",
-                "on",
-            )
-
-            if algo == "BlackScholes":
-                price = black_scholes(float(S0), K, T, r, float(sigma), otype, q)
-                res = {
-                    "source": "historical",
-                    "ticker": ticker,
-                    "inferred": {"S0": S0, "T": T, "sigma": sigma, "r": r, "q": q},
-                    "price": float(price),
-                    "stderr": 0.0,
-                    "product": "European",
-                    "algo": algo,
-                }
-            elif algo == "MonteCarlo":
-                price, stderr, paths_meta = european_mc_price(
-                    float(S0),
-                    K,
-                    T,
-                    r,
-                    float(sigma),
-                    otype,
-                    q,
-                    paths=paths,
-                    steps=steps,
-                    save_paths=save_paths,
-                    job_id=job_id,
-                )
-                res = {
-                    "source": "historical",
-                    "ticker": ticker,
-                    "inferred": {"S0": S0, "T": T, "sigma": sigma, "r": r, "q": q},
-                    "price": float(price),
-                    "stderr": float(stderr),
-                    "paths": paths_meta,
-                    "product": "European",
-                    "algo": algo,
-                }
-            else:
-                res = {"note": "QAE placeholder", "product": "European", "algo": algo}
-
-            set_job_status(job_id, "Succeeded", result=res)
-            return
-
-        # ... keep your existing non-chain branches (American/Asian/Barrier etc.) ...
-        raise ValueError("Unsupported combination or missing parameters.")
-
-    except Exception as e:
-        set_job_status(job_id, "Failed", error=str(e))
-
-
-# --- QAE wrapper ---
-from quantum.qae_pricer import qae_price, Market as QMarket
-
-
-@shared_task(bind=True, name="option_pricing.run_option_job")
-def run_option_job(self, job_id: str, params: dict):
-    set_job_status(job_id, "Running")
-    try:
-        product = params.get("product") or "European"
-        algo = params.get("algo") or "BlackScholes"
+        product = product or params.get("product") or "European"
+        algo = algo or params.get("algo") or "BlackScholes"
 
         # --- European historical (single) or chain (multi) ---
         if product == "European":
@@ -579,9 +279,11 @@ def run_option_job(self, job_id: str, params: dict):
 
             if use_chain and "legs" in params:
                 # Multi-leg from option chain — for each leg we compute S0, IV or hist sigma fallback, T and price
+                _prefetch_legs(params["legs"])
                 out_legs = []
                 notionals = []
                 prices = []
+                n_legs = len(params["legs"])
                 for idx, leg in enumerate(params["legs"]):
                     tkr = normalize_ticker(leg.get("ticker", ""))
                     expiry = leg.get("expiry", "")
@@ -593,11 +295,9 @@ def run_option_job(self, job_id: str, params: dict):
                         else "PUT"
                     )
                     # spot
-                    tk = yf.Ticker(tkr)
-                    fi = tk.fast_info or {}
-                    S0 = fi.get("last_price") or fi.get("regularMarketPrice")
+                    S0 = get_spot(tkr)
                     if not S0:
-                        hist = tk.history(period="5d")["Close"].dropna()
+                        hist = load_close(tkr, "1mo")
                         if hist.empty:
                             raise ValueError(f"{tkr}: no recent price")
                         S0 = float(hist.iloc[-1])
@@ -615,20 +315,16 @@ def run_option_job(self, job_id: str, params: dict):
                     # sigma (try chain mid IV; fallback hist)
                     sigma = None
                     try:
-                        ch = tk.option_chain(expiry)
-                        tbl = ch.calls if otype == "CALL" else ch.puts
-                        row = (
-                            tbl.loc[(tbl["strike"] - K).abs().idxmin()]
-                            if not tbl.empty
-                            else None
-                        )
-                        if row is not None and "impliedVolatility" in row:
-                            iv = float(row["impliedVolatility"])
-                            sigma = max(1e-6, iv)
+                        tbl = get_chain_table(tkr, expiry)[
+                            "calls" if otype == "CALL" else "puts"
+                        ]
+                        if len(tbl["strike"]):
+                            i = int(np.argmin(np.abs(tbl["strike"] - K)))
+                            sigma = max(1e-6, float(tbl["impliedVol"][i]))
                     except Exception:
                         pass
                     if sigma is None:
-                        ret = tk.history(period="1y")["Close"].pct_change().dropna()
+                        ret = load_close(tkr, "1y").pct_change().dropna()
                         if ret.empty:
                             raise ValueError(f"{tkr}: cannot infer sigma")
                         sigma = float(ret.std() * np.sqrt(252))
@@ -659,6 +355,10 @@ def run_option_job(self, job_id: str, params: dict):
                             "yes",
                             "on",
                         )
+                        def leg_progress(done, total, **fields):
+                            # Paths across all legs, so the fraction covers the whole job
+                            progress(idx * total + done, n_legs * total, leg=idx + 1, **fields)
+
                         price, stderr, paths_meta = european_mc_price(
                             S0,
                             K,
@@ -671,6 +371,7 @@ def run_option_job(self, job_id: str, params: dict):
                             steps,
                             save_paths,
                             (job_id if idx == 0 else None),
+                            progress=leg_progress,
                         )
                         leg_res = {
                             "leg": idx + 1,
@@ -688,6 +389,8 @@ def run_option_job(self, job_id: str, params: dict):
                         if paths_meta and idx == 0:
                             leg_res["paths"] = paths_meta
                     else:  # QAE
+                        from quantum.qae_pricer import qae_price, Market as QMarket
+
                         m = QMarket(
                             S0=float(S0), r=r, sigma=float(sigma), T=float(T), q=q
                         )
@@ -697,6 +400,7 @@ def run_option_job(self, job_id: str, params: dict):
                             otype,
                             num_qubits=int(params.get("qubits", 8)),
                             sampler=str(params.get("sampler", "terra")),
+                            cancel=progress.check,
                         )
                         price = float(prices[K])
                         stderr = 0.0
@@ -720,6 +424,8 @@ def run_option_job(self, job_id: str, params: dict):
                     out_legs.append(leg_res)
                     notionals.append(qty * price)
                     prices.append(price)
+                    if algo != "MonteCarlo":
+                        progress(idx + 1, n_legs, unit="legs", notional=float(sum(notionals)))
 
                 totals = {
                     "notional": float(sum(notionals)),
@@ -745,11 +451,9 @@ def run_option_job(self, job_id: str, params: dict):
                     if str(params.get("option_type", "CALL")).upper().startswith("C")
                     else "PUT"
                 )
-                tk = yf.Ticker(tkr)
-                fi = tk.fast_info or {}
-                S0 = fi.get("last_price") or fi.get("regularMarketPrice")
+                S0 = get_spot(tkr)
                 if not S0:
-                    hist = tk.history(period="5d")["Close"].dropna()
+                    hist = load_close(tkr, "1mo")
                     if hist.empty:
                         raise ValueError(f"{tkr}: no recent price")
                     S0 = float(hist.iloc[-1])
@@ -772,7 +476,7 @@ def run_option_job(self, job_id: str, params: dict):
                 if params.get("sigma") not in (None, ""):
                     sigma = float(params["sigma"])
                 else:
-                    ret = tk.history(period="1y")["Close"].pct_change().dropna()
+                    ret = load_close(tkr, "1y").pct_change().dropna()
                     if ret.empty:
                         raise ValueError(f"{tkr}: cannot infer sigma")
                     sigma = float(ret.std() * np.sqrt(252))
@@ -800,7 +504,8 @@ def run_option_job(self, job_id: str, params: dict):
                         "on",
                     )
                     price, stderr, paths_meta = european_mc_price(
-                        S0, K, T, r, sigma, otype, q, paths, steps, save_paths, job_id
+                        S0, K, T, r, sigma, otype, q, paths, steps, save_paths, job_id,
+                        progress=progress,
                     )
                     # expected payoff (undiscounted) ~ price * exp(rT)
                     expected_payoff = float(price * np.exp(r * T))
@@ -816,6 +521,8 @@ def run_option_job(self, job_id: str, params: dict):
                         "paths": paths_meta,
                     }
                 else:  # QAE
+                    from quantum.qae_pricer import qae_price, Market as QMarket
+
                     m = QMarket(S0=float(S0), r=r, sigma=float(sigma), T=float(T), q=q)
                     prices = qae_price(
                         m,
@@ -823,6 +530,7 @@ def run_option_job(self, job_id: str, params: dict):
                         otype,
                         num_qubits=int(params.get("qubits", 8)),
                         sampler=str(params.get("sampler", "terra")),
+                        cancel=progress.check,
                     )
                     price = float(prices[K])
                     res = {
@@ -844,5 +552,9 @@ def run_option_job(self, job_id: str, params: dict):
 
         raise ValueError("Unsupported product or parameters")
 
+    except JobCancelled:
+        cancel_job(job_id, result={"partial": progress.payload})
     except Exception as e:
         set_job_status(job_id, "Failed", error=str(e))
+    finally:
+        progress.close()
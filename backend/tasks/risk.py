@@ -0,0 +1,334 @@
+# backend/tasks/risk.py
+"""
+Monte Carlo VaR / CVaR for a portfolio's holdings and option legs.
+
+Log returns of the underlyings over the horizon are drawn from N(m, Σ·h)
+(Cholesky of the estimated covariance, or factor loadings plus specific noise
+for the factor risk model). Stocks revalue linearly; option legs are fully
+repriced with pricing.vector.bs_price at the shocked spot and the shortened
+expiry. Scenarios run in fixed-size chunks on a thread pool (NumPy releases
+the GIL), each chunk with its own seed so it can be regenerated exactly:
+
+  pass 1  portfolio P&L for every scenario (N floats) -> VaR / CVaR
+  pass 2  per-position P&L only for the tail rows of each chunk -> Euler
+          component CVaR (tail mean) and component VaR (mean of a small
+          band of scenarios around the VaR quantile)
+
+Memory is O(N + chunk x positions) regardless of book size.
+"""
+import itertools, os, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import numpy as np
+from . import celery_app
+from models.jobs import set_job_status
+from models.db import db
+from models.progress import JobCancelled, ProgressReporter
+from .dispatch import cancel_job
+from pricing.legs import resolve_legs, spot_or_last
+from pricing.vector import bs_price
+from services.statistics import universe_factor_model, universe_stats
+from utils.sanitize import normalize_ticker
+from .optimization import FACTOR_AUTO_ASSETS
+
+RISK_CHUNK = int(os.getenv("RISK_CHUNK", "20000"))
+RISK_WORKERS = int(os.getenv("RISK_WORKERS", str(os.cpu_count() or 4)))
+RISK_MAX_SCENARIOS = int(os.getenv("RISK_MAX_SCENARIOS", "5000000"))
+# Scenarios on each side of the VaR quantile averaged for component VaR
+_BAND = 0.001
+_HIST_BINS = 50
+
+
+class Book:
+    """Positions as arrays: linear holdings first, then option legs."""
+
+    def __init__(self, tickers: List[str], S0: np.ndarray, r: float = 0.01, q: float = 0.0):
+        self.tickers = tickers  # simulated underlyings
+        self.S0 = S0
+        self.r, self.q = r, q
+        self.names: List[str] = []
+        self.kinds: List[str] = []
+        self.lin_u = np.zeros(0, dtype=np.int64)  # underlying index per holding
+        self.lin_qty = np.zeros(0)
+        self.opt_u = np.zeros(0, dtype=np.int64)
+        self.opt = None  # resolve_legs() arrays
+
+    @property
+    def units(self) -> np.ndarray:
+        opt = self.opt["qty"] * self.opt["multiplier"] if self.opt else np.zeros(0)
+        return np.concatenate([self.lin_qty, opt])
+
+    def values(self) -> np.ndarray:
+        lin = self.lin_qty * self.S0[self.lin_u]
+        if not self.opt:
+            return lin
+        o = self.opt
+        self.V0 = bs_price(o["S0"], o["K"], o["T"], self.r, o["sigma"], o["is_call"], self.q)
+        return np.concatenate([lin, self.V0 * o["qty"] * o["multiplier"]])
+
+    def pnl(self, G: np.ndarray, h_years: float) -> np.ndarray:
+        """(c, positions) P&L for gross returns G (c, underlyings)."""
+        lin = (G[:, self.lin_u] - 1.0) * (self.lin_qty * self.S0[self.lin_u])
+        if not self.opt:
+            return lin
+        o = self.opt
+        S = o["S0"] * G[:, self.opt_u]
+        V = bs_price(
+            S, o["K"], np.maximum(o["T"] - h_years, 0.0), self.r, o["sigma"],
+            o["is_call"], self.q,
+        )
+        return np.hstack([lin, (V - self.V0) * (o["qty"] * o["multiplier"])])
+
+
+def _shock_model(Sigma, mu, h_years, drift):
+    """(mean, loadings A, specific sd) with log returns = mean + A z + sd * e."""
+    m = (mu - 0.5 * _diag(Sigma)) * h_years if drift else -0.5 * _diag(Sigma) * h_years
+    if hasattr(Sigma, "B"):
+        F = (Sigma.F + Sigma.F.T) / 2.0
+        vals, vecs = np.linalg.eigh(F)
+        A = Sigma.B @ (vecs * np.sqrt(np.maximum(vals, 0.0))) * np.sqrt(h_years)
+        return m, A, np.sqrt(Sigma.d * h_years)
+    S = np.asarray(Sigma) * h_years
+    try:
+        A = np.linalg.cholesky(S + 1e-14 * np.eye(len(S)))
+    except np.linalg.LinAlgError:
+        vals, vecs = np.linalg.eigh(S)
+        A = vecs * np.sqrt(np.maximum(vals, 0.0))
+    return m, A, None
+
+
+def _diag(Sigma):
+    return Sigma.diag() if hasattr(Sigma, "diag") else np.diag(Sigma)
+
+
+def simulate(book: Book, Sigma, mu, params: dict, progress=None) -> dict:
+    """
+    `progress(done, total, **fields)` is called as pass-1 chunks finish, and
+    its check() before every chunk of either pass (see models.progress).
+    """
+    n_scen = int(params.get("scenarios", 100_000))
+    if not 1000 <= n_scen <= RISK_MAX_SCENARIOS:
+        raise ValueError(f"scenarios must be between 1000 and {RISK_MAX_SCENARIOS}")
+    levels = sorted({float(a) for a in (params.get("confidence") or [0.95, 0.99])})
+    if not all(0.5 <= a < 1.0 for a in levels):
+        raise ValueError("confidence levels must be in [0.5, 1)")
+    h_days = float(params.get("horizonDays", 1))
+    h_years = h_days / 252.0
+    drift = str(params.get("drift", "false")).lower() in ("1", "true", "yes", "on")
+    seed = params.get("seed")
+    seed = int(seed) if seed not in (None, "") else int(np.random.SeedSequence().entropy % (1 << 63))
+    chunk = max(1000, min(RISK_CHUNK, n_scen))
+    n_chunks = -(-n_scen // chunk)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    m, A, sd = _shock_model(Sigma, mu, h_years, drift)
+    value0 = book.values()
+    P = len(value0)
+
+    def rows(i):
+        return min(chunk, n_scen - i * chunk)
+
+    def draw(i):
+        rng = np.random.default_rng(seeds[i])
+        c = rows(i)
+        x = m + rng.standard_normal((c, A.shape[1])) @ A.T
+        if sd is not None:
+            x += rng.standard_normal((c, len(sd))) * sd
+        return np.exp(x)
+
+    t0 = time.perf_counter()
+    port = np.empty(n_scen)
+
+    finished = itertools.count(1)
+
+    def pass1(i):
+        if progress is not None:
+            progress.check()
+        pnl = book.pnl(draw(i), h_years)
+        port[i * chunk : i * chunk + rows(i)] = pnl.sum(axis=1)
+        if progress is not None:
+            progress(min(next(finished) * chunk, n_scen), n_scen, unit="scenarios")
+        return pnl.sum(axis=0), np.einsum("ij,ij->j", pnl, pnl)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(RISK_WORKERS, n_chunks))) as pool:
+        moments = list(pool.map(pass1, range(n_chunks)))
+    s1 = sum(mo[0] for mo in moments)
+    s2 = sum(mo[1] for mo in moments)
+
+    # Quantiles by rank: the k worst scenarios form the (1 - a) tail
+    order = np.sort(port)
+    band = max(10, int(_BAND * n_scen))
+    cuts = []
+    for a in levels:
+        k = max(1, int(np.ceil(n_scen * (1.0 - a))))
+        var = -order[k - 1]
+        cvar = -order[:k].mean()
+        lo_b = order[max(0, k - 1 - band)]
+        hi_b = order[min(n_scen - 1, k - 1 + band)]
+        cuts.append((a, k, var, cvar, order[k - 1], lo_b, hi_b))
+    need = max(c[6] for c in cuts)
+
+    def pass2(i):
+        if progress is not None:
+            progress.check()
+        sl = port[i * chunk : i * chunk + rows(i)]
+        sel = np.flatnonzero(sl <= need)
+        acc = np.zeros((len(cuts), 2, P))
+        cnt = np.zeros((len(cuts), 2))
+        if len(sel) == 0:
+            return acc, cnt
+        pnl = book.pnl(draw(i)[sel], h_years)
+        v = sl[sel]
+        for j, (_, _, _, _, thr, lo_b, hi_b) in enumerate(cuts):
+            tail = v <= thr
+            near = (v >= lo_b) & (v <= hi_b)
+            acc[j, 0] = pnl[tail].sum(axis=0)
+            acc[j, 1] = pnl[near].sum(axis=0)
+            cnt[j] = tail.sum(), near.sum()
+        return acc, cnt
+
+    with ThreadPoolExecutor(max_workers=max(1, min(RISK_WORKERS, n_chunks))) as pool:
+        parts = list(pool.map(pass2, range(n_chunks)))
+    acc = sum(p[0] for p in parts)
+    cnt = sum(p[1] for p in parts)
+
+    units = book.units
+    mean = s1 / n_scen
+    stdev = np.sqrt(np.maximum(s2 / n_scen - mean**2, 0.0))
+    positions = [
+        {"name": nm, "kind": kd, "units": float(u), "value": float(v),
+         "meanPnl": float(mu_), "stdev": float(sd_)}
+        for nm, kd, u, v, mu_, sd_ in zip(book.names, book.kinds, units, value0, mean, stdev)
+    ]
+    var_out, cvar_out = {}, {}
+    for j, (a, k, var, cvar, *_rest) in enumerate(cuts):
+        key = f"{a:g}"
+        var_out[key], cvar_out[key] = float(var), float(cvar)
+        comp_cvar = -acc[j, 0] / max(cnt[j, 0], 1.0)
+        comp_var = -acc[j, 1] / max(cnt[j, 1], 1.0)
+        # Rescale the band estimate so the components add up to VaR
+        total = comp_var.sum()
+        if abs(total) > 1e-12:
+            comp_var = comp_var * (var / total)
+        for p, cv, cc, u in zip(positions, comp_var, comp_cvar, units):
+            p.setdefault("componentVaR", {})[key] = float(cv)
+            p.setdefault("componentCVaR", {})[key] = float(cc)
+            p.setdefault("marginalVaR", {})[key] = float(cv / u) if u else None
+            p.setdefault("pctVaR", {})[key] = float(cv / var) if var else None
+
+    hist, edges = np.histogram(port, bins=_HIST_BINS)
+    return {
+        "scenarios": n_scen,
+        "horizonDays": h_days,
+        "confidence": levels,
+        "seed": seed,
+        "portfolioValue": float(value0.sum()),
+        "var": var_out,
+        "cvar": cvar_out,
+        "pnlMean": float(port.mean()),
+        "pnlStdev": float(port.std(ddof=1)),
+        "positions": positions,
+        "histogram": {"counts": hist.tolist(), "edges": edges.tolist()},
+        "chunks": n_chunks,
+        "elapsedSec": time.perf_counter() - t0,
+    }
+
+
+def build_book(assets: List[dict], legs: List[dict], r: float, q: float) -> Book:
+    """Holdings (non-option assets) and option legs (params legs + option assets)."""
+    legs = list(legs or [])
+    holdings = []
+    for a in assets:
+        qty = float(a.get("quantity") or 0)
+        if str(a.get("type", "")).lower() == "option":
+            if a.get("strike") and (a.get("expiry") or a.get("T") is not None):
+                legs.append(
+                    {**a, "qty": qty, "option_type": a.get("option_type") or a.get("optionType", "CALL")}
+                )
+            continue
+        tkr = normalize_ticker(str(a.get("ticker", "")))
+        if tkr and qty:
+            holdings.append((tkr, qty))
+    opt = resolve_legs(legs) if legs else None
+    tickers = list(dict.fromkeys([t for t, _ in holdings] + (opt["ticker"] if opt else [])))
+    if not tickers:
+        raise ValueError("Portfolio has no positions to simulate")
+    pos = {t: i for i, t in enumerate(tickers)}
+    # resolve_legs already has a spot (or the leg's own S0) for option underlyings
+    leg_spot = dict(zip(reversed(opt["ticker"]), reversed(opt["S0"]))) if opt else {}
+    S0 = np.array([leg_spot[t] if t in leg_spot else spot_or_last(t) for t in tickers])
+    book = Book(tickers, S0, r, q)
+    book.lin_u = np.array([pos[t] for t, _ in holdings], dtype=np.int64)
+    book.lin_qty = np.array([q_ for _, q_ in holdings], dtype=float)
+    book.names = [t for t, _ in holdings]
+    book.kinds = ["holding"] * len(holdings)
+    if opt:
+        book.opt = opt
+        book.opt_u = np.array([pos[t] for t in opt["ticker"]], dtype=np.int64)
+        # Options revalue off the same spot as the holdings
+        opt["S0"] = S0[book.opt_u]
+        book.names += [
+            f"{t} {e or f'{T:.2f}y'} {K:g}{'C' if c else 'P'}"
+            for t, e, T, K, c in zip(opt["ticker"], opt["expiry"], opt["T"], opt["K"], opt["is_call"])
+        ]
+        book.kinds += ["option"] * len(opt["ticker"])
+    return book
+
+
+@celery_app.task(name="risk.run_risk_job")
+def run_risk_job(job_id: str, algo: str, params: dict):
+    if not set_job_status(job_id, "Running"):
+        return  # cancelled (or already finished) before it started
+    progress = ProgressReporter(job_id)
+    try:
+        if algo != "MonteCarlo":
+            raise ValueError(f"Unknown risk algo {algo}; use MonteCarlo")
+        portfolio_id = params.get("portfolioId") or params.get("portfolio_id")
+        job_doc = db.jobs.find_one({"id": job_id}, {"_id": 0, "portfolioId": 1})
+        if not portfolio_id and job_doc:
+            portfolio_id = job_doc.get("portfolioId")
+        if not portfolio_id:
+            raise ValueError("portfolioId required")
+
+        assets = list(db.assets.find({"portfolioId": portfolio_id}, {"_id": 0}))
+        book = build_book(
+            assets, params.get("legs"), float(params.get("r", 0.01)), float(params.get("q", 0.0))
+        )
+        risk_model = params.get("riskModel") or (
+            "factor" if len(book.tickers) >= FACTOR_AUTO_ASSETS else "covariance"
+        )
+        if risk_model == "factor":
+            mu, Sigma, stats = universe_factor_model(
+                book.tickers, period=params.get("period", "3y"),
+                factors=params.get("factors"), k=int(params.get("numFactors", 5)),
+            )
+        else:
+            mu, Sigma, stats = universe_stats(
+                book.tickers, period=params.get("period", "3y"),
+                estimator=params.get("estimator"),
+            )
+        res = simulate(book, Sigma, mu, params, progress)
+        top = max(res["confidence"])
+        key = f"{top:g}"
+        set_job_status(
+            job_id,
+            "Succeeded",
+            result={
+                "algo": algo,
+                "riskModel": risk_model,
+                "insights": {
+                    "Positions": len(book.names),
+                    "Scenarios": res["scenarios"],
+                    "Horizon (days)": res["horizonDays"],
+                    "Estimator": stats.get("factorModel", stats["estimator"]),
+                    f"VaR {key}": res["var"][key],
+                    f"CVaR {key}": res["cvar"][key],
+                },
+                **res,
+            },
+        )
+    except JobCancelled:
+        cancel_job(job_id, result={"partial": progress.payload})
+    except Exception as e:
+        set_job_status(job_id, "Failed", error=str(e))
+    finally:
+        progress.close()
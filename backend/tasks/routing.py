@@ -0,0 +1,99 @@
+# backend/tasks/routing.py
+"""
+Queue and priority for a job, decided from its spec before it is enqueued.
+
+  light     analytic pricing, small Monte Carlo, single optimizations
+  heavy_mc  large Monte Carlo, lattices, backtests, branch-and-bound
+  quantum   circuit simulation (QAE, QAOA)
+
+Each queue gets its own worker pool (see README), so a long simulation never
+sits in front of a millisecond Black-Scholes request. Within a queue the
+job's priority field becomes the Celery message priority.
+"""
+import os
+from . import BROKER, celery_app
+from pricing.vector import BINOMIAL_STEPS
+
+QUEUE_LIGHT, QUEUE_HEAVY, QUEUE_QUANTUM = "light", "heavy_mc", "quantum"
+JOB_QUEUES = (QUEUE_LIGHT, QUEUE_HEAVY, QUEUE_QUANTUM)
+# Random draws (paths x steps x legs, scenarios x positions, ...) above which a job is heavy
+LIGHT_MAX_DRAWS = float(os.getenv("LIGHT_MAX_DRAWS", "5000000"))
+PRIORITIES = {"Low": 0, "Normal": 3, "High": 6, "Urgent": 9}
+# Redis serves priority 0 first, AMQP the highest number
+_LOW_FIRST = BROKER.startswith(("redis", "rediss", "sentinel"))
+
+
+def _num(params, key, default):
+    try:
+        return float(params.get(key) or default)
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def estimated_draws(job: dict) -> float:
+    """Rough size of the job's sampling / lattice work; 0 for analytic jobs."""
+    params = job.get("params") or {}
+    algo = job.get("algo")
+    legs = params.get("legs") if isinstance(params.get("legs"), list) else []
+    n_legs = max(len(legs), 1)
+    if job.get("type") == "OptionPricing":
+        if job.get("product") in ("Basket", "Spread", "Rainbow"):
+            tickers = params.get("tickers") or []
+            if isinstance(tickers, str):
+                tickers = tickers.split(",")
+            n = len(params.get("underlyings") or [t for t in tickers if str(t).strip()])
+            return _num(params, "num_paths", 200_000) * max(n, 2)
+        if algo == "MonteCarlo":
+            return _num(params, "num_paths", 50_000) * _num(params, "num_steps", 252) * n_legs
+        return 0.0
+    if job.get("type") == "PortfolioRisk":
+        return _num(params, "scenarios", 100_000) * (n_legs + 20)
+    if job.get("type") == "ScenarioGrid" and algo == "Binomial":
+        # Every grid point rolls back a lattice of ~steps²/2 nodes per leg
+        from .scenario import _DEFAULT_AXES  # lazy: tasks.scenario imports this module
+
+        grid = 1.0
+        for key in ("spotShifts", "volShifts", "days"):
+            spec = params.get(key) or _DEFAULT_AXES[key]
+            grid *= _num(spec, "steps", 11) if isinstance(spec, dict) else max(len(spec), 1)
+        steps = _num(params, "steps", BINOMIAL_STEPS)
+        return grid * n_legs * steps * (steps + 1) / 2.0
+    return 0.0
+
+
+def queue_for(job: dict) -> str:
+    algo = job.get("algo")
+    params = job.get("params") or {}
+    if algo in ("QAE", "QAOA"):
+        return QUEUE_QUANTUM
+    if job.get("type") == "Backtest":
+        return QUEUE_HEAVY
+    if job.get("type") == "PortfolioOptimization":
+        heavy = algo in ("QUBO", "EfficientFrontier") or str(params.get("constraint", "")).startswith(
+            "Cardinality"
+        )
+        return QUEUE_HEAVY if heavy else QUEUE_LIGHT
+    return QUEUE_HEAVY if estimated_draws(job) > LIGHT_MAX_DRAWS else QUEUE_LIGHT
+
+
+def priority_for(job: dict) -> int:
+    p = PRIORITIES.get(job.get("priority") or "Normal", PRIORITIES["Normal"])
+    return 9 - p if _LOW_FIRST else p
+
+
+def route(job: dict) -> dict:
+    """apply_async / Signature.set options for `job`."""
+    return {"queue": job.get("queue") or queue_for(job), "priority": priority_for(job)}
+
+
+def queue_depths() -> dict:
+    """Messages waiting per queue on the broker (None if it cannot be reached)."""
+    names = JOB_QUEUES + (celery_app.conf.task_default_queue,)
+    try:
+        with celery_app.connection_for_read() as conn:
+            ch = conn.default_channel
+            # Declaring with the configured arguments is idempotent and, unlike
+            # a passive declare, does not fail for a queue the broker dropped when empty
+            return {q: int(celery_app.amqp.queues[q].bind(ch).queue_declare().message_count) for q in names}
+    except Exception:
+        return {q: None for q in names}
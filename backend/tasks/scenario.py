@@ -0,0 +1,201 @@
+# backend/tasks/scenario.py
+"""
+Scenario-grid revaluation of option books: spot shift x vol shift x days
+forward, every leg at every grid point in one broadcast call.
+
+Leg inputs sit on the last axis, so prices come out as (spot, vol, day, leg)
+and the book P&L is a sum over that axis. European legs (and American calls
+without a dividend yield, which are never exercised early) use Black-Scholes;
+other American legs go through the batched CRR lattice in pricing.vector.
+Holdings in the portfolio move with the spot axis only.
+"""
+import os, time
+import numpy as np
+from . import celery_app
+from models.jobs import set_job_status
+from models.db import db
+from models.progress import JobCancelled, ProgressReporter
+from .dispatch import cancel_job
+from pricing.vector import option_price
+from .risk import build_book
+
+SCENARIO_ALGOS = ("BlackScholes", "Binomial")
+# Leg prices per grid (spot x vol x day x legs) for jobs / synchronous requests
+SCENARIO_MAX_PRICES = int(os.getenv("SCENARIO_MAX_PRICES", "5000000"))
+SCENARIO_SYNC_MAX_PRICES = int(os.getenv("SCENARIO_SYNC_MAX_PRICES", "500000"))
+_DEFAULT_AXES = {
+    "spotShifts": {"min": -0.2, "max": 0.2, "steps": 41},
+    "volShifts": {"min": -0.1, "max": 0.1, "steps": 9},
+    "days": [0, 1, 7, 30],
+}
+_MIN_VOL = 1e-4
+
+
+def _axis(params: dict, key: str) -> np.ndarray:
+    """A list of values, or {"min", "max", "steps"} for an evenly spaced ladder."""
+    spec = params.get(key)
+    if spec in (None, "", []):
+        spec = _DEFAULT_AXES[key]
+    if isinstance(spec, dict):
+        steps = int(spec.get("steps", 11))
+        if steps < 1:
+            raise ValueError(f"{key}.steps must be at least 1")
+        vals = np.linspace(float(spec["min"]), float(spec["max"]), steps)
+    else:
+        vals = np.array([float(v) for v in spec])
+    if vals.size == 0 or not np.all(np.isfinite(vals)):
+        raise ValueError(f"{key} must be a non-empty list of numbers")
+    return vals
+
+
+def revalue_grid(book, spot, vol, days, american=None, steps=None, cancel=None):
+    """
+    (P&L (spot, vol, day, positions), position values) with positions ordered
+    as book.names. spot: relative shifts applied to every underlying; vol:
+    absolute shifts added to each leg's sigma; days: calendar days forward.
+    `american` overrides the legs' own exercise style when not None; `cancel`
+    goes to the lattice (see pricing.vector.binomial_price).
+    """
+    if np.any(spot <= -1.0):
+        raise ValueError("spotShifts must be greater than -1")
+    lin_value = book.lin_qty * book.S0[book.lin_u]
+    grid = (len(spot), len(vol), len(days))
+    lin = np.broadcast_to(
+        (spot[:, None] * lin_value)[:, None, None, :], grid + (len(lin_value),)
+    )
+    if not book.opt:
+        return lin, lin_value
+    o = book.opt
+    am = o["american"] if american is None else np.full(len(o["K"]), bool(american))
+    V0 = option_price(
+        o["S0"], o["K"], o["T"], book.r, o["sigma"], o["is_call"], am, book.q, steps, cancel
+    )
+    V = option_price(
+        o["S0"] * (1.0 + spot)[:, None, None, None],
+        o["K"],
+        np.maximum(o["T"] - days[None, None, :, None] / 365.0, 0.0),
+        book.r,
+        np.maximum(o["sigma"] + vol[None, :, None, None], _MIN_VOL),
+        o["is_call"],
+        am,
+        book.q,
+        steps,
+        cancel,
+    )
+    units = o["qty"] * o["multiplier"]
+    V -= V0
+    V *= units
+    return np.concatenate([lin, V], axis=-1), np.concatenate([lin_value, V0 * units])
+
+
+def scenario_grid(
+    book, params: dict, algo=None, max_prices=SCENARIO_MAX_PRICES, cancel=None
+) -> dict:
+    """Grid P&L plus spot / vol / time ladders through the unshifted point."""
+    spot = _axis(params, "spotShifts")
+    vol = _axis(params, "volShifts")
+    days = _axis(params, "days")
+    if np.any(days < 0):
+        raise ValueError("days must be non-negative")
+    n_legs = len(book.opt["K"]) if book.opt else 0
+    size = len(spot) * len(vol) * len(days) * max(n_legs, 1)
+    if size > max_prices:
+        raise ValueError(
+            f"Grid needs {size} leg prices; at most {max_prices} (shrink an axis)"
+        )
+    if algo not in (None, "", *SCENARIO_ALGOS):
+        raise ValueError(f"Unknown scenario algo {algo}; use {', '.join(SCENARIO_ALGOS)}")
+    american = None if algo in (None, "") else algo == "Binomial"
+    steps = params.get("steps")
+
+    t0 = time.perf_counter()
+    pnl, value0 = revalue_grid(
+        book, spot, vol, days, american, int(steps) if steps else None, cancel
+    )
+    total = pnl.sum(axis=-1)
+    elapsed = time.perf_counter() - t0
+    i_s = int(np.argmin(np.abs(spot)))
+    i_v = int(np.argmin(np.abs(vol)))
+    lo, hi = np.unravel_index(np.argmin(total), total.shape), np.unravel_index(
+        np.argmax(total), total.shape
+    )
+
+    def point(ix):
+        s, v, d = ix
+        return {
+            "pnl": float(total[ix]),
+            "spotShift": float(spot[s]),
+            "volShift": float(vol[v]),
+            "days": float(days[d]),
+        }
+
+    return {
+        "spotShifts": spot.tolist(),
+        "volShifts": vol.tolist(),
+        "days": days.tolist(),
+        "portfolioValue": float(value0.sum()),
+        # heatmaps, [day][spot][vol]
+        "pnl": total.transpose(2, 0, 1).tolist(),
+        # [day][spot] at the vol shift nearest 0, [day][vol] at the spot shift nearest 0
+        "spotLadder": total[:, i_v, :].T.tolist(),
+        "volLadder": total[i_s, :, :].T.tolist(),
+        "timeLadder": total[i_s, i_v, :].tolist(),
+        "worst": point(lo),
+        "best": point(hi),
+        "positions": [
+            {
+                "name": nm,
+                "kind": kd,
+                "units": float(u),
+                "value": float(v),
+                "spotLadder": pnl[:, i_v, 0, j].tolist(),
+            }
+            for j, (nm, kd, u, v) in enumerate(zip(book.names, book.kinds, book.units, value0))
+        ],
+        "legPrices": int(len(spot) * len(vol) * len(days) * n_legs),
+        "elapsedSec": elapsed,
+    }
+
+
+def book_for(params: dict, portfolio_id=None):
+    """Holdings and option assets of the portfolio (if any) plus params["legs"]."""
+    assets = list(db.assets.find({"portfolioId": portfolio_id}, {"_id": 0})) if portfolio_id else []
+    if not assets and not params.get("legs"):
+        raise ValueError("legs or a portfolio with positions required")
+    return build_book(
+        assets, params.get("legs"), float(params.get("r", 0.01)), float(params.get("q", 0.0))
+    )
+
+
+@celery_app.task(name="scenario.run_scenario_job")
+def run_scenario_job(job_id: str, algo: str, params: dict):
+    if not set_job_status(job_id, "Running"):
+        return  # cancelled (or already finished) before it started
+    progress = ProgressReporter(job_id)
+    try:
+        portfolio_id = params.get("portfolioId") or params.get("portfolio_id")
+        job_doc = db.jobs.find_one({"id": job_id}, {"_id": 0, "portfolioId": 1})
+        if not portfolio_id and job_doc:
+            portfolio_id = job_doc.get("portfolioId")
+        book = book_for(params, portfolio_id)
+        res = scenario_grid(book, params, algo, cancel=progress.check)
+        set_job_status(
+            job_id,
+            "Succeeded",
+            result={
+                "algo": algo,
+                "insights": {
+                    "Positions": len(book.names),
+                    "Grid": f"{len(res['spotShifts'])} x {len(res['volShifts'])} x {len(res['days'])}",
+                    "Worst P&L": res["worst"]["pnl"],
+                    "Best P&L": res["best"]["pnl"],
+                },
+                **res,
+            },
+        )
+    except JobCancelled:
+        cancel_job(job_id, result={"partial": progress.payload})
+    except Exception as e:
+        set_job_status(job_id, "Failed", error=str(e))
+    finally:
+        progress.close()
@@ -0,0 +1,130 @@
+# backend/tasks/warmup.py
+"""
+Beat-driven cache warmer: keeps spot, expirations, the nearest option chains and
+daily history for every ticker held in a portfolio fresh ahead of TTL expiry.
+"""
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from . import celery_app
+from models.db import db
+from services import market_data as md
+from storage.history import sync as sync_history
+from utils.finance_cache import _get_redis, warm_columnar, warm_json
+from utils.sanitize import normalize_ticker
+
+WARM_TICK_SEC = int(os.getenv("WARM_TICK_SEC", "60"))
+# Effective frequency: every tick around market hours, rarely otherwise
+# (the spot soft TTL, finance_cache.YF_SPOT_TTL, defaults to WARM_EVERY_OPEN)
+WARM_EVERY_OPEN = int(os.getenv("WARM_EVERY_OPEN", "60"))
+WARM_EVERY_CLOSED = int(os.getenv("WARM_EVERY_CLOSED", "1800"))
+WARM_CHAINS = int(os.getenv("WARM_CHAINS", "3"))
+WARM_WORKERS = int(os.getenv("WARM_WORKERS", "4"))
+WARM_STATS_KEY = "warm:stats"
+
+_NY = ZoneInfo("America/New_York")
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def market_active(now: datetime = None) -> bool:
+    """US cash session widened to 09:00-16:30 ET so caches are warm before the open."""
+    ny = (now or _utcnow()).astimezone(_NY)
+    if ny.weekday() >= 5:
+        return False
+    minutes = ny.hour * 60 + ny.minute
+    return 9 * 60 <= minutes <= 16 * 60 + 30
+
+
+def portfolio_tickers():
+    return sorted(
+        {normalize_ticker(t) for t in db.assets.distinct("ticker") if t}
+    )
+
+
+def _warm_ticker(ticker: str, ahead: float):
+    """Returns (checked, already_warm, failed) counts for one ticker."""
+    checked = warm = failed = 0
+
+    def one(fn, *args):
+        nonlocal checked, warm, failed
+        checked += 1
+        try:
+            warm += bool(fn(*args))
+        except Exception:
+            failed += 1
+
+    # Quote only (what md.get_spot and pricing jobs read). The lookup key also
+    # needs the slow per-ticker `info` call and refreshes itself on access.
+    one(warm_json, md.spot_key(ticker), lambda: md.fetch_spot(ticker), ahead)
+    one(
+        warm_json,
+        md.expirations_key(ticker),
+        lambda: md.fetch_expirations(ticker),
+        ahead,
+    )
+    try:
+        expiries = md.get_expirations(ticker).get("expirations", [])
+    except Exception:
+        expiries = []
+    for expiry in expiries[:WARM_CHAINS]:
+        one(
+            warm_columnar,
+            md.chain_key(ticker, expiry),
+            lambda e=expiry: md.fetch_chain(ticker, e),
+            ahead,
+        )
+    return checked, warm, failed
+
+
+def warm_stats() -> dict:
+    raw = _get_redis().hgetall(WARM_STATS_KEY)
+    out = {}
+    for k, v in raw.items():
+        v = v.decode()
+        try:
+            out[k.decode()] = float(v) if "." in v else int(v)
+        except ValueError:
+            out[k.decode()] = v
+    return out
+
+
+@celery_app.task(name="warmup.warm_market_caches")
+def warm_market_caches(force: bool = False):
+    r = _get_redis()
+    active = market_active()
+    every = WARM_EVERY_OPEN if active else WARM_EVERY_CLOSED
+    # One warmer at a time cluster-wide, at most once per `every` seconds
+    if not force and not r.set("warm:lock", "1", nx=True, ex=max(every - 1, 1)):
+        return {"skipped": True}
+
+    t0 = time.monotonic()
+    tickers = portfolio_tickers()
+    # Refresh anything that would go stale before the next run
+    ahead = float(every)
+    checked = warm = failed = 0
+    if tickers:
+        with ThreadPoolExecutor(max_workers=WARM_WORKERS) as pool:
+            for c, w, f in pool.map(lambda t: _warm_ticker(t, ahead), tickers):
+                checked, warm, failed = checked + c, warm + w, failed + f
+        try:
+            sync_history(tickers)
+        except Exception:
+            failed += 1
+
+    stats = {
+        "ts": _utcnow().isoformat().replace("+00:00", "Z"),
+        "marketActive": int(active),
+        "tickers": len(tickers),
+        "checked": checked,
+        "alreadyWarm": warm,
+        "refreshed": checked - warm - failed,
+        "failed": failed,
+        "warmHitRatio": round(warm / checked, 4) if checked else 0,
+        "durationSec": round(time.monotonic() - t0, 3),
+    }
+    r.hset(WARM_STATS_KEY, mapping=stats)
+    return stats
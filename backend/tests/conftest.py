@@ -0,0 +1,74 @@
+# backend/tests/conftest.py
+import os, sys
+from datetime import datetime
+import pytest
+
+# Tests import backend modules the way the app does (backend/ on the path)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MARKET_DATA_PROVIDER", "synthetic")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+# models.db connects at import; point it at mongomock before anything imports it.
+# Tests that touch the database importorskip("mongomock") first.
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+else:
+    import pymongo
+
+    pymongo.MongoClient = mongomock.MongoClient
+
+    # mongomock has no $dateFromString (models.jobs._since); parse ISO strings as MongoDB does
+    import mongomock.aggregate as _agg
+
+    _date_operator = _agg._Parser._handle_date_operator
+
+    def _handle_date_operator(self, operator, values):
+        if operator != "$dateFromString":
+            return _date_operator(self, operator, values)
+        s = self.parse(values["dateString"]) if "dateString" in values else None
+        if s is None:
+            return values.get("onNull")
+        try:
+            return datetime.fromisoformat(s.replace("Z", "+00:00")).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return values.get("onError")
+
+    _agg._Parser._handle_date_operator = _handle_date_operator
+
+
+@pytest.fixture
+def jobs_db():
+    """Empty mongomock jobs / batches collections."""
+    pytest.importorskip("mongomock")
+    from models.db import db
+
+    db.jobs.delete_many({})
+    db.batches.delete_many({})
+    db.assets.delete_many({})
+    return db
+
+
+@pytest.fixture
+def make_job(jobs_db):
+    """new_job for a Backtest (no market keys to snapshot); payload fields override."""
+    from models.jobs import new_job
+
+    def make(**kw):
+        return new_job({"type": "Backtest", "algo": "MeanVariance", "params": {"lookback": 60}, **kw})
+
+    return make
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """fakeredis behind utils.finance_cache, with cancel flags polled on every check."""
+    fakeredis = pytest.importorskip("fakeredis")
+    import models.progress
+    import utils.finance_cache as fc
+
+    monkeypatch.setattr(fc, "_redis", fakeredis.FakeRedis())
+    monkeypatch.setattr(models.progress, "CANCEL_POLL_MS", 0)
+    return fc._redis
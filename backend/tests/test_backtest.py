@@ -0,0 +1,65 @@
+# backend/tests/test_backtest.py
+import numpy as np
+import pytest
+
+pytest.importorskip("mongomock")  # tasks.* import models.db
+from tasks.backtest import _simulate
+
+
+def _daily_loop(R, pts, W, cost):
+    """Reference: carry positions day by day, rebalancing at the close of each point."""
+    T, n = R.shape
+    reb = {int(p): s for s, p in enumerate(pts)}
+    h, cash, E = np.zeros(n), 1.0, 1.0
+    equity, turnover = [], []
+    for t in range(int(pts[0]), T):
+        if t > pts[0]:
+            h = h * (1.0 + R[t])
+            E = h.sum() + cash
+            equity.append(E)
+        if t in reb:
+            w = W[reb[t]]
+            tu = float(np.abs(w - h / E).sum())
+            E *= 1.0 - cost * tu
+            h, cash = w * E, (1.0 - w.sum()) * E
+            turnover.append(tu)
+            if t == pts[0]:
+                equity.append(E)
+    return np.array(equity), np.array(turnover)
+
+
+def _case(seed, T=300, n=6, cash=False, short=False):
+    rng = np.random.default_rng(seed)
+    R = rng.normal(0.0004, 0.015, (T, n))
+    R[rng.random((T, n)) < 0.02] = 0.0  # missing days
+    pts = np.sort(rng.choice(np.arange(20, T - 1), 9, replace=False))
+    W = rng.dirichlet(np.ones(n), len(pts))
+    if cash:
+        W *= rng.uniform(0.6, 1.0, (len(pts), 1))
+    if short:
+        W[:, 0] -= 0.3
+        W[:, 1] += 0.3
+    return R, pts, W
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("cash,short", [(False, False), (True, False), (False, True)])
+@pytest.mark.parametrize("cost", [0.0, 0.001])
+def test_vectorized_simulation_matches_daily_loop(seed, cash, short, cost):
+    R, pts, W = _case(seed, cash=cash, short=short)
+    equity, turnover, costs = _simulate(R, pts, W, cost)
+    ref_equity, ref_turnover = _daily_loop(R, pts, W, cost)
+    assert equity.shape == (len(R) - pts[0],)
+    np.testing.assert_allclose(equity, ref_equity, rtol=1e-10)
+    np.testing.assert_allclose(turnover, ref_turnover, rtol=1e-10, atol=1e-12)
+    np.testing.assert_allclose(costs, cost * ref_turnover, rtol=1e-10, atol=1e-15)
+
+
+def test_buy_and_hold_has_no_turnover_after_the_first_trade():
+    R = np.full((50, 2), 0.01)
+    pts = np.array([5, 20, 35])
+    W = np.tile([0.5, 0.5], (3, 1))
+    equity, turnover, _ = _simulate(R, pts, W, 0.01)
+    assert turnover[0] == pytest.approx(1.0)
+    np.testing.assert_allclose(turnover[1:], 0.0, atol=1e-12)
+    assert equity[-1] == pytest.approx(0.99 * 1.01 ** (50 - 6), rel=1e-12)
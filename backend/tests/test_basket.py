@@ -0,0 +1,54 @@
+# backend/tests/test_basket.py
+import numpy as np
+import pytest
+from scipy.stats import norm
+from pricing.basket import basket_mc, moment_matched
+
+
+def _margrabe(S1, S2, T, q1, q2, s1, s2, rho):
+    """Exchange option max(S1 - S2, 0) in closed form (no dependence on r)."""
+    s = np.sqrt(s1**2 + s2**2 - 2.0 * rho * s1 * s2)
+    d1 = (np.log(S1 / S2) + (q2 - q1 + 0.5 * s**2) * T) / (s * np.sqrt(T))
+    d2 = d1 - s * np.sqrt(T)
+    return S1 * np.exp(-q1 * T) * norm.cdf(d1) - S2 * np.exp(-q2 * T) * norm.cdf(d2)
+
+
+def _cov(s1, s2, rho):
+    return np.array([[s1 * s1, rho * s1 * s2], [rho * s1 * s2, s2 * s2]])
+
+
+@pytest.mark.parametrize(
+    "S0,q,sig,rho,T",
+    [
+        ((100.0, 100.0), (0.0, 0.0), (0.2, 0.3), 0.5, 1.0),
+        ((110.0, 95.0), (0.02, 0.01), (0.25, 0.15), -0.3, 0.5),
+        ((90.0, 100.0), (0.0, 0.03), (0.4, 0.2), 0.8, 2.0),
+    ],
+)
+def test_exchange_option_matches_margrabe(S0, q, sig, rho, T):
+    ref = _margrabe(*S0, T, *q, *sig, rho)
+    res = basket_mc(
+        np.array(S0), np.array([1.0, -1.0]), 0.0, T, 0.03, np.array(q), _cov(*sig, rho),
+        paths=400_000, seed=7,
+    )
+    assert abs(res["price"] - ref) < 4.0 * res["stderr"] + 1e-3
+    # The S(T) controls must help, not just leave the estimate unbiased
+    assert res["stderr"] < res["plainStderr"]
+
+
+def test_uncontrolled_estimate_also_matches_margrabe():
+    ref = _margrabe(100.0, 100.0, 1.0, 0.0, 0.0, 0.2, 0.3, 0.5)
+    res = basket_mc(
+        np.array([100.0, 100.0]), np.array([1.0, -1.0]), 0.0, 1.0, 0.01, 0.0, _cov(0.2, 0.3, 0.5),
+        paths=400_000, control=False, seed=11,
+    )
+    assert abs(res["price"] - ref) < 4.0 * res["stderr"]
+
+
+def test_basket_mc_is_close_to_moment_matching():
+    S0, w, cov = np.array([100.0, 50.0, 80.0]), np.array([0.3, 0.5, 0.2]), np.diag([0.04, 0.09, 0.0625])
+    approx = moment_matched(S0, w, 60.0, 1.0, 0.02, np.zeros(3), cov)
+    res = basket_mc(S0, w, 60.0, 1.0, 0.02, 0.0, cov, paths=200_000, seed=3)
+    assert res["geometricControl"]
+    # Levy's approximation is close but not exact for an arithmetic basket
+    assert res["price"] == pytest.approx(approx, rel=0.02)
@@ -0,0 +1,139 @@
+# backend/tests/test_cancel.py
+import numpy as np
+import pytest
+
+_BASKET = {
+    "underlyings": [{"ticker": "AAA", "S0": 100, "sigma": 0.2}, {"ticker": "BBB", "S0": 95, "sigma": 0.3}],
+    "correlation": [[1.0, 0.5], [0.5, 1.0]],
+    "strike": 0,
+    "T": 1.0,
+    "seed": 7,
+    "num_paths": 40_000,
+}
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """Jobs tasks.dispatch would have sent to Celery."""
+    import tasks.dispatch
+
+    sent = []
+    monkeypatch.setattr(tasks.dispatch, "enqueue", lambda job: sent.append(job["id"]) or True)
+    return sent
+
+
+def test_reporter_raises_once_cancel_requested(jobs_db, redis):
+    from models.progress import JobCancelled, ProgressReporter, request_cancel
+
+    p = ProgressReporter("j1", every_ms=0)
+    p(1, 4)
+    assert request_cancel("j1")
+    with pytest.raises(JobCancelled):
+        p(2, 4)
+    with pytest.raises(JobCancelled):
+        p.check()  # stays cancelled without another read
+    p.close()
+    assert not redis.exists("job:cancel:j1")
+
+
+def test_basket_mc_stops_between_chunks(jobs_db, redis):
+    from models.progress import JobCancelled, ProgressReporter, request_cancel
+    from pricing.basket import basket_mc
+
+    reporter = ProgressReporter("j2", every_ms=0)
+    calls = []
+
+    def progress(done, total, **fields):
+        calls.append(done)
+        reporter(done, total, **fields)
+        request_cancel("j2")  # lands after the first chunk
+
+    cov = np.array([[0.04, 0.03], [0.03, 0.09]])
+    with pytest.raises(JobCancelled):
+        basket_mc([100, 95], [1, -1], 0, 1.0, 0.01, [0, 0], cov, paths=40_000, chunk=5_000, seed=1, progress=progress)
+    assert len(calls) == 2
+    assert reporter.payload["done"] == calls[0] < reporter.payload["total"]
+
+
+def test_cancelled_task_records_partial_result(jobs_db, redis, enqueued):
+    from models.jobs import get_job, new_job
+    from models.progress import request_cancel
+    from tasks.basket import run_basket_job
+
+    j = new_job({"type": "OptionPricing", "product": "Spread", "algo": "MonteCarlo", "params": _BASKET})
+    request_cancel(j["id"])
+    run_basket_job(j["id"], "Spread", "MonteCarlo", _BASKET)
+    done = get_job(j["id"])
+    assert done["status"] == "Cancelled"
+    assert "partial" in done["result"]
+    assert not redis.exists(f"job:cancel:{j['id']}")
+
+
+def test_cancel_job_only_cancels_active_jobs(jobs_db, enqueued, make_job):
+    from models.jobs import get_job, set_job_status
+    from tasks.dispatch import cancel_job
+
+    j = make_job(dedupe=False)
+    assert cancel_job(j["id"])
+    assert get_job(j["id"])["status"] == "Cancelled"
+    assert not cancel_job(j["id"])
+
+    k = make_job(dedupe=False)
+    set_job_status(k["id"], "Running")
+    set_job_status(k["id"], "Succeeded", result={"x": 1})
+    assert not cancel_job(k["id"])
+    assert get_job(k["id"])["status"] == "Succeeded"
+    assert enqueued == []
+
+
+def test_cancelling_a_leader_promotes_its_oldest_follower(jobs_db, enqueued, make_job):
+    from models.jobs import get_job, set_job_status
+    from tasks.dispatch import cancel_job
+
+    lead, heir, other = make_job(), make_job(), make_job()
+    assert heir["dedupedFrom"] == other["dedupedFrom"] == lead["id"]
+    set_job_status(lead["id"], "Running")
+    assert cancel_job(lead["id"], result={"partial": None})
+
+    assert get_job(lead["id"])["status"] == "Cancelled"
+    h = get_job(heir["id"])
+    assert h["status"] == "Queued" and h["dedupedFrom"] is None and h["startedAt"] is None
+    o = get_job(other["id"])
+    assert o["status"] == "Queued" and o["dedupedFrom"] == heir["id"]
+    assert enqueued == [heir["id"]]
+
+    # The heir's outcome reaches the remaining follower
+    set_job_status(heir["id"], "Running")
+    set_job_status(heir["id"], "Succeeded", result={"x": 3})
+    assert get_job(other["id"])["result"] == {"x": 3}
+    # ...and a new submission reuses it instead of the cancelled leader
+    assert make_job()["result"] == {"x": 3}
+
+
+def test_cancelling_a_follower_leaves_the_leader_running(jobs_db, enqueued, make_job):
+    from models.jobs import get_job, set_job_status
+    from tasks.dispatch import cancel_job
+
+    lead, follower = make_job(), make_job()
+    set_job_status(lead["id"], "Running")
+    assert cancel_job(follower["id"])
+    assert get_job(follower["id"])["status"] == "Cancelled"
+    assert get_job(lead["id"])["status"] == "Running"
+    assert enqueued == []
+
+
+def test_option_job_dispatches_end_to_end(jobs_db, redis):
+    from models.jobs import get_job, new_job
+    from tasks.dispatch import task_for
+    from tasks.option_pricing import black_scholes_price
+
+    params = {"ticker": "AAA", "strike": 100, "T": 0.5, "sigma": 0.2, "use_chain": "false",
+              "num_paths": 20_000, "num_steps": 8}
+    j = new_job({"type": "OptionPricing", "product": "European", "algo": "MonteCarlo", "params": params})
+    task_for(j).apply()
+    done = get_job(j["id"])
+    assert done["status"] == "Succeeded", done.get("error")
+    res = done["result"]
+    assert res["algo"] == "MonteCarlo" and res["stderr"] > 0
+    bs = black_scholes_price(res["inferred"]["S0"], 100, 0.5, 0.01, 0.2)
+    assert abs(res["price"] - bs) < 5 * res["stderr"]
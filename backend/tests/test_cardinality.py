@@ -0,0 +1,78 @@
+# backend/tests/test_cardinality.py
+from itertools import combinations
+import numpy as np
+import pytest
+from optim.cardinality import cardinality_mv
+from optim.qp import max_return, mean_variance
+
+
+def _problem(n, seed):
+    rng = np.random.default_rng(seed)
+    F = rng.standard_normal((n, 3)) * 0.01
+    X = rng.standard_normal((500, 3)) @ F.T + rng.standard_normal((500, n)) * rng.uniform(0.008, 0.02, n)
+    return np.cov(X.T) * 252, X.mean(axis=0) * 252 + rng.uniform(0.0, 0.1, n)
+
+
+def _enumerate(S, mu, k, target=None, hi=1.0):
+    """Best objective over every support of at most k names, each solved as a plain QP."""
+    best = np.inf
+    for size in range(1, k + 1):
+        if size * hi < 1.0 - 1e-12:
+            continue
+        for sel in combinations(range(len(mu)), size):
+            sel = list(sel)
+            if target is not None and max_return(mu[sel], np.zeros(size), np.full(size, hi), 1.0) < target:
+                continue
+            res = mean_variance(S[np.ix_(sel, sel)], mu[sel], target=target, lo=0.0, hi=hi, budget=1.0)
+            if res.ok:
+                best = min(best, res.obj)
+    return best
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("k,hi", [(2, 1.0), (3, 1.0), (4, 0.4)])
+def test_branch_and_bound_matches_enumeration(seed, k, hi):
+    S, mu = _problem(10, seed)
+    out = cardinality_mv(S, mu, k, hi=hi, time_limit=60)
+    assert out["ok"] and out["optimal"]
+    assert out["gap"] <= 1e-6
+    assert np.count_nonzero(np.abs(out["x"]) > 1e-6) <= k
+    assert out["obj"] == pytest.approx(_enumerate(S, mu, k, hi=hi), rel=1e-5)
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_branch_and_bound_with_target_matches_enumeration(seed):
+    S, mu = _problem(10, seed)
+    target = float(np.percentile(mu, 60))
+    out = cardinality_mv(S, mu, 3, target=target, time_limit=60)
+    assert out["ok"] and out["optimal"]
+    assert mu @ out["x"] >= target - 1e-6
+    assert out["obj"] == pytest.approx(_enumerate(S, mu, 3, target=target), rel=1e-5)
+
+
+def test_limit_returns_best_portfolio_and_gap():
+    S, mu = _problem(40, 0)
+    out = cardinality_mv(S, mu, 8, max_nodes=30)
+    assert out["ok"] and not out["optimal"]
+    assert out["gap"] > 0
+    assert np.count_nonzero(np.abs(out["x"]) > 1e-6) <= 8
+    assert "gap" in out["message"]
+
+
+def test_unconverged_subproblems_stay_in_the_gap(monkeypatch):
+    import optim.cardinality as card
+
+    S, mu = _problem(10, 0)
+    real = card.mean_variance
+
+    def flaky(*a, warm=None, **kw):
+        res = real(*a, warm=warm, **kw)
+        if warm is not None:  # every child relaxation stops at max_iter
+            res.status = "max_iter"
+        return res
+
+    monkeypatch.setattr(card, "mean_variance", flaky)
+    out = card.cardinality_mv(S, mu, 3, time_limit=60)
+    assert out["ok"] and not out["optimal"]
+    assert out["gap"] > 0
+    assert "did not converge" in out["message"]
@@ -0,0 +1,127 @@
+# backend/tests/test_finance_cache.py
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import utils.finance_cache as fc
+
+
+@pytest.fixture
+def cache(redis, monkeypatch):
+    monkeypatch.setattr(fc, "YF_LEASE_POLL", 0.01)
+    monkeypatch.setattr(fc, "_TTL_POLICIES", {**fc._TTL_POLICIES, "t:": (1, 60)})
+    return redis
+
+
+class _Upstream:
+    """Slow fetch that counts its calls."""
+
+    def __init__(self, delay=0.2, value="v1"):
+        self.delay, self.value, self.calls = delay, value, 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {"v": self.value}
+
+
+def _lease(key, fetch, **kw):
+    enc, dec = fc._CODECS["json"]
+    return fc._load_with_lease(fc._get_redis(), key, fetch, 60, enc, dec, **kw)
+
+
+def test_concurrent_misses_fetch_once_across_processes(cache):
+    # Each thread plays a separate process: straight to the Redis lease
+    up = _Upstream()
+    with ThreadPoolExecutor(8) as pool:
+        got = list(pool.map(lambda _: _lease("t:lease1", up)[0], range(8)))
+    assert up.calls == 1
+    assert got == [{"v": "v1"}] * 8
+    assert not cache.exists("lease:t:lease1")
+
+
+def test_concurrent_misses_fetch_once_in_process(cache):
+    up = _Upstream()
+    with ThreadPoolExecutor(8) as pool:
+        got = list(pool.map(lambda _: fc.cache_json("t:flight1", up), range(8)))
+    assert up.calls == 1
+    assert got == [{"v": "v1"}] * 8
+
+
+def test_lease_of_a_crashed_leader_expires(cache):
+    # A holder that died without publishing or releasing
+    cache.set("lease:t:crash1", "dead", px=200)
+    up = _Upstream(delay=0.0)
+    t0 = time.monotonic()
+    assert _lease("t:crash1", up)[0] == {"v": "v1"}
+    assert 0.15 <= time.monotonic() - t0 < 2.0
+    assert up.calls == 1
+
+
+def test_failed_leader_releases_its_lease(cache):
+    def boom():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        _lease("t:fail1", boom)
+    assert not cache.exists("lease:t:fail1")
+    assert _lease("t:fail1", _Upstream(delay=0.0))[0] == {"v": "v1"}
+
+
+def test_stuck_leader_is_bypassed_after_the_wait(cache, monkeypatch):
+    monkeypatch.setattr(fc, "YF_LEASE_WAIT", 0.2)
+    cache.set("lease:t:stuck1", "slow", px=60_000)
+    up = _Upstream(delay=0.0)
+    assert _lease("t:stuck1", up)[0] == {"v": "v1"}
+    assert up.calls == 1
+    # ...without stealing the holder's lease
+    assert cache.get("lease:t:stuck1") == b"slow"
+
+
+def test_release_only_deletes_own_lease(cache):
+    cache.set("lease:t:own1", "theirs")
+    assert cache.eval(fc._RELEASE_LUA, 1, "lease:t:own1", "mine") == 0
+    assert cache.get("lease:t:own1") == b"theirs"
+
+
+def test_stale_value_is_served_while_one_refresh_runs(cache):
+    enc, _ = fc._CODECS["json"]
+    # Published 5 s ago: past the 1 s soft TTL, well within the hard TTL
+    stale = fc._ENVELOPE.pack(fc._MAGIC, time.time() - 5) + enc({"v": "v1"})
+    cache.set("t:swr1", stale)
+    up = _Upstream(delay=0.3, value="v2")
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        got = list(pool.map(lambda _: fc.cache_json("t:swr1", up), range(8)))
+    assert time.monotonic() - t0 < 0.25  # nobody waited for upstream
+    assert got == [{"v": "v1"}] * 8
+
+    deadline = time.monotonic() + 5
+    while fc.cache_json("t:swr1", up) != {"v": "v2"} and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert fc.cache_json("t:swr1", up) == {"v": "v2"}
+    assert up.calls == 1
+
+
+def test_value_past_hard_ttl_blocks_on_fetch(cache):
+    up = _Upstream(delay=0.0)
+    assert fc.cache_json("t:hard1", up) == {"v": "v1"}
+    # Local entries expire at fetched_at + hard TTL; Redis drops the key itself
+    fc._local.put("t:hard1", {"v": "old"}, time.time() - 120, time.time() - 60)
+    cache.delete("t:hard1")
+    up.value = "v2"
+    assert fc.cache_json("t:hard1", up) == {"v": "v2"}
+    assert up.calls == 2
+
+
+def test_local_lru_evicts_least_recent_and_expired():
+    lru = fc._LocalLRU(2)
+    now = time.time()
+    lru.put("a", 1, now, now + 60)
+    lru.put("b", 2, now, now + 60)
+    assert lru.get("a", now)[0] == 1  # "a" is now the most recent
+    lru.put("c", 3, now, now + 60)
+    assert lru.get("b", now) is None
+    assert lru.get("a", now)[0] == 1 and lru.get("c", now)[0] == 3
+    assert lru.get("c", now + 61) is None
@@ -0,0 +1,49 @@
+# backend/tests/test_history.py
+import numpy as np
+import pytest
+from storage import history
+
+
+def _arr(*xs):
+    return np.array(xs, dtype=float)
+
+
+def test_partial_last_bar_is_refreshed():
+    t, c = np.array([10, 11, 12]), _arr(100.0, 101.0, 101.5)  # 12 stored mid-session
+    merged = history._merge_tail(t, c, np.array([11, 12, 13]), _arr(101.0, 103.0, 104.0))
+    np.testing.assert_array_equal(merged[0], [10, 11, 12, 13])
+    np.testing.assert_array_equal(merged[1], [100.0, 101.0, 103.0, 104.0])
+    # Same day again, still intraday: updated in place, nothing appended
+    merged = history._merge_tail(*merged, np.array([12, 13]), _arr(103.0, 104.7))
+    np.testing.assert_array_equal(merged[0], [10, 11, 12, 13])
+    assert merged[1][-1] == 104.7
+
+
+def test_moved_settled_bar_means_readjusted():
+    t, c = np.array([10, 11, 12]), _arr(100.0, 101.0, 101.5)
+    assert history._merge_tail(t, c, np.array([11, 12]), _arr(99.0, 101.5)) is None
+
+
+def test_sync_fetches_tail_and_keeps_fresh_close(tmp_path, monkeypatch):
+    calls = []
+
+    class Provider:
+        def __init__(self):
+            self.bars = (np.array([10, 11, 12]), _arr(100.0, 101.0, 101.5))
+
+        def daily_closes(self, tickers, start=None, period=None):
+            calls.append("tail" if start else "full")
+            t, c = self.bars
+            lo = 0 if start is None else np.searchsorted(t, np.datetime64(start, "D").astype(np.int64))
+            return {tk: (t[lo:], c[lo:]) for tk in tickers}
+
+    p = Provider()
+    monkeypatch.setattr(history, "HISTORY_DIR", str(tmp_path))
+    monkeypatch.setattr(history, "get_provider", lambda: p)
+    history.sync(["AAA"])
+    p.bars = (np.array([10, 11, 12]), _arr(100.0, 101.0, 102.25))  # the day's close lands
+    history.sync(["AAA"], force=True)
+    t, c = history.load_arrays("AAA", "max")
+    assert calls == ["full", "tail"]
+    np.testing.assert_array_equal(t, [10, 11, 12])
+    assert c[-1] == pytest.approx(102.25)
@@ -0,0 +1,115 @@
+# backend/tests/test_jobs.py
+import pytest
+
+
+def test_lifecycle(jobs_db, make_job):
+    from models.jobs import get_job, set_job_status
+
+    j = make_job(dedupe=False)
+    assert j["status"] == "Queued" and j["startedAt"] is None
+    assert set_job_status(j["id"], "Running")
+    started = get_job(j["id"])["startedAt"]
+    assert started is not None
+    assert set_job_status(j["id"], "Succeeded", result={"x": 1})
+    done = get_job(j["id"])
+    assert done["status"] == "Succeeded" and done["result"] == {"x": 1}
+    assert done["startedAt"] == started
+    assert done["finishedAt"] is not None and done["durationSec"] >= 0
+    assert done["progress"] is None
+
+
+@pytest.mark.parametrize(
+    "path,target",
+    [
+        (["Running", "Succeeded"], "Running"),
+        (["Running", "Succeeded"], "Failed"),
+        (["Running", "Succeeded"], "Cancelled"),
+        (["Running", "Failed"], "Succeeded"),
+        (["Cancelled"], "Running"),
+        (["Cancelled"], "Succeeded"),
+        ([], "Succeeded"),  # never ran
+    ],
+)
+def test_illegal_transitions_are_refused(jobs_db, make_job, path, target):
+    from models.jobs import get_job, set_job_status
+
+    j = make_job(dedupe=False)
+    for status in path:
+        assert set_job_status(j["id"], status)
+    before = get_job(j["id"])
+    assert not set_job_status(j["id"], target, result={"late": True}, error="late")
+    assert get_job(j["id"]) == before
+
+
+@pytest.mark.parametrize("status", ["Failed", "Cancelled"])
+def test_queued_job_may_fail_or_be_cancelled(jobs_db, make_job, status):
+    from models.jobs import get_job, set_job_status
+
+    j = make_job(dedupe=False)
+    assert set_job_status(j["id"], status, error="why")
+    assert get_job(j["id"])["status"] == status
+
+
+def test_running_is_reentrant_for_retries(jobs_db, make_job):
+    from models.jobs import get_job, set_job_status
+
+    j = make_job(dedupe=False)
+    assert set_job_status(j["id"], "Running")
+    started = get_job(j["id"])["startedAt"]
+    assert set_job_status(j["id"], "Running")
+    assert get_job(j["id"])["startedAt"] == started
+
+
+def test_unknown_job(jobs_db):
+    from models.jobs import set_job_status
+
+    assert not set_job_status("missing", "Running")
+
+
+def test_followers_share_success_and_never_reopen(jobs_db, make_job):
+    from models.jobs import get_job, set_job_status
+
+    lead, follower = make_job(), make_job()
+    assert follower["dedupedFrom"] == lead["id"]
+    set_job_status(lead["id"], "Running")
+    assert get_job(follower["id"])["status"] == "Running"
+    set_job_status(lead["id"], "Succeeded", result={"x": 2})
+    assert get_job(follower["id"])["result"] == {"x": 2}
+    # A late retry of the leader cannot reopen either of them
+    assert not set_job_status(lead["id"], "Running")
+    assert get_job(follower["id"])["status"] == "Succeeded"
+    # A fresh success is reused as is
+    clone = make_job()
+    assert clone["status"] == "Succeeded" and clone["result"] == {"x": 2}
+
+
+def test_transitions_without_followers_skip_the_follower_update(jobs_db, make_job, monkeypatch):
+    from models.jobs import get_job, set_job_status
+
+    lead = make_job()
+    calls = []
+    real = type(jobs_db.jobs).update_many
+    monkeypatch.setattr(
+        type(jobs_db.jobs), "update_many", lambda self, *a, **kw: calls.append(a) or real(self, *a, **kw)
+    )
+    set_job_status(lead["id"], "Running")
+    assert calls == []
+
+    follower = make_job()
+    assert get_job(lead["id"])["followers"] == 1
+    calls.clear()
+    set_job_status(lead["id"], "Succeeded", result={"x": 4})
+    assert len(calls) == 1
+    assert get_job(follower["id"])["result"] == {"x": 4}
+
+
+def test_batch_followers_are_counted(jobs_db):
+    from models.jobs import get_job, new_jobs, set_job_status
+
+    p = {"type": "Backtest", "algo": "MeanVariance", "params": {"lookback": 61}}
+    lead, *rest = new_jobs([p, p, p])
+    assert all(d["dedupedFrom"] == lead["id"] for d in rest)
+    assert get_job(lead["id"])["followers"] == 2
+    set_job_status(lead["id"], "Running")
+    set_job_status(lead["id"], "Failed", error="boom")
+    assert {get_job(d["id"])["error"] for d in rest} == {"boom"}
@@ -0,0 +1,65 @@
+# backend/tests/test_qp.py
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+from optim.qp import max_return, mean_variance
+
+
+def _problem(n, seed):
+    rng = np.random.default_rng(seed)
+    F = rng.standard_normal((n, 3)) * 0.01
+    X = rng.standard_normal((500, 3)) @ F.T + rng.standard_normal((500, n)) * 0.015
+    return np.cov(X.T) * 252, X.mean(axis=0) * 252 + rng.uniform(0.0, 0.1, n)
+
+
+def _slsqp(S, mu, lam, lo, hi, budget, target=None):
+    n = len(mu)
+    cons = [{"type": "eq", "fun": lambda w: w.sum() - budget}]
+    if target is not None:
+        cons.append({"type": "ineq", "fun": lambda w: mu @ w - target})
+    res = minimize(
+        lambda w: 0.5 * w @ S @ w - lam * mu @ w,
+        np.full(n, budget / n),
+        jac=lambda w: S @ w - lam * mu,
+        bounds=[(lo, hi)] * n,
+        constraints=cons,
+        method="SLSQP",
+        options={"ftol": 1e-14, "maxiter": 1000},
+    )
+    assert res.success, res.message
+    return res.x
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("hi", [1.0, 0.15])
+def test_mean_variance_matches_slsqp(seed, hi):
+    S, mu = _problem(20, seed)
+    res = mean_variance(S, mu, lam=0.05, lo=0.0, hi=hi, budget=1.0)
+    ref = _slsqp(S, mu, 0.05, 0.0, hi, 1.0)
+    assert res.ok
+    obj = lambda w: 0.5 * w @ S @ w - 0.05 * mu @ w
+    assert obj(res.x) == pytest.approx(obj(ref), rel=1e-6, abs=1e-9)
+    np.testing.assert_allclose(res.x, ref, atol=1e-4)
+    assert res.x.sum() == pytest.approx(1.0, abs=1e-8)
+    assert res.x.min() >= -1e-8 and res.x.max() <= hi + 1e-8
+
+
+@pytest.mark.parametrize("seed", [0, 3])
+def test_target_return_matches_slsqp(seed):
+    S, mu = _problem(15, seed)
+    target = 0.5 * (float(mu.mean()) + max_return(mu, np.zeros(15), np.full(15, 0.3), 1.0))
+    res = mean_variance(S, mu, target=target, lo=0.0, hi=0.3, budget=1.0)
+    ref = _slsqp(S, mu, 0.0, 0.0, 0.3, 1.0, target)
+    assert res.ok
+    assert mu @ res.x >= target - 1e-7
+    assert res.x @ S @ res.x == pytest.approx(ref @ S @ ref, rel=1e-5)
+
+
+def test_unpolished_stop_keeps_budget_exact():
+    from optim.qp import solve_qp
+
+    S, mu = _problem(50, 4)
+    res = solve_qp(S, -1e-3 * mu, 0.0, 1.0, np.ones((1, 50)), np.ones(1), np.ones(1), polish=False, max_iter=10)
+    assert res.status == "max_iter" and not res.polished
+    assert res.x.sum() == pytest.approx(1.0, abs=1e-10)
+    assert res.x.min() >= 0.0 and res.x.max() <= 1.0
@@ -0,0 +1,87 @@
+# backend/tests/test_qubo.py
+from itertools import product
+import numpy as np
+import pytest
+from optim.qubo import cardinality_qubo, simulated_annealing, solve_exact, tabu_search
+
+
+def _instance(n, seed):
+    rng = np.random.default_rng(seed)
+    A = rng.standard_normal((n, n))
+    return A @ A.T / n, rng.uniform(-0.5, 1.0, n)
+
+
+def _brute_force(Q, c, k=None):
+    """Reference minimum over every x in {0,1}^n, one state at a time."""
+    best = (np.inf, None)
+    for bits in product((0.0, 1.0), repeat=len(c)):
+        x = np.array(bits)
+        if k is not None and x.sum() != k:
+            continue
+        e = float(x @ Q @ x + c @ x)
+        if e < best[0]:
+            best = (e, x)
+    return best
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_exact_matches_brute_force_unconstrained(seed):
+    Q, c = _instance(10, seed)
+    e, x = _brute_force(Q, c)
+    res = solve_exact(Q, c)
+    assert res["evaluated"] == 2**10
+    assert res["energy"] == pytest.approx(e, abs=1e-10)
+    np.testing.assert_array_equal(res["x"], x)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("k", [1, 3, 5])
+def test_exact_matches_brute_force_with_cardinality(seed, k):
+    cov, mu = _instance(10, seed)
+    Q, c, _ = cardinality_qubo(cov, mu, None, gamma=0.5)
+    e, x = _brute_force(Q, c, k)
+    res = solve_exact(Q, c, k)
+    assert res["x"].sum() == k
+    assert res["energy"] == pytest.approx(e, abs=1e-10)
+    np.testing.assert_array_equal(res["x"], x)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_penalty_makes_unconstrained_minimum_feasible(seed):
+    cov, mu = _instance(9, seed)
+    k = 3
+    Q, c, const = cardinality_qubo(cov, mu, k, gamma=0.5)
+    Q0, c0, _ = cardinality_qubo(cov, mu, None, gamma=0.5)
+    res = solve_exact(Q, c)
+    e0, x0 = _brute_force(Q0, c0, k)
+    assert res["x"].sum() == k
+    assert res["energy"] + const == pytest.approx(e0, abs=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_heuristics_reach_the_exact_optimum_on_small_instances(seed):
+    cov, mu = _instance(12, seed)
+    Q, c, _ = cardinality_qubo(cov, mu, None, gamma=0.5)
+    best = solve_exact(Q, c, 4)["energy"]
+    assert simulated_annealing(Q, c, 4, seed=seed)["energy"] == pytest.approx(best, abs=1e-9)
+    assert tabu_search(Q, c, 4, seed=seed)["energy"] == pytest.approx(best, abs=1e-9)
+
+
+def test_cardinality_above_universe_is_rejected():
+    from optim.qubo import solve_qubo
+
+    Q, c = _instance(5, 0)
+    with pytest.raises(ValueError, match="outside 0..5"):
+        solve_qubo(Q, c, 10)
+
+
+def test_cardinality_constraint_is_clamped_to_universe():
+    pytest.importorskip("mongomock")
+    from tasks.optimization import _parse_constraint, _qubo_optimize
+
+    assert _parse_constraint("Cardinality=10", 5)[3] == 5
+    with pytest.raises(ValueError):
+        _parse_constraint("Cardinality=0", 5)
+    cov, mu = _instance(5, 1)
+    w = _qubo_optimize(cov, mu, _parse_constraint("Cardinality=10", 5)[3])[0]
+    np.testing.assert_allclose(w, np.full(5, 0.2))
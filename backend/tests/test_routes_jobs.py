@@ -0,0 +1,26 @@
+# backend/tests/test_routes_jobs.py
+import pytest
+
+
+@pytest.fixture
+def client(jobs_db, monkeypatch):
+    from flask import Flask
+    import routes.jobs
+
+    monkeypatch.setattr(routes.jobs, "queue_depths", lambda: {})
+    app = Flask(__name__)
+    app.register_blueprint(routes.jobs.bp, url_prefix="/api")
+    return app.test_client()
+
+
+@pytest.mark.parametrize("window", ["abc", "-5", "0", "1.5"])
+def test_queues_rejects_bad_window(client, window):
+    r = client.get(f"/api/jobs/queues?window={window}")
+    assert r.status_code == 400
+    assert "window" in r.get_json()["error"]
+
+
+def test_queues_accepts_window(client):
+    r = client.get("/api/jobs/queues?window=600")
+    assert r.status_code == 200
+    assert r.get_json()["windowSec"] == 600
@@ -0,0 +1,36 @@
+# backend/tests/test_warmup.py
+import pytest
+
+
+class _Counting:
+    """Provider proxy that counts upstream calls by method."""
+
+    def __init__(self, inner):
+        self.inner, self.calls = inner, {}
+
+    def __getattr__(self, name):
+        fn = getattr(self.inner, name)
+
+        def call(*a, **kw):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return fn(*a, **kw)
+
+        return call
+
+
+def test_warm_tick_costs_one_quote_and_no_info(jobs_db, redis, monkeypatch):
+    from services import market_data as md
+    from tasks.warmup import WARM_CHAINS, _warm_ticker
+
+    up = _Counting(md.get_provider())
+    monkeypatch.setattr(md, "get_provider", lambda: up)
+    checked, warm, failed = _warm_ticker("WRMA", 60.0)
+    assert failed == 0 and warm == 0
+    assert up.calls.get("info", 0) == 0
+    assert up.calls["quote"] == 1 and up.calls["expirations"] == 1
+    assert up.calls["chain"] <= WARM_CHAINS
+
+    # Everything is fresh for the next tick: no upstream traffic at all
+    up.calls.clear()
+    assert _warm_ticker("WRMA", 1.0)[1] == checked
+    assert up.calls == {}
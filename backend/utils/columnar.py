@@ -0,0 +1,89 @@
+# backend/utils/columnar.py
+"""
+Compact binary codec for cached time series and option-chain tables.
+
+Layout: MAGIC | u8 compression | body, where body (optionally compressed) is
+    u32 header length | JSON header | column buffers back to back.
+The header lists (table, column, dtype, length) in buffer order plus a small
+`meta` dict, so decoding is a handful of zero-copy np.frombuffer calls.
+"""
+import json, os, struct, zlib
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+import numpy as np
+
+try:  # optional: better ratio and much faster than zlib
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+MAGIC = b"QCOL"
+_NONE, _ZLIB, _ZSTD = 0, 1, 2
+_HDR = struct.Struct(">I")
+# Below this many bytes compression costs more than it saves
+_MIN_COMPRESS = 512
+COLUMNAR_COMPRESSION = os.getenv(
+    "COLUMNAR_COMPRESSION", "zstd" if _zstd is not None else "zlib"
+)
+
+Tables = Dict[str, Dict[str, np.ndarray]]
+
+
+def encode(tables: Mapping[str, Mapping[str, Any]], meta: Optional[dict] = None) -> bytes:
+    cols: List[list] = []
+    bufs: List[bytes] = []
+    for tname, table in tables.items():
+        for cname, arr in table.items():
+            a = np.ascontiguousarray(arr)
+            if a.dtype.kind not in "biuf":
+                raise TypeError(f"{tname}.{cname}: unsupported dtype {a.dtype}")
+            cols.append([tname, cname, a.dtype.str, int(a.shape[0])])
+            bufs.append(a.tobytes())
+    header = json.dumps({"meta": meta or {}, "cols": cols}, separators=(",", ":")).encode()
+    body = b"".join([_HDR.pack(len(header)), header, *bufs])
+
+    mode = _NONE
+    if len(body) >= _MIN_COMPRESS:
+        if COLUMNAR_COMPRESSION == "zstd" and _zstd is not None:
+            body, mode = _zstd.ZstdCompressor(level=3).compress(body), _ZSTD
+        elif COLUMNAR_COMPRESSION in ("zlib", "zstd"):
+            body, mode = zlib.compress(body, level=6), _ZLIB
+    return MAGIC + bytes([mode]) + body
+
+
+def decode(raw: bytes) -> Tuple[Tables, dict]:
+    if raw[:4] != MAGIC:
+        raise ValueError("not a columnar payload")
+    mode, body = raw[4], raw[5:]
+    if mode == _ZLIB:
+        body = zlib.decompress(body)
+    elif mode == _ZSTD:
+        if _zstd is None:
+            raise RuntimeError("payload is zstd-compressed but zstandard is not installed")
+        body = _zstd.ZstdDecompressor().decompress(body)
+    (hlen,) = _HDR.unpack_from(body)
+    header = json.loads(body[_HDR.size : _HDR.size + hlen])
+    off = _HDR.size + hlen
+    tables: Tables = {}
+    for tname, cname, dtype, n in header["cols"]:
+        dt = np.dtype(dtype)
+        # Read-only views over `body`: safe to share from the in-process cache
+        tables.setdefault(tname, {})[cname] = np.frombuffer(
+            body, dtype=dt, count=n, offset=off
+        )
+        off += dt.itemsize * n
+    return tables, header["meta"]
+
+
+def epoch_seconds(index) -> np.ndarray:
+    """DatetimeIndex / datetime64 array -> int64 UTC epoch seconds."""
+    values = np.asarray(getattr(index, "values", index))
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[s]").astype(np.int64)
+    return values.astype(np.int64)
+
+
+def rows(table: Mapping[str, np.ndarray], fields: Optional[Iterable[str]] = None) -> List[dict]:
+    """Column dict -> list of JSON-ready row dicts. Only for the HTTP edge."""
+    names = [f for f in (fields or table.keys()) if f in table]
+    columns = [table[f].tolist() for f in names]
+    return [dict(zip(names, vals)) for vals in zip(*columns)]
@@ -1,12 +1,54 @@
 # backend/utils/finance_cache.py
-import os, json, time, zlib
-from typing import Callable, Optional
+import os, json, time, zlib, struct, threading, uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set, Tuple
 import redis
+from utils import columnar
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
 YF_CACHE_TTL = int(os.getenv("YF_CACHE_TTL", "900"))
+# Spot quotes stay fresh for one open-market warmer run (tasks.warmup.WARM_EVERY_OPEN),
+# so a warmed quote is still fresh when the next run refreshes it
+YF_SPOT_TTL = int(os.getenv("YF_SPOT_TTL", os.getenv("WARM_EVERY_OPEN", "60")))
+# Single-flight lease: how long one process may hold the right to refresh a key,
+# and how long followers poll Redis before giving up and fetching themselves.
+YF_LEASE_MS = int(os.getenv("YF_LEASE_MS", "15000"))
+YF_LEASE_WAIT = float(os.getenv("YF_LEASE_WAIT", "20"))
+YF_LEASE_POLL = float(os.getenv("YF_LEASE_POLL", "0.05"))
+# In-process tier in front of Redis
+YF_LOCAL_CACHE_SIZE = int(os.getenv("YF_LOCAL_CACHE_SIZE", "2048"))
+YF_REFRESH_WORKERS = int(os.getenv("YF_REFRESH_WORKERS", "4"))
+# Per-namespace hit/stale/miss counters are batched and flushed this often
+CACHE_STATS_FLUSH_SEC = float(os.getenv("CACHE_STATS_FLUSH_SEC", "10"))
+CACHE_STATS_KEY = "cache:stats"
 
 _redis = None
+_MISS = object()
+
+# Redis values are stored as MAGIC + fetched-at (float64 epoch seconds) + payload
+# so every process can tell fresh from stale. Values without the header predate
+# the envelope and are treated as freshly fetched.
+_ENVELOPE = struct.Struct(">4sd")
+_MAGIC = b"QFC1"
+
+# Compare-and-delete so a slow holder never releases a lease it no longer owns.
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Namespace -> (soft TTL, hard TTL) in seconds. Past the soft TTL a value is
+# still served but refreshed in the background; past the hard TTL it is gone.
+_TTL_POLICIES: Dict[str, Tuple[int, int]] = {
+    "yf:lookup:": (YF_SPOT_TTL, 900),  # spot quotes
+    "yf:lk:": (YF_SPOT_TTL, 900),
+    "yf:opts:expirations:": (3600, 6 * 3600),
+    "yf:opts:chain:": (120, 900),
+}
+_DEFAULT_POLICY = (YF_CACHE_TTL, 2 * YF_CACHE_TTL)
 
 
 def _get_redis():
@@ -16,29 +58,415 @@ def _get_redis():
     return _redis
 
 
-def cache_json(key: str, fetch: Callable[[], dict], ttl: Optional[int] = None) -> dict:
-    r = _get_redis()
+def register_ttl_policy(prefix: str, soft: int, hard: int) -> None:
+    """Set the soft/hard TTL for every key starting with `prefix`."""
+    _TTL_POLICIES[prefix] = (int(soft), max(int(soft), int(hard)))
+
+
+def _namespace(key: str) -> str:
+    best = ""
+    for prefix in _TTL_POLICIES:
+        if key.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return best.rstrip(":") or ":".join(key.split(":")[:2])
+
+
+_stats: Counter = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed = time.monotonic()
+
+
+def _record(key: str, outcome: str) -> None:
+    """Count a lookup outcome ('hit', 'stale' or 'miss'); flush to Redis in batches."""
+    global _stats_flushed
+    with _stats_lock:
+        _stats[f"{_namespace(key)}|{outcome}"] += 1
+        if time.monotonic() - _stats_flushed < CACHE_STATS_FLUSH_SEC:
+            return
+        pending = dict(_stats)
+        _stats.clear()
+        _stats_flushed = time.monotonic()
+    try:
+        pipe = _get_redis().pipeline(transaction=False)
+        for field, n in pending.items():
+            pipe.hincrby(CACHE_STATS_KEY, field, n)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Cluster-wide counters per namespace with the share served without blocking."""
+    raw = _get_redis().hgetall(CACHE_STATS_KEY)
+    out: Dict[str, Dict[str, Any]] = {}
+    for field, n in raw.items():
+        ns, outcome = field.decode().rsplit("|", 1)
+        out.setdefault(ns, {"hit": 0, "stale": 0, "miss": 0})[outcome] = int(n)
+    for row in out.values():
+        total = row["hit"] + row["stale"] + row["miss"]
+        row["hitRatio"] = (row["hit"] + row["stale"]) / total if total else None
+    return out
+
+
+def _policy(key: str, ttl: Optional[int]) -> Tuple[int, int]:
+    best = ""
+    soft, hard = _DEFAULT_POLICY
+    for prefix, pol in _TTL_POLICIES.items():
+        if key.startswith(prefix) and len(prefix) > len(best):
+            best, (soft, hard) = prefix, pol
+    if ttl:
+        # Explicit ttl is the hard limit; never serve past it
+        hard = int(ttl)
+        soft = min(soft, hard)
+    return soft, hard
+
+
+class _LocalLRU:
+    """Bounded, thread-safe LRU of decoded values: key -> (value, fetched_at, expires_at)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def put(self, key: str, value: Any, fetched_at: float, expires_at: float) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, fetched_at, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_local = _LocalLRU(YF_LOCAL_CACHE_SIZE)
+_refresher = ThreadPoolExecutor(
+    max_workers=YF_REFRESH_WORKERS, thread_name_prefix="cache-refresh"
+)
+_refreshing: Set[str] = set()
+_refreshing_lock = threading.Lock()
+
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_inflight: Dict[str, _Flight] = {}
+_inflight_lock = threading.Lock()
+
+
+def _single_flight(key: str, load: Callable[[], Any]) -> Any:
+    """
+    In-process deduplication: the first caller for `key` runs `load`, concurrent
+    callers in the same process block on its result instead of calling upstream.
+    """
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    if not leader:
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+    try:
+        flight.value = load()
+        return flight.value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.event.set()
+
+
+def _unwrap(raw: bytes, decode: Callable[[bytes], Any]):
+    """Stored bytes -> (value, fetched_at), or _MISS if undecodable."""
+    fetched_at = time.time()
+    if raw[:4] == _MAGIC:
+        _, fetched_at = _ENVELOPE.unpack_from(raw)
+        raw = raw[_ENVELOPE.size :]
+    try:
+        return decode(raw), fetched_at
+    except Exception:
+        return _MISS
+
+
+def _read(r, key: str, decode: Callable[[bytes], Any]):
+    """Return (value, fetched_at) from Redis, or _MISS."""
     raw = r.get(key)
-    if raw:
+    if not raw:
+        return _MISS
+    return _unwrap(raw, decode)
+
+
+def _write(r, key: str, data: Any, hard: int, encode: Callable[[Any], bytes]):
+    now = time.time()
+    r.setex(key, hard, _ENVELOPE.pack(_MAGIC, now) + encode(data))
+    return data, now
+
+
+def _load_with_lease(
+    r,
+    key: str,
+    fetch: Callable[[], Any],
+    hard: int,
+    encode: Callable[[Any], bytes],
+    decode: Callable[[bytes], Any],
+    min_fetched_at: float = 0.0,
+):
+    """
+    Cross-process single-flight via a short Redis lease (SET NX PX). The holder
+    fetches and publishes; everyone else polls the data key until a value at least
+    as new as `min_fetched_at` appears, the lease lapses (holder died -> retry the
+    lease), or YF_LEASE_WAIT runs out. Returns (value, fetched_at).
+    """
+    lease_key = f"lease:{key}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + YF_LEASE_WAIT
+
+    def usable():
+        hit = _read(r, key, decode)
+        if hit is not _MISS and hit[1] >= min_fetched_at:
+            return hit
+        return None
+
+    while True:
+        if r.set(lease_key, token, nx=True, px=YF_LEASE_MS):
+            try:
+                # Someone may have published between our miss and the lease
+                hit = usable()
+                if hit is not None:
+                    return hit
+                return _write(r, key, fetch(), hard, encode)
+            finally:
+                try:
+                    r.eval(_RELEASE_LUA, 1, lease_key, token)
+                except redis.RedisError:
+                    pass
+        time.sleep(YF_LEASE_POLL)
+        hit = usable()
+        if hit is not None:
+            return hit
+        if time.monotonic() >= deadline:
+            # Holder is stuck; better one extra upstream call than a failed request
+            return _write(r, key, fetch(), hard, encode)
+
+
+def _refresh_in_background(key, fetch, soft, hard, encode, decode) -> None:
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
         try:
-            return json.loads(raw)
+            r = _get_redis()
+            value, fetched_at = _single_flight(
+                key,
+                lambda: _load_with_lease(
+                    r, key, fetch, hard, encode, decode, time.time() - soft
+                ),
+            )
+            _local.put(key, value, fetched_at, fetched_at + hard)
         except Exception:
+            # Keep serving the stale value; the next access past soft TTL retries
             pass
-    data = fetch()
-    r.setex(key, ttl or YF_CACHE_TTL, json.dumps(data, default=str))
-    return data
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    _refresher.submit(run)
+
+
+def _cached(
+    key: str,
+    fetch: Callable[[], Any],
+    ttl: Optional[int],
+    encode: Callable[[Any], bytes],
+    decode: Callable[[bytes], Any],
+) -> Any:
+    """
+    Local LRU -> Redis -> upstream. Values past their soft TTL are returned
+    immediately and refreshed in the background (stale-while-revalidate); only a
+    cold miss or a value past its hard TTL blocks on `fetch`.
+
+    Values from the local tier are shared between callers: treat them as read-only.
+    """
+    soft, hard = _policy(key, ttl)
+    now = time.time()
+    entry = _local.get(key, now)
+    if entry is not None:
+        value, fetched_at, _ = entry
+        if now - fetched_at > soft:
+            _record(key, "stale")
+            _refresh_in_background(key, fetch, soft, hard, encode, decode)
+        else:
+            _record(key, "hit")
+        return value
+
+    r = _get_redis()
+    hit = _read(r, key, decode)
+    if hit is _MISS:
+        _record(key, "miss")
+        value, fetched_at = _single_flight(
+            key, lambda: _load_with_lease(r, key, fetch, hard, encode, decode)
+        )
+        _local.put(key, value, fetched_at, fetched_at + hard)
+        return value
+    value, fetched_at = hit
+    _local.put(key, value, fetched_at, fetched_at + hard)
+    if now - fetched_at > soft:
+        _record(key, "stale")
+        _refresh_in_background(key, fetch, soft, hard, encode, decode)
+    else:
+        _record(key, "hit")
+    return value
+
+
+def _warm(
+    key: str,
+    fetch: Callable[[], Any],
+    ahead: float,
+    encode: Callable[[Any], bytes],
+    decode: Callable[[bytes], Any],
+) -> bool:
+    """
+    Make sure `key` stays fresh for at least `ahead` more seconds, refreshing it
+    through the single-flight lease if not. Returns True if it was already warm.
+    """
+    soft, hard = _policy(key, None)
+    r = _get_redis()
+    now = time.time()
+    hit = _read(r, key, decode)
+    if hit is not _MISS and now - hit[1] + ahead <= soft:
+        return True
+    min_fetched_at = now - max(0.0, soft - ahead)
+    value, fetched_at = _single_flight(
+        key,
+        lambda: _load_with_lease(r, key, fetch, hard, encode, decode, min_fetched_at),
+    )
+    _local.put(key, value, fetched_at, fetched_at + hard)
+    return False
+
+
+def warm_json(key: str, fetch: Callable[[], dict], ahead: float = 0.0) -> bool:
+    return _warm(key, fetch, ahead, *_CODECS["json"])
+
+
+def warm_columnar(key: str, fetch: Callable[[], tuple], ahead: float = 0.0) -> bool:
+    return _warm(key, fetch, ahead, *_CODECS["columnar"])
+
+
+def peek_many(keys: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Fresh (within soft TTL) values for {key: codec name} from the local tier, then
+    one Redis MGET for the rest. Never calls upstream; absent keys are missing.
+    """
+    now = time.time()
+    out: Dict[str, Any] = {}
+    rest = []
+    for key in keys:
+        entry = _local.get(key, now)
+        if entry is not None and now - entry[1] <= _policy(key, None)[0]:
+            out[key] = entry[0]
+        else:
+            rest.append(key)
+    if not rest:
+        return out
+    for key, raw in zip(rest, _get_redis().mget(rest)):
+        hit = _unwrap(raw, _CODECS[keys[key]][1]) if raw else _MISS
+        if hit is _MISS:
+            continue
+        value, fetched_at = hit
+        soft, hard = _policy(key, None)
+        _local.put(key, value, fetched_at, fetched_at + hard)
+        if now - fetched_at <= soft:
+            out[key] = value
+    return out
+
+
+def peek_json_many(keys) -> Dict[str, Any]:
+    return peek_many({k: "json" for k in keys})
+
+
+def soft_ttl(key: str) -> int:
+    return _policy(key, None)[0]
+
+
+def fetched_at_many(keys) -> Dict[str, float]:
+    """
+    When each key's cached value was fetched, for keys still within their soft
+    TTL: local tier first, then one pipelined GETRANGE of the envelope header
+    for the rest. Nothing is decoded or fetched; absent keys are missing.
+    """
+    now = time.time()
+    out: Dict[str, float] = {}
+    rest = []
+    for key in keys:
+        entry = _local.get(key, now)
+        if entry is not None and now - entry[1] <= soft_ttl(key):
+            out[key] = entry[1]
+        else:
+            rest.append(key)
+    if not rest:
+        return out
+    pipe = _get_redis().pipeline(transaction=False)
+    for key in rest:
+        pipe.getrange(key, 0, _ENVELOPE.size - 1)
+    for key, head in zip(rest, pipe.execute()):
+        if not head or head[:4] != _MAGIC or len(head) < _ENVELOPE.size:
+            continue
+        _, fetched_at = _ENVELOPE.unpack(head)
+        if now - fetched_at <= soft_ttl(key):
+            out[key] = fetched_at
+    return out
+
+
+def invalidate(key: str) -> None:
+    _local.pop(key)
+    _get_redis().delete(key)
+
+
+# Codec name -> (encode, decode) for the value types we cache
+_CODECS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    "json": (lambda d: json.dumps(d, default=str).encode(), json.loads),
+    "bytes": (lambda b: b, lambda raw: raw),
+    "zlib": (lambda b: zlib.compress(b, level=6), zlib.decompress),
+    "columnar": (lambda tm: columnar.encode(*tm), columnar.decode),
+}
+
+
+def cache_json(key: str, fetch: Callable[[], dict], ttl: Optional[int] = None) -> dict:
+    return _cached(key, fetch, ttl, *_CODECS["json"])
 
 
 def cache_bytes(
     key: str, fetch: Callable[[], bytes], ttl: Optional[int] = None
 ) -> bytes:
-    r = _get_redis()
-    raw = r.get(key)
-    if raw:
-        return raw
-    data = fetch()
-    r.setex(key, ttl or YF_CACHE_TTL, data)
-    return data
+    return _cached(key, fetch, ttl, *_CODECS["bytes"])
 
 
 def cache_pickle_compressed(
@@ -47,10 +475,14 @@ def cache_pickle_compressed(
     """
     For larger Python objects serialized to bytes; we zlib compress them.
     """
-    r = _get_redis()
-    raw = r.get(key)
-    if raw:
-        return zlib.decompress(raw)
-    data = fetch()
-    r.setex(key, ttl or YF_CACHE_TTL, zlib.compress(data, level=6))
-    return data
+    return _cached(key, fetch, ttl, *_CODECS["zlib"])
+
+
+def cache_columnar(
+    key: str, fetch: Callable[[], tuple], ttl: Optional[int] = None
+) -> tuple:
+    """
+    For tables of NumPy columns. `fetch` returns (tables, meta) as accepted by
+    utils.columnar.encode; hits return the same pair with read-only arrays.
+    """
+    return _cached(key, fetch, ttl, *_CODECS["columnar"])
@@ -0,0 +1,62 @@
+# backend/utils/rate_limit.py
+"""
+Shared token bucket in Redis so every Flask and Celery process together stays
+under the upstream (yfinance) request rate.
+"""
+import os, time
+import redis
+from utils.finance_cache import _get_redis
+
+YF_RATE_PER_SEC = float(os.getenv("YF_RATE_PER_SEC", "4"))
+YF_RATE_BURST = float(os.getenv("YF_RATE_BURST", "8"))
+YF_RATE_TIMEOUT = float(os.getenv("YF_RATE_TIMEOUT", "30"))
+
+# Refill by elapsed server time, then take `want` tokens or report how long to
+# wait for them. Uses Redis TIME so client clock skew does not matter.
+_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= want then
+    tokens = tokens - want
+else
+    wait = (want - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+def acquire(
+    bucket: str = "yfinance",
+    tokens: float = 1.0,
+    rate: float = None,
+    burst: float = None,
+    timeout: float = None,
+) -> None:
+    """
+    Block until `tokens` are available in the shared bucket. Raises RuntimeError
+    after `timeout` seconds. Fails open if Redis is unreachable.
+    """
+    rate = rate or YF_RATE_PER_SEC
+    burst = burst or YF_RATE_BURST
+    deadline = time.monotonic() + (timeout if timeout is not None else YF_RATE_TIMEOUT)
+    r = _get_redis()
+    while True:
+        try:
+            wait = float(r.eval(_BUCKET_LUA, 1, f"rl:{bucket}", rate, burst, tokens))
+        except redis.RedisError:
+            return
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RuntimeError(f"rate limit: no {bucket} capacity within timeout")
+        time.sleep(wait)
@@ -1,5 +1,5 @@
 import { useEffect, useState } from 'react'
-import { listJobs, submitJob } from '../lib/api'
+import { cancelJob, listJobs, submitJob } from '../lib/api'
 import type { Job } from '../lib/types'
 import { Link } from 'react-router-dom'
 
@@ -41,9 +41,9 @@ export default function JobsPage() {
                 <td className="px-4 py-3">{j.type}</td>
                 <td className="px-4 py-3">{j.algo}</td>
                 <td className="px-4 py-3">{j.priority}</td>
-                <td className="px-4 py-3"><span className={"px-2 py-1 rounded-full text-xs " + (j.status === 'Succeeded' ? 'bg-green-100 text-green-700' : j.status === 'Running' ? 'bg-blue-100 text-blue-700' : j.status === 'Failed' ? 'bg-red-100 text-red-700' : 'bg-gray-100 text-gray-700')}>{j.status}</span></td>
+                <td className="px-4 py-3"><span className={"px-2 py-1 rounded-full text-xs " + (j.status === 'Succeeded' ? 'bg-green-100 text-green-700' : j.status === 'Running' ? 'bg-blue-100 text-blue-700' : j.status === 'Failed' ? 'bg-red-100 text-red-700' : 'bg-gray-100 text-gray-700')}>{j.status}</span>{j.status === 'Running' && j.progress?.fraction != null && <span className="ml-2 text-xs text-gray-500">{Math.round(j.progress.fraction * 100)}%</span>}</td>
                 <td className="px-4 py-3">{new Date(j.createdAt).toLocaleString()}</td>
-                <td className="px-4 py-3 text-right"><Link to={`/jobs/${j.id}`} className="text-sm text-brand-700 hover:underline">Details</Link></td>
+                <td className="px-4 py-3 text-right space-x-3">{(j.status === 'Queued' || j.status === 'Running') && <button className="text-sm text-red-700 hover:underline" onClick={async () => { await cancelJob(j.id); refresh() }}>Cancel</button>}<Link to={`/jobs/${j.id}`} className="text-sm text-brand-700 hover:underline">Details</Link></td>
               </tr>
             ))}
           </tbody>
@@ -56,8 +56,8 @@ export default function JobsPage() {
             <div className="text-lg font-semibold mb-3">Submit new job</div>
             <form onSubmit={onSubmitJob} className="space-y-3">
               <div className="grid grid-cols-3 gap-3">
-                <div><label className="label">Type</label><select name="type" className="input"><option>OptionPricing</option><option>PortfolioOptimization</option></select></div>
-                <div><label className="label">Algorithm</label><select name="algo" className="input"><option>BlackScholes</option><option>MonteCarlo</option><option>QAE</option><option>MeanVariance</option><option>QUBO</option><option>QAOA</option></select></div>
+                <div><label className="label">Type</label><select name="type" className="input"><option>OptionPricing</option><option>PortfolioOptimization</option><option>Backtest</option><option>PortfolioRisk</option><option>ScenarioGrid</option></select></div>
+                <div><label className="label">Algorithm</label><select name="algo" className="input"><option>BlackScholes</option><option>MonteCarlo</option><option>QAE</option><option>MeanVariance</option><option>QUBO</option><option>QAOA</option><option>EqualWeight</option></select></div>
                 <div><label className="label">Priority</label><select name="priority" className="input"><option>Normal</option><option>High</option><option>Urgent</option><option>Low</option></select></div>
               </div>
               <div className="grid grid-cols-3 gap-3">
@@ -149,7 +149,7 @@ export default function PortfolioDetail(){
             <div className='text-lg font-semibold mb-3'>Option Pricing (portfolio scope)</div>
             <form onSubmit={onPrice} className='space-y-3'>
               <div className='grid grid-cols-3 gap-3'>
-                <div><label className='label'>Product</label><select name='product' className='input'><option>European</option><option>American</option><option>Asian</option><option>Barrier</option><option>Basket</option></select></div>
+                <div><label className='label'>Product</label><select name='product' className='input'><option>European</option><option>American</option><option>Asian</option><option>Barrier</option><option>Basket</option><option>Spread</option><option>Rainbow</option></select></div>
                 <div><label className='label'>Algorithm</label><select name='algo' className='input'><option>BlackScholes</option><option>MonteCarlo</option><option>QAE</option></select></div>
                 <div><label className='label'>Priority</label><select name='priority' className='input'><option>Normal</option><option>High</option><option>Urgent</option></select></div>
               </div>
@@ -213,7 +213,7 @@ export default function PortfolioDetail(){
             <div className='text-lg font-semibold mb-3'>Portfolio Optimization (this portfolio)</div>
             <form onSubmit={onOptimize} className='space-y-3'>
               <div className='grid grid-cols-3 gap-3'>
-                <div><label className='label'>Algorithm</label><select name='algo' className='input'><option>MeanVariance</option><option>QAOA</option></select></div>
+                <div><label className='label'>Algorithm</label><select name='algo' className='input'><option>MeanVariance</option><option>EfficientFrontier</option><option>QAOA</option></select></div>
                 <div><label className='label'>Priority</label><select name='priority' className='input'><option>Normal</option><option>High</option><option>Urgent</option></select></div>
                 <div><label className='label'>Target return (optional)</label><input name='target' className='input' type='number' step='0.001' placeholder='e.g., 0.08'/></div>
               </div>
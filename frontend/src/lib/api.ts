@@ -1,6 +1,6 @@
 // frontend/src/lib/api.ts
 import { http } from './http'
-import type { Client, Portfolio, Asset, Job, UUID, User } from './types'
+import type { Client, Portfolio, Asset, Job, JobBatch, UUID, User } from './types'
 
 export const login = async (email: string): Promise<User> => http('/api/auth/login', { method:'POST', body: JSON.stringify({ email }) })
 
@@ -22,6 +22,9 @@ export const deleteAsset = (assetId: UUID): Promise<void> => http(`/api/assets/$
 export const submitJob = (payload: Omit<Job,'id'|'createdAt'|'updatedAt'|'status'>): Promise<Job> => http('/api/jobs',{method:'POST',body:JSON.stringify(payload)})
 export const listJobs = (q?:{clientId?:UUID,portfolioId?:UUID}): Promise<Job[]> => http(`/api/jobs${q?.clientId||q?.portfolioId?`?${new URLSearchParams(q as any).toString()}`:''}`)
 export const getJob = (id: UUID): Promise<Job> => http(`/api/jobs/${id}`)
+export const cancelJob = (id: UUID): Promise<Job> => http(`/api/jobs/${id}/cancel`,{method:'POST'})
+export const submitJobBatch = (jobs: Omit<Job,'id'|'createdAt'|'updatedAt'|'status'>[], defaults: Partial<Pick<Job,'clientId'|'portfolioId'|'priority'|'submitter'>> = {}): Promise<JobBatch & {jobs: Job[]}> => http('/api/jobs/batch',{method:'POST',body:JSON.stringify({...defaults, jobs})})
+export const getJobBatch = (id: UUID, withJobs=false): Promise<JobBatch & {jobs?: Job[]}> => http(`/api/jobs/batch/${id}${withJobs?'?jobs=1':''}`)
 export const jobsStats = (): Promise<{total:number, byStatus:Record<string,number>, recent:Job[], running:Job[]}> => http('/api/jobs/stats')
 export const getJobPaths = (id: UUID, limit=100, stride=1) => http(`/api/jobs/${id}/paths?${new URLSearchParams({limit:String(limit), stride:String(stride)})}`)
 